@@ -0,0 +1,259 @@
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 核心模組（sentence-transformers、torch、faiss）與 Flask / LINE Bot SDK 於實際使用時才匯入
+from config.settings import Settings
+from config.logging_setup import setup_logging
+
+# 設定環境變數
+os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+# 載入設定
+settings = Settings()
+setup_logging(settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+# LINE Bot 共用的 RAG 引擎（只建立一次，避免每則訊息都重新載入模型與向量索引）
+_rag_engine = None
+_rag_engine_lock = threading.Lock()
+
+# 問答快取（重複的問題略過嵌入、向量搜尋與 LLM 呼叫）
+_query_cache = None
+
+def _get_rag_engine():
+    """取得 LINE Bot 共用的 RAG 引擎（第一次呼叫時建立）"""
+    global _rag_engine, _query_cache
+
+    if _rag_engine is not None:
+        return _rag_engine
+
+    with _rag_engine_lock:
+        if _rag_engine is None:
+            from core.notion_client import NotionClient
+            from core.text_processor import TextProcessor
+            from core.embedder import Embedder, BatchingEmbedder
+            from core.vector_store import VectorStore
+            from core.rag_engine import RAGEngine
+            from core.query_cache import QueryCache
+
+            notion_client = NotionClient(
+                settings.NOTION_TOKEN,
+                cache_ttl=settings.NOTION_CACHE_TTL,
+                page_cache_ttl=settings.NOTION_PAGE_CACHE_TTL,
+                rate_limit=settings.NOTION_RATE_LIMIT
+            )
+            text_processor = TextProcessor(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+            # 並發的 LINE 訊息查詢合併為批次編碼
+            embedder = BatchingEmbedder(
+                Embedder(
+                    settings.EMBEDDING_MODEL,
+                    backend=settings.EMBEDDING_BACKEND,
+                    model_file=settings.EMBEDDING_MODEL_FILE,
+                    cache_folder=settings.CACHE_PATH,
+                    precision=settings.EMBEDDING_PRECISION
+                ),
+                max_batch_size=settings.EMBED_MAX_BATCH_SIZE,
+                max_wait_ms=settings.EMBED_BATCH_WAIT_MS
+            )
+            vector_store = VectorStore(
+                settings.VECTOR_DB_PATH,
+                settings.METADATA_DB_PATH,
+                settings.EMBEDDING_DIMENSION,
+                settings.VECTOR_INDEX_TYPE,
+                use_gpu=settings.USE_GPU_FAISS,
+                use_mmap=settings.VECTOR_DB_MMAP,
+                ef_search=settings.VECTOR_HNSW_EF_SEARCH,
+                nprobe=settings.VECTOR_IVF_NPROBE,
+                use_numba=settings.VECTOR_NUMBA_SEARCH
+            )
+
+            if settings.QUERY_CACHE_SIZE > 0:
+                _query_cache = QueryCache(
+                    embedder,
+                    maxsize=settings.QUERY_CACHE_SIZE,
+                    similarity_threshold=settings.QUERY_CACHE_SIMILARITY,
+                    ttl=settings.QUERY_CACHE_TTL
+                )
+
+            _rag_engine = RAGEngine(
+                notion_client, text_processor, embedder, vector_store, settings
+            )
+
+    return _rag_engine
+
+def _cache_lookup(rag_engine, question: str):
+    """查詢問答快取
+    Returns:
+        (快取的回答或 None, 問題向量, 內容版本)
+    """
+    # 以內容版本作為快取鍵的一部分，Notion 內容更新後舊回答自動失效
+    version = rag_engine.content_version
+    if _query_cache is None:
+        return None, None, version
+    
+    response, embedding = _query_cache.get(question, version)
+    if response is not None:
+        logger.info("⚡ 問答快取命中: %s", question)
+    return response, embedding, version
+
+def _cache_store(question: str, version: int, response: str, embedding):
+    """寫入問答快取（錯誤或查無資料的回應不快取）"""
+    if _query_cache is not None and not response.startswith("抱歉"):
+        _query_cache.put(question, version, response, embedding)
+
+def _cached_query(rag_engine, question: str) -> str:
+    """回答問題，相同（或語義幾乎相同）的問題直接使用快取"""
+    response, embedding, version = _cache_lookup(rag_engine, question)
+    if response is not None:
+        return response
+    
+    response = rag_engine.query(question)
+    _cache_store(question, version, response, embedding)
+    return response
+
+# 串流回覆設定：累積到句子結尾且達最少字數才推送一則訊息（LINE 單則訊息上限 5000 字）
+_STREAM_MIN_CHARS = 80
+_STREAM_MAX_CHARS = 4000
+_SENTENCE_ENDINGS = "。！？!?\n"
+
+def _take_sentences(buffer: str) -> int:
+    """回傳緩衝區中可推送的長度（到最後一個句子結尾為止），不足時回傳 0"""
+    if len(buffer) >= _STREAM_MAX_CHARS:
+        return len(buffer)
+    end = max(buffer.rfind(c) for c in _SENTENCE_ENDINGS) + 1
+    return end if end >= _STREAM_MIN_CHARS else 0
+
+# 檢查是否有 LINE Bot 設定
+if settings.LINE_BOT_ENABLED:
+    try:
+        from flask import Flask, request, abort
+        
+        # 使用 LINE Bot SDK v3
+        from linebot.v3 import WebhookHandler
+        from linebot.v3.messaging import Configuration, ApiClient, MessagingApi
+        from linebot.v3.webhooks import MessageEvent, TextMessageContent
+        from linebot.v3.messaging.models import TextMessage, ReplyMessageRequest, PushMessageRequest
+        
+        # 初始化 Flask 應用
+        app = Flask(__name__)
+        
+        # 初始化 Line Bot API v3
+        configuration = Configuration(access_token=settings.LINE_CHANNEL_ACCESS_TOKEN)
+        api_client = ApiClient(configuration)
+        line_bot_api = MessagingApi(api_client)
+        handler = WebhookHandler(settings.LINE_CHANNEL_SECRET)
+        
+        # 串流回答在背景執行緒送出，webhook 請求執行緒回覆「思考中」後即釋放
+        stream_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="line-stream")
+        
+        def _reply_text(reply_token: str, text: str):
+            line_bot_api.reply_message(ReplyMessageRequest(
+                reply_token=reply_token,
+                messages=[TextMessage(text=text)]
+            ))
+        
+        def _push_text(to: str, text: str):
+            line_bot_api.push_message(PushMessageRequest(
+                to=to,
+                messages=[TextMessage(text=text)]
+            ))
+        
+        def _push_target(source) -> str:
+            """推送對象：群組或聊天室優先，否則為個人"""
+            return getattr(source, "group_id", None) or getattr(source, "room_id", None) or source.user_id
+        
+        def _stream_answer(rag_engine, to: str, question: str, version: int, embedding):
+            """串流生成回答，每累積完整句子就推送一則訊息"""
+            parts = []
+            buffer = ""
+            try:
+                for delta in rag_engine.query_stream(question):
+                    parts.append(delta)
+                    buffer += delta
+                    end = _take_sentences(buffer)
+                    if end:
+                        _push_text(to, buffer[:end])
+                        buffer = buffer[end:]
+                
+                if buffer.strip():
+                    _push_text(to, buffer)
+                
+                _cache_store(question, version, "".join(parts), embedding)
+                
+            except Exception as e:
+                logger.error("❌ 串流回覆失敗: %s", e)
+                _push_text(to, f"抱歉，處理您的問題時發生錯誤：{str(e)}")
+        
+        @app.route("/callback", methods=['POST'])
+        def callback():
+            # 獲取 X-Line-Signature header 值
+            signature = request.headers['X-Line-Signature']
+
+            # 獲取請求 body 內容
+            body = request.get_data(as_text=True)
+            app.logger.info("Request body: " + body)
+
+            # 驗證簽名
+            try:
+                handler.handle(body, signature)
+            except Exception as e:
+                abort(400)
+
+            return 'OK'
+
+        @handler.add(MessageEvent, message=TextMessageContent)
+        def handle_message(event):
+            try:
+                rag_engine = _get_rag_engine()
+                
+                # 獲取用戶的問題
+                user_question = event.message.text
+                
+                # 非串流模式：等待完整回答後回覆
+                if not settings.LINE_STREAM_REPLY:
+                    _reply_text(event.reply_token, _cached_query(rag_engine, user_question))
+                    return
+                
+                # 快取命中直接回覆
+                response, embedding, version = _cache_lookup(rag_engine, user_question)
+                if response is not None:
+                    _reply_text(event.reply_token, response)
+                    return
+                
+                # 先回覆「思考中」，回答於背景串流推送
+                _reply_text(event.reply_token, "🤔 思考中...")
+                stream_executor.submit(
+                    _stream_answer, rag_engine, _push_target(event.source),
+                    user_question, version, embedding
+                )
+                
+            except Exception as e:
+                # 錯誤處理
+                error_msg = f"抱歉，處理您的問題時發生錯誤：{str(e)}"
+                reply_message_request = ReplyMessageRequest(
+                    reply_token=event.reply_token,
+                    messages=[TextMessage(text=error_msg)]
+                )
+                line_bot_api.reply_message(reply_message_request)
+                
+    except ImportError:
+        # 如果沒有安裝 Flask 或 LINE Bot SDK v3，跳過 LINE Bot 功能
+        print("⚠️ Flask 或 LINE Bot SDK v3 未安裝，跳過 LINE Bot 功能")
+        app = None
+        line_bot_api = None
+        handler = None
+else:
+    print("⚠️ 未設定 LINE Bot 憑證，跳過 LINE Bot 功能")
+    app = None
+    line_bot_api = None
+    handler = None
+
+if __name__ == "__main__":
+    if app is not None:
+        app.run(host=settings.FLASK_HOST, port=settings.FLASK_PORT, debug=settings.FLASK_DEBUG)
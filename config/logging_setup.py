@@ -0,0 +1,28 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# 背景執行緒負責實際寫出日誌（請求執行緒只把紀錄放進佇列，不等待 stdout 寫入）
+_listener = None
+
+def setup_logging(level: str = "INFO"):
+    """設定根 logger：日誌先放入佇列，再由背景執行緒輸出到 stdout（重複呼叫只會設定一次）"""
+    global _listener
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    # 與原本 print 的輸出格式相同（訊息本身已帶有 emoji 標示）
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root.addHandler(QueueHandler(log_queue))
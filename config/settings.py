@@ -1,64 +1,181 @@
 import os
-from typing import Optional
+import re
+from typing import Optional, Dict
+
+# Notion 頁面 ID：32 位十六進位（取結尾的 32 位，例如 URL 標題後的 ID），依 UUID 格式分組
+_PAGE_ID_RE = re.compile(
+    r'([0-9a-fA-F]{8})([0-9a-fA-F]{4})([0-9a-fA-F]{4})([0-9a-fA-F]{4})([0-9a-fA-F]{12})(?![0-9a-fA-F])'
+)
+
+# config/.env 檔案內容快取（整個程序只讀取一次）
+_ENV_CACHE: Optional[Dict[str, str]] = None
+
+def _load_env_once() -> Dict[str, str]:
+    """一次讀入config/.env檔案並解析為字典（不覆蓋已存在的環境變數）"""
+    global _ENV_CACHE
+    if _ENV_CACHE is not None:
+        return _ENV_CACHE
+    
+    env_cache = {}
+    config_env_path = os.path.join(os.path.dirname(__file__), '.env')
+    try:
+        with open(config_env_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except OSError:
+        content = ''
+    
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        if line.startswith('export '):
+            line = line[len('export '):]
+        env_key, env_value = line.split('=', 1)
+        env_value = env_value.strip()
+        if env_value[:1] in ('"', "'"):
+            env_value = env_value.strip(env_value[0])
+        elif ' #' in env_value:
+            # 去除行尾註解
+            env_value = env_value.split(' #', 1)[0].rstrip()
+        env_cache[env_key.strip()] = env_value
+    
+    # 與 load_dotenv(override=False) 相同，讓其他程式庫也能讀到設定
+    for env_key, env_value in env_cache.items():
+        os.environ.setdefault(env_key, env_value)
+    
+    _ENV_CACHE = env_cache
+    return _ENV_CACHE
+
+# 設定值轉換函式
+def _bool(value: str) -> bool:
+    return value.lower() == "true"
+
+def _lower(value: str) -> str:
+    return value.lower()
 
 class Settings:
-    """系統設定管理"""
+    """系統設定管理（單例，整個程序只讀取一次設定）"""
     
-    def __init__(self):
-        # 從環境變數或設定檔讀取Notion設定
-        self.NOTION_TOKEN = self._get_setting("NOTION_TOKEN")
-        raw_page_id = self._get_setting("NOTION_PAGE_ID")
-        self.NOTION_PAGE_ID = self._process_page_id(raw_page_id)
-        
-        # 檢查必要設定
-        if not self.NOTION_TOKEN:
-            raise ValueError("請設定 NOTION_TOKEN 環境變數或在 config/.env 檔案中設定")
-        if not self.NOTION_PAGE_ID:
-            raise ValueError("請設定 NOTION_PAGE_ID 環境變數或在 config/.env 檔案中設定（可使用完整URL）")
-        
+    # 設定欄位：(名稱, 轉換函式, 預設值)
+    _FIELDS = (
         # 向量嵌入設定
-        self.EMBEDDING_MODEL = self._get_setting("EMBEDDING_MODEL") or "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-        self.EMBEDDING_DIMENSION = int(self._get_setting("EMBEDDING_DIMENSION") or "384")
+        ("EMBEDDING_MODEL", str, "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"),
+        ("EMBEDDING_DIMENSION", int, 384),
+        # 推論後端：torch、onnx（可搭配 export_onnx_model.py 產生的 int8 量化模型）、openvino
+        ("EMBEDDING_BACKEND", _lower, "torch"),
+        ("EMBEDDING_MODEL_FILE", str, None),
+        # torch 後端的模型權重精度：float32、float16（CUDA）、bfloat16
+        ("EMBEDDING_PRECISION", _lower, "float32"),
+        # 匯入 Notion 內容時每批送入模型的片段數
+        ("EMBED_BATCH_SIZE", int, 64),
+        
+        # 查詢批次嵌入設定（LINE Bot 並發查詢合併編碼，等待時間只在有並發查詢時生效）
+        ("EMBED_MAX_BATCH_SIZE", int, 32),
+        ("EMBED_BATCH_WAIT_MS", float, 10.0),
         
         # 文本分割設定
-        self.CHUNK_SIZE = int(self._get_setting("CHUNK_SIZE") or "500")
-        self.CHUNK_OVERLAP = int(self._get_setting("CHUNK_OVERLAP") or "50")
+        ("CHUNK_SIZE", int, 500),
+        ("CHUNK_OVERLAP", int, 50),
         
         # 檢索設定
-        self.TOP_K = int(self._get_setting("TOP_K") or "5")
-        self.SIMILARITY_THRESHOLD = float(self._get_setting("SIMILARITY_THRESHOLD") or "0.7")
+        ("TOP_K", int, 5),
+        # 相似度為正規化向量的內積（等同餘弦相似度，範圍 -1 ~ 1）
+        ("SIMILARITY_THRESHOLD", float, 0.7),
+        # 問答快取：最多快取的回答數（0 表示停用），相似度達門檻的問題視為相同問題
+        ("QUERY_CACHE_SIZE", int, 512),
+        ("QUERY_CACHE_SIMILARITY", float, 0.95),
+        ("QUERY_CACHE_TTL", float, 3600),
         
         # LLM設定（可選擇OpenAI或本地模型）
-        self.USE_OPENAI = self._get_setting("USE_OPENAI", "true").lower() == "true"
-        self.OPENAI_API_KEY = self._get_setting("OPENAI_API_KEY")
-        self.OPENAI_MODEL = self._get_setting("OPENAI_MODEL") or "gpt-3.5-turbo"
+        ("USE_OPENAI", _bool, True),
+        ("OPENAI_API_KEY", str, None),
+        ("OPENAI_MODEL", str, "gpt-3.5-turbo"),
         
         # 資料庫路徑
-        self.VECTOR_DB_PATH = self._get_setting("VECTOR_DB_PATH") or "./vector_db"
-        self.METADATA_DB_PATH = self._get_setting("METADATA_DB_PATH") or "./metadata.db"
-        self.CACHE_PATH = self._get_setting("CACHE_PATH") or "./cache"
-        
-        # 更新設定
-        self.UPDATE_INTERVAL = int(self._get_setting("UPDATE_INTERVAL") or "3600")  # 秒（1小時）
+        ("VECTOR_DB_PATH", str, "./vector_db"),
+        ("METADATA_DB_PATH", str, "./metadata.db"),
+        # 向量索引類型：flat（精確搜尋）、hnsw（圖索引）、ivf（分群）、ivfpq（分群 + 乘積量化）、
+        # pq（乘積量化）、fp16（半精度儲存）、sq8（8 位元純量量化）、auto（小型文件用 flat，超過門檻改建為 hnsw）
+        ("VECTOR_INDEX_TYPE", _lower, "flat"),
+        # 近似搜尋廣度：HNSW 的 efSearch 與 IVF 的 nprobe
+        ("VECTOR_HNSW_EF_SEARCH", int, 64),
+        ("VECTOR_IVF_NPROBE", int, 16),
+        # 有 CUDA 與 faiss-gpu 時將向量搜尋搬到 GPU
+        ("USE_GPU_FAISS", _bool, False),
+        # 以記憶體映射載入向量索引與元資料庫（多 worker 部署時共用 page cache）
+        ("VECTOR_DB_MMAP", _bool, False),
+        # 以 numba 內積核心搜尋小型 flat 索引（需安裝 numba）
+        ("VECTOR_NUMBA_SEARCH", _bool, False),
+        ("CACHE_PATH", str, "./cache"),
+        
+        # 日誌等級（DEBUG 時輸出查詢分析、搜尋進度等詳細資訊）
+        ("LOG_LEVEL", str, "INFO"),
+        
+        # 更新設定（秒，預設1小時）
+        ("UPDATE_INTERVAL", int, 3600),
+        # Notion 快取（秒）：頁面內容以 last_edited_time 確認未變更才重複使用；
+        # 頁面資訊快取期間內不會察覺頁面更新（0 表示停用）
+        ("NOTION_CACHE_TTL", int, 3600),
+        ("NOTION_PAGE_CACHE_TTL", int, 30),
+        # Notion API 每秒最多請求數（官方限制平均 3 次/秒，0 表示不限制）
+        ("NOTION_RATE_LIMIT", float, 3.0),
         
         # LINE Bot 設定
-        self.LINE_CHANNEL_SECRET = self._get_setting("LINE_CHANNEL_SECRET")
-        self.LINE_CHANNEL_ACCESS_TOKEN = self._get_setting("LINE_CHANNEL_ACCESS_TOKEN")
+        ("LINE_CHANNEL_SECRET", str, None),
+        ("LINE_CHANNEL_ACCESS_TOKEN", str, None),
+        # 串流回覆：先回覆「思考中」，回答邊生成邊以推播訊息送出（推播會計入 LINE 訊息額度）
+        ("LINE_STREAM_REPLY", _bool, True),
         
         # 對話記憶設定
-        self.CONVERSATION_TIMEOUT_MINUTES = int(self._get_setting("CONVERSATION_TIMEOUT_MINUTES") or "30")
-        self.MAX_CONVERSATION_LENGTH = int(self._get_setting("MAX_CONVERSATION_LENGTH") or "20")
-        self.CLEANUP_INTERVAL_MINUTES = int(self._get_setting("CLEANUP_INTERVAL_MINUTES") or "5")
-        self.MAX_CONTEXT_TOKENS = int(self._get_setting("MAX_CONTEXT_TOKENS") or "2000")
+        ("CONVERSATION_TIMEOUT_MINUTES", int, 30),
+        ("MAX_CONVERSATION_LENGTH", int, 20),
+        ("CLEANUP_INTERVAL_MINUTES", int, 5),
+        ("MAX_CONTEXT_TOKENS", int, 2000),
         
         # Redis 設定（可選，用於分佈式對話記憶）
-        self.REDIS_URL = self._get_setting("REDIS_URL")
-        self.USE_REDIS = self._get_setting("USE_REDIS", "false").lower() == "true"
+        ("REDIS_URL", str, None),
+        ("USE_REDIS", _bool, False),
         
         # Flask 伺服器設定
-        self.FLASK_HOST = self._get_setting("FLASK_HOST") or "0.0.0.0"
-        self.FLASK_PORT = int(self._get_setting("FLASK_PORT") or "5000")
-        self.FLASK_DEBUG = self._get_setting("FLASK_DEBUG", "false").lower() == "true"
+        ("FLASK_HOST", str, "0.0.0.0"),
+        ("FLASK_PORT", int, 5000),
+        ("FLASK_DEBUG", _bool, False),
+    )
+    
+    __slots__ = ("_initialized", "NOTION_TOKEN", "NOTION_PAGE_ID", "LINE_BOT_ENABLED") + tuple(
+        name for name, _, _ in _FIELDS
+    )
+    
+    _instance = None
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+    
+    def __init__(self):
+        # 已初始化過的單例不重複讀取設定
+        if self._initialized:
+            return
+        
+        _load_env_once()
+        
+        # 從環境變數或設定檔讀取Notion設定
+        self.NOTION_TOKEN = self._get_setting("NOTION_TOKEN")
+        raw_page_id = self._get_setting("NOTION_PAGE_ID")
+        self.NOTION_PAGE_ID = self._process_page_id(raw_page_id)
+        
+        # 檢查必要設定
+        if not self.NOTION_TOKEN:
+            raise ValueError("請設定 NOTION_TOKEN 環境變數或在 config/.env 檔案中設定")
+        if not self.NOTION_PAGE_ID:
+            raise ValueError("請設定 NOTION_PAGE_ID 環境變數或在 config/.env 檔案中設定（可使用完整URL）")
+        
+        # 依設定表讀取其餘設定（空值使用預設值）
+        for name, cast, default in self._FIELDS:
+            raw = self._get_setting(name)
+            setattr(self, name, cast(raw) if raw else default)
         
         # 檢查 LINE Bot 設定完整性
         self.LINE_BOT_ENABLED = bool(self.LINE_CHANNEL_SECRET and self.LINE_CHANNEL_ACCESS_TOKEN)
@@ -67,6 +184,8 @@ class Settings:
             print("✅ LINE Bot 設定已啟用")
         else:
             print("⚠️ LINE Bot 設定未完整，將僅啟用基本功能")
+        
+        self._initialized = True
     
     def _process_page_id(self, page_id_input):
         """處理頁面ID（支援URL）"""
@@ -75,52 +194,23 @@ class Settings:
         
         page_id = str(page_id_input).strip()
         
-        # 如果是URL，提取ID
+        # 如果是URL，去除查詢參數後從最後一段路徑提取ID；否則整個輸入必須是ID
         if 'notion.so' in page_id:
-            if '?' in page_id:
-                page_id = page_id.split('?')[0]
-            parts = page_id.split('/')
-            last_part = parts[-1]
-            if len(last_part) >= 32:
-                page_id = last_part[-32:]
+            page_id = page_id.split('?', 1)[0]
+            match = _PAGE_ID_RE.search(page_id.rsplit('/', 1)[-1].replace('-', ''))
+        else:
+            match = _PAGE_ID_RE.fullmatch(page_id.replace('-', ''))
         
         # 格式化為UUID
-        clean_id = page_id.replace('-', '')
-        if len(clean_id) == 32:
-            formatted = f"{clean_id[0:8]}-{clean_id[8:12]}-{clean_id[12:16]}-{clean_id[16:20]}-{clean_id[20:32]}"
-            return formatted.lower()
+        if match:
+            return '-'.join(match.groups()).lower()
         
         return page_id
     
     def _get_setting(self, key: str, default: str = None) -> Optional[str]:
         """從環境變數或config/.env檔案讀取設定"""
-        # 優先從環境變數讀取
-        value = os.getenv(key)
-        if value:
-            return value
-        
-        # 嘗試從config/.env檔案讀取
-        try:
-            from dotenv import load_dotenv
-            # 載入config目錄下的.env檔案
-            config_env_path = os.path.join(os.path.dirname(__file__), '.env')
-            load_dotenv(config_env_path)
-            value = os.getenv(key)
-            if value:
-                return value
-        except ImportError:
-            # 如果沒有安裝python-dotenv，手動讀取
-            config_env_path = os.path.join(os.path.dirname(__file__), '.env')
-            if os.path.exists(config_env_path):
-                with open(config_env_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith('#') and '=' in line:
-                            env_key, env_value = line.split('=', 1)
-                            if env_key.strip() == key:
-                                return env_value.strip().strip('"').strip("'")
-        
-        return default
+        # 優先從環境變數讀取，其次為.env檔案快取
+        return os.environ.get(key) or _load_env_once().get(key) or default
     
     def get_conversation_settings(self) -> dict:
         """獲取對話記憶相關設定"""
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+class CacheManager:
+    """LRU + TTL 快取管理器 - 依資料類型設定不同的存活時間"""
+    
+    def __init__(self, maxsize: int = 512, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 300):
+        """
+        初始化快取管理器
+        
+        Args:
+            maxsize: 所有類型合計最多快取的項目數（LRU 淘汰）
+            ttls: 各資料類型的存活秒數（例如 {"page": 30, "content": 3600}），0 表示該類型不快取
+            default_ttl: 未指定類型時使用的存活秒數
+        """
+        self.maxsize = maxsize
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        
+        # (資料類型, 鍵) -> (到期時間, 值)，到期時間使用 time.monotonic()
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _ttl(self, cache_type: str) -> float:
+        return self.ttls.get(cache_type, self.default_ttl)
+    
+    def get(self, cache_type: str, key: Hashable) -> Optional[Any]:
+        """取得快取值，未命中或已過期回傳 None"""
+        entry_key = (cache_type, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[entry_key]
+                return None
+            self._entries.move_to_end(entry_key)
+            return value
+    
+    def set(self, cache_type: str, key: Hashable, value: Any):
+        """寫入快取（存活時間為 0 的類型不寫入）"""
+        ttl = self._ttl(cache_type)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        entry_key = (cache_type, key)
+        with self._lock:
+            self._entries[entry_key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, cache_type: str, key: Optional[Hashable] = None):
+        """移除指定項目；未指定鍵時移除該類型的所有項目"""
+        with self._lock:
+            if key is not None:
+                self._entries.pop((cache_type, key), None)
+                return
+            for entry_key in [k for k in self._entries if k[0] == cache_type]:
+                del self._entries[entry_key]
+    
+    def clear(self):
+        """清空所有快取"""
+        with self._lock:
+            self._entries.clear()
@@ -1,14 +1,26 @@
 import time
+import logging
 import threading
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
-from collections import defaultdict, deque
+from datetime import datetime
+from collections import defaultdict, deque, namedtuple
 import gc
-import json
+
+# 單則對話訊息（namedtuple 比 dict 省下大量每則訊息的記憶體開銷）
+#   size: 內容的 UTF-8 位元組數；est_tokens: 估算的 token 數
+Message = namedtuple('Message', ['role', 'content', 'timestamp', 'size', 'est_tokens'])
+
+logger = logging.getLogger(__name__)
 
 class ConversationMemory:
     """對話記憶管理器 - 支援連續對話上下文"""
     
+    # 對話資料分片數（每個分片各自一把鎖，不同用戶的操作互不阻塞）
+    NUM_SHARDS = 16
+    
+    # 單次清理超過此數量的過期對話才執行完整記憶體回收
+    GC_COLLECT_THRESHOLD = 100
+    
     def __init__(self, timeout_minutes: int = 30, max_conversation_length: int = 20, 
                  cleanup_interval_minutes: int = 5, max_context_tokens: int = 2000):
         """
@@ -25,22 +37,50 @@ class ConversationMemory:
         self.cleanup_interval_minutes = cleanup_interval_minutes
         self.max_context_tokens = max_context_tokens
         
-        # 儲存對話資料：user_id -> conversation_data
-        self.conversations: Dict[str, Dict[str, Any]] = {}
+        # 逾時秒數（last_active 使用 time.monotonic()，不受系統時間調整影響）
+        self._timeout_sec = timeout_minutes * 60
+        
+        # 儲存對話資料：依 user_id 分片，每個分片為 user_id -> conversation_data
+        self._shards: List[Dict[str, Dict[str, Any]]] = [{} for _ in range(self.NUM_SHARDS)]
         
-        # 線程鎖，確保線程安全
-        self._lock = threading.RLock()
+        # 每個分片各自的線程鎖，確保線程安全
+        self._locks = [threading.Lock() for _ in range(self.NUM_SHARDS)]
+        
+        # 每個分片對話內容的位元組總數（新增、淘汰、清除時即時更新）
+        self._shard_bytes = [0] * self.NUM_SHARDS
         
         # 啟動背景清理任務
         self._cleanup_thread = None
-        self._stop_cleanup = False
+        # 停止事件：清理線程以 Event.wait 等待，shutdown 時可立即喚醒
+        self._stop_event = threading.Event()
         self._start_cleanup_thread()
         
-        print(f"✅ 對話記憶管理器已初始化")
-        print(f"   - 逾時時間: {timeout_minutes} 分鐘")
-        print(f"   - 最大對話長度: {max_conversation_length} 則訊息")
-        print(f"   - 清理間隔: {cleanup_interval_minutes} 分鐘")
-        print(f"   - 最大上下文: {max_context_tokens} tokens")
+        logger.info("✅ 對話記憶管理器已初始化")
+        logger.info("   - 逾時時間: %s 分鐘", timeout_minutes)
+        logger.info("   - 最大對話長度: %s 則訊息", max_conversation_length)
+        logger.info("   - 清理間隔: %s 分鐘", cleanup_interval_minutes)
+        logger.info("   - 最大上下文: %s tokens", max_context_tokens)
+    
+    @property
+    def conversations(self) -> Dict[str, Dict[str, Any]]:
+        """所有對話的快照（user_id -> conversation_data）"""
+        snapshot = {}
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                snapshot.update(shard)
+        return snapshot
+    
+    def _shard_index(self, user_id: str) -> int:
+        """取得用戶所屬的分片編號"""
+        return hash(user_id) % self.NUM_SHARDS
+    
+    def get_user_ids(self) -> List[str]:
+        """取得目前有對話記憶的所有用戶 ID"""
+        user_ids = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                user_ids.extend(shard.keys())
+        return user_ids
     
     def add_message(self, user_id: str, role: str, content: str) -> None:
         """
@@ -51,29 +91,44 @@ class ConversationMemory:
             role: 角色 ('user' 或 'assistant')
             content: 訊息內容
         """
-        with self._lock:
+        index = self._shard_index(user_id)
+        shard = self._shards[index]
+        
+        with self._locks[index]:
+            now = time.monotonic()
             current_time = datetime.now()
             
             # 如果是新用戶或對話已過期，建立新對話
-            if user_id not in self.conversations or self._is_conversation_expired(user_id):
-                self.conversations[user_id] = {
+            conversation = shard.get(user_id)
+            if conversation is None or now - conversation['last_active'] > self._timeout_sec:
+                self._drop_conversation(index, user_id)
+                conversation = shard[user_id] = {
                     'messages': deque(maxlen=self.max_conversation_length),
                     'created_at': current_time,
-                    'last_active': current_time
+                    'last_active': now
                 }
-                print(f"🆕 為用戶 {user_id} 建立新對話")
+                logger.debug("🆕 為用戶 %s 建立新對話", user_id)
             
             # 新增訊息
-            message = {
-                'role': role,
-                'content': content,
-                'timestamp': current_time
-            }
+            message = Message(
+                role,
+                content,
+                current_time,
+                len(content.encode('utf-8')),
+                # 簡單的 token 估算（中文字符 * 1.5），建立上下文時直接使用
+                len(content) * 1.5
+            )
             
-            self.conversations[user_id]['messages'].append(message)
-            self.conversations[user_id]['last_active'] = current_time
+            messages = conversation['messages']
+            # 達到最大長度時最舊的訊息會被淘汰
+            if len(messages) == messages.maxlen:
+                self._shard_bytes[index] -= messages[0].size
+            messages.append(message)
+            self._shard_bytes[index] += message.size
+            conversation['last_active'] = now
             
-            print(f"💬 用戶 {user_id} 新增 {role} 訊息: {content[:50]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("💬 用戶 %s 新增 %s 訊息: %s...", user_id, role, content[:50])
     
     def get_conversation(self, user_id: str) -> List[Dict[str, Any]]:
         """
@@ -85,11 +140,14 @@ class ConversationMemory:
         Returns:
             對話訊息列表
         """
-        with self._lock:
-            if user_id not in self.conversations or self._is_conversation_expired(user_id):
+        index = self._shard_index(user_id)
+        
+        with self._locks[index]:
+            conversation = self._shards[index].get(user_id)
+            if conversation is None or time.monotonic() - conversation['last_active'] > self._timeout_sec:
                 return []
             
-            return list(self.conversations[user_id]['messages'])
+            return [message._asdict() for message in conversation['messages']]
     
     def get_context_for_rag(self, user_id: str) -> str:
         """
@@ -101,36 +159,35 @@ class ConversationMemory:
         Returns:
             格式化的上下文字串
         """
-        with self._lock:
-            messages = self.get_conversation(user_id)
-            
-            if not messages:
+        index = self._shard_index(user_id)
+        
+        with self._locks[index]:
+            conversation = self._shards[index].get(user_id)
+            if conversation is None or time.monotonic() - conversation['last_active'] > self._timeout_sec:
                 return ""
             
             # 建立上下文字串
             context_parts = []
             total_tokens = 0
             
-            # 從最新的訊息開始，逆向添加到上下文
-            for message in reversed(messages):
-                role_label = "用戶" if message['role'] == 'user' else "助手"
-                content = message['content']
-                
-                # 簡單的 token 估算（中文字符 * 1.5）
-                estimated_tokens = len(content) * 1.5
+            # 從最新的訊息開始，逆向累加直到超過 token 上限
+            for message in reversed(conversation['messages']):
+                estimated_tokens = message.est_tokens
                 
                 if total_tokens + estimated_tokens > self.max_context_tokens:
                     break
                 
-                context_parts.insert(0, f"{role_label}: {content}")
+                role_label = "用戶" if message.role == 'user' else "助手"
+                context_parts.append(f"{role_label}: {message.content}")
                 total_tokens += estimated_tokens
-            
-            if context_parts:
-                context = "以下是對話歷程：\n" + "\n".join(context_parts) + "\n\n"
-                print(f"📋 為用戶 {user_id} 建立上下文，包含 {len(context_parts)} 則訊息")
-                return context
-            
-            return ""
+        
+        if context_parts:
+            # 逆向收集，輸出時恢復時間順序
+            context = "以下是對話歷程：\n" + "\n".join(reversed(context_parts)) + "\n\n"
+            logger.debug("📋 為用戶 %s 建立上下文，包含 %d 則訊息", user_id, len(context_parts))
+            return context
+        
+        return ""
     
     def clear_conversation(self, user_id: str) -> bool:
         """
@@ -142,38 +199,48 @@ class ConversationMemory:
         Returns:
             是否成功清除
         """
-        with self._lock:
-            if user_id in self.conversations:
-                del self.conversations[user_id]
-                print(f"🗑️ 已清除用戶 {user_id} 的對話記憶")
+        index = self._shard_index(user_id)
+        
+        with self._locks[index]:
+            if user_id in self._shards[index]:
+                self._drop_conversation(index, user_id)
+                logger.info("🗑️ 已清除用戶 %s 的對話記憶", user_id)
                 return True
             return False
     
     def cleanup_expired(self) -> int:
         """
-        清理過期的對話
+        清理過期的對話（逐一分片處理，每次只短暫持有單一分片的鎖）
         
         Returns:
             清理的對話數量
         """
-        with self._lock:
-            current_time = datetime.now()
-            expired_users = []
-            
-            for user_id, conversation in self.conversations.items():
-                if self._is_conversation_expired(user_id, current_time):
-                    expired_users.append(user_id)
-            
-            # 清理過期對話
-            for user_id in expired_users:
-                del self.conversations[user_id]
+        # 以截止時間比較，省去每個對話的減法與函式呼叫
+        cutoff = time.monotonic() - self._timeout_sec
+        expired_count = 0
+        
+        for index, shard in enumerate(self._shards):
+            with self._locks[index]:
+                expired_users = [
+                    user_id for user_id, conversation in shard.items()
+                    if conversation['last_active'] < cutoff
+                ]
+                
+                # 一次清理此分片的過期對話
+                freed_bytes = 0
+                for user_id in expired_users:
+                    freed_bytes += sum(m.size for m in shard.pop(user_id)['messages'])
+                self._shard_bytes[index] -= freed_bytes
             
-            if expired_users:
-                print(f"🧹 清理了 {len(expired_users)} 個過期對話")
-                # 執行記憶體回收
+            expired_count += len(expired_users)
+        
+        if expired_count:
+            logger.info("🧹 清理了 %s 個過期對話", expired_count)
+            # 大量清理時才執行完整記憶體回收（gc.collect 會掃描整個堆積）
+            if expired_count > self.GC_COLLECT_THRESHOLD:
                 gc.collect()
-            
-            return len(expired_users)
+        
+        return expired_count
     
     def get_conversation_stats(self) -> Dict[str, Any]:
         """
@@ -182,76 +249,59 @@ class ConversationMemory:
         Returns:
             統計資訊字典
         """
-        with self._lock:
-            total_conversations = len(self.conversations)
-            total_messages = sum(len(conv['messages']) for conv in self.conversations.values())
-            
-            # 計算活躍對話（最近 5 分鐘內有活動）
-            active_cutoff = datetime.now() - timedelta(minutes=5)
-            active_conversations = sum(
-                1 for conv in self.conversations.values() 
-                if conv['last_active'] > active_cutoff
-            )
-            
-            return {
-                'total_conversations': total_conversations,
-                'active_conversations': active_conversations,
-                'total_messages': total_messages,
-                'average_messages_per_conversation': total_messages / max(total_conversations, 1),
-                'memory_usage_mb': self._estimate_memory_usage()
-            }
-    
-    def _is_conversation_expired(self, user_id: str, current_time: Optional[datetime] = None) -> bool:
-        """檢查對話是否已過期"""
-        if user_id not in self.conversations:
-            return True
+        total_conversations = 0
+        total_messages = 0
+        active_conversations = 0
         
-        if current_time is None:
-            current_time = datetime.now()
+        # 計算活躍對話（最近 5 分鐘內有活動）
+        active_cutoff = time.monotonic() - 5 * 60
         
-        last_active = self.conversations[user_id]['last_active']
-        timeout_delta = timedelta(minutes=self.timeout_minutes)
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                total_conversations += len(shard)
+                for conv in shard.values():
+                    total_messages += len(conv['messages'])
+                    if conv['last_active'] > active_cutoff:
+                        active_conversations += 1
         
-        return current_time - last_active > timeout_delta
+        return {
+            'total_conversations': total_conversations,
+            'active_conversations': active_conversations,
+            'total_messages': total_messages,
+            'average_messages_per_conversation': total_messages / max(total_conversations, 1),
+            'memory_usage_mb': self._estimate_memory_usage()
+        }
+    
+    def _drop_conversation(self, index: int, user_id: str) -> None:
+        """移除用戶對話並扣除其位元組數（需在持有該分片的鎖時呼叫）"""
+        conversation = self._shards[index].pop(user_id, None)
+        if conversation:
+            self._shard_bytes[index] -= sum(m.size for m in conversation['messages'])
     
     def _estimate_memory_usage(self) -> float:
-        """估算記憶體使用量（MB）"""
-        try:
-            # 簡單估算：將對話資料轉為 JSON 計算大小
-            data_size = len(json.dumps(
-                {k: {
-                    'messages': [{'role': m['role'], 'content': m['content']} for m in v['messages']],
-                    'created_at': v['created_at'].isoformat(),
-                    'last_active': v['last_active'].isoformat()
-                } for k, v in self.conversations.items()}, 
-                ensure_ascii=False
-            ).encode('utf-8'))
-            
-            return data_size / (1024 * 1024)  # 轉換為 MB
-        except Exception:
-            return 0.0
+        """估算記憶體使用量（MB，以對話內容位元組數計算）"""
+        return sum(self._shard_bytes) / (1024 * 1024)
     
     def _start_cleanup_thread(self):
         """啟動背景清理線程"""
         def cleanup_worker():
-            while not self._stop_cleanup:
+            # wait 回傳 True 代表已收到停止事件，否則為逾時（到了清理時間）
+            while not self._stop_event.wait(self.cleanup_interval_minutes * 60):  # 轉換為秒
                 try:
-                    time.sleep(self.cleanup_interval_minutes * 60)  # 轉換為秒
-                    if not self._stop_cleanup:
-                        self.cleanup_expired()
+                    self.cleanup_expired()
                 except Exception as e:
-                    print(f"❌ 背景清理任務錯誤: {e}")
+                    logger.error("❌ 背景清理任務錯誤: %s", e)
         
         self._cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
         self._cleanup_thread.start()
-        print(f"🔄 背景清理任務已啟動，間隔: {self.cleanup_interval_minutes} 分鐘")
+        logger.info("🔄 背景清理任務已啟動，間隔: %s 分鐘", self.cleanup_interval_minutes)
     
     def shutdown(self):
         """關閉記憶管理器"""
-        self._stop_cleanup = True
+        self._stop_event.set()
         if self._cleanup_thread and self._cleanup_thread.is_alive():
             self._cleanup_thread.join(timeout=5)
-        print("🛑 對話記憶管理器已關閉")
+        logger.info("🛑 對話記憶管理器已關閉")
     
     def __del__(self):
         """析構函數"""
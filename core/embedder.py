@@ -1,108 +1,399 @@
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List
+import logging
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future
+import os
+import queue
+import sys
+import threading
+import time
 import torch
 
+logger = logging.getLogger(__name__)
+
+# 已載入的模型（同一程序內相同設定的 Embedder 共用一份模型權重）
+# (模型名稱, 後端, 模型檔案, 設備, 精度) -> (模型, 實際使用的後端, 實際使用的精度)
+_MODEL_CACHE: Dict[Tuple[str, str, Optional[str], str, str], Tuple[SentenceTransformer, str, str]] = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
 class Embedder:
     """向量嵌入器"""
     
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+    # 支援的推論後端
+    BACKENDS = ("torch", "onnx", "openvino")
+    
+    # 支援的推論精度（僅 torch 後端）：float16 需要 CUDA，bfloat16 適用於近代 GPU 與支援 AVX-512 BF16 / AMX 的 CPU
+    PRECISIONS = ("float32", "float16", "bfloat16")
+    
+    # encode 每次送入模型的批次數（結果直接寫入預先配置的輸出陣列，避免整份向量矩陣的暫存複本）
+    ENCODE_CHUNK_BATCHES = 16
+    
+    # 查詢向量 LRU 快取的記憶體上限（位元組，含文本鍵；常見關鍵字與重複問題不需再次推論）
+    ENCODE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 backend: str = "torch", model_file: Optional[str] = None, cache_folder: Optional[str] = None,
+                 precision: str = "float32"):
+        """
+        Args:
+            model_name: 模型名稱或本地模型目錄
+            backend: 推論後端（torch、onnx、openvino）
+            model_file: 後端模型檔案（例如量化後的 onnx/model_qint8_avx512_vnni.onnx）
+            cache_folder: 模型下載快取目錄（多個程序共用）
+            precision: 模型權重精度（float32、float16、bfloat16），輸出向量一律為 float32
+        """
         self.model_name = model_name
-        print(f"🔄 載入嵌入模型: {model_name}")
+        
+        # 正規化後的查詢文本 -> 向量（唯讀陣列，LRU 淘汰）
+        self._encode_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._encode_cache_bytes = 0
+        self._encode_cache_lock = threading.Lock()
+        
+        backend = (backend or "torch").lower()
+        if backend not in self.BACKENDS:
+            logger.warning("⚠️ 不支援的推論後端: %s，改用 torch", backend)
+            backend = "torch"
+        self.backend = backend
+        logger.info("🔄 載入嵌入模型: %s（後端: %s）", model_name, backend)
         
         # 檢查設備
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"🖥️ 使用設備: {self.device}")
+        logger.info("🖥️ 使用設備: %s", self.device)
+        
+        precision = (precision or "float32").lower()
+        if precision not in self.PRECISIONS:
+            logger.warning("⚠️ 不支援的推論精度: %s，改用 float32", precision)
+            precision = "float32"
+        elif precision == "float16" and self.device != "cuda":
+            # CPU 的 float16 運算沒有硬體加速，反而比 float32 慢
+            logger.warning("⚠️ float16 需要 CUDA，CPU 改用 float32（CPU 可改用 bfloat16）")
+            precision = "float32"
+        self.precision = precision
         
         try:
-            self.model = SentenceTransformer(model_name, device=self.device)
-            print(f"✅ 模型載入成功")
+            cache_key = (model_name, backend, model_file, self.device, precision)
+            with _MODEL_CACHE_LOCK:
+                if cache_key in _MODEL_CACHE:
+                    self.model, self.backend, self.precision = _MODEL_CACHE[cache_key]
+                    logger.info("♻️ 重複使用已載入的模型")
+                else:
+                    self.model = self._load_model(model_file, cache_folder)
+                    self._apply_precision()
+                    _MODEL_CACHE[cache_key] = (self.model, self.backend, self.precision)
+                    logger.info("✅ 模型載入成功")
             
             # 獲取模型資訊
             self.embedding_dimension = self.model.get_sentence_embedding_dimension()
-            print(f"📏 嵌入維度: {self.embedding_dimension}")
+            logger.info("📏 嵌入維度: %s", self.embedding_dimension)
             
         except Exception as e:
-            print(f"❌ 模型載入失敗: {e}")
+            logger.error("❌ 模型載入失敗: %s", e)
             raise
     
-    def encode(self, texts: List[str], show_progress: bool = True) -> np.ndarray:
-        """將文本列表編碼為向量"""
+    def _load_model(self, model_file: Optional[str], cache_folder: Optional[str]) -> SentenceTransformer:
+        """依推論後端載入模型，後端不可用時退回 torch"""
+        if self.backend == "torch":
+            return SentenceTransformer(self.model_name, device=self.device, cache_folder=cache_folder)
+        
+        model_kwargs = {}
+        if model_file:
+            model_kwargs["file_name"] = model_file
+        if self.backend == "onnx":
+            model_kwargs["provider"] = "CUDAExecutionProvider" if self.device == "cuda" else "CPUExecutionProvider"
+            try:
+                import onnxruntime as ort
+                sess_options = ort.SessionOptions()
+                sess_options.intra_op_num_threads = os.cpu_count() or 1
+                model_kwargs["session_options"] = sess_options
+            except ImportError:
+                pass
+        
+        try:
+            return SentenceTransformer(
+                self.model_name,
+                device=self.device,
+                cache_folder=cache_folder,
+                backend=self.backend,
+                model_kwargs=model_kwargs
+            )
+        except (TypeError, ImportError) as e:
+            # 舊版 sentence-transformers 不支援 backend 參數，或未安裝 optimum / onnxruntime
+            logger.warning("⚠️ 無法使用 %s 後端（%s），改用 torch", self.backend, e)
+            self.backend = "torch"
+            return SentenceTransformer(self.model_name, device=self.device, cache_folder=cache_folder)
+    
+    def _apply_precision(self):
+        """將 torch 模型權重轉為指定精度（半精度使記憶體頻寬減半，GPU tensor core 與 BF16 CPU 上吞吐量更高）"""
+        if self.precision == "float32":
+            return
+        if self.backend != "torch":
+            # onnx / openvino 的精度由模型檔案決定（例如 int8 量化模型）
+            logger.warning("⚠️ %s 後端不支援 %s，使用模型檔案原本的精度", self.backend, self.precision)
+            self.precision = "float32"
+            return
+        self.model.to(getattr(torch, self.precision))
+        logger.info("⚡ 模型權重精度: %s", self.precision)
+    
+    def encode(self, texts: List[str], show_progress: bool = True, batch_size: int = 32) -> np.ndarray:
+        """將文本列表編碼為向量
+        Args:
+            texts: 文本列表
+            show_progress: 是否顯示進度條
+            batch_size: 每批次送入模型的文本數量
+        """
         if not texts:
             return np.zeros((0, self.embedding_dimension), dtype=np.float32)
-        print(f"🔄 編碼 {len(texts)} 個文本片段...")
+        logger.debug("🔄 編碼 %d 個文本片段...", len(texts))
         try:
             # 過濾空文本
             valid_texts = [text for text in texts if text.strip()]
             if not valid_texts:
-                print("⚠️ 沒有有效的文本可以編碼")
+                logger.warning("⚠️ 沒有有效的文本可以編碼")
                 return np.zeros((0, self.embedding_dimension), dtype=np.float32)
-            # 編碼文本
-            embeddings = self.model.encode(
-                valid_texts, 
-                convert_to_numpy=True,
-                show_progress_bar=show_progress,
-                batch_size=32  # 設定批次大小
-            )
-            # 強制型別與 shape
-            embeddings = np.asarray(embeddings, dtype=np.float32)
-            if embeddings.ndim == 1:
-                embeddings = embeddings.reshape(1, -1)
-            print(f"✅ 編碼完成，形狀: {embeddings.shape}")
+            # 預先配置輸出陣列，分段編碼後直接寫入（峰值記憶體只多一段的暫存結果）
+            embeddings = np.empty((len(valid_texts), self.embedding_dimension), dtype=np.float32)
+            chunk_size = batch_size * self.ENCODE_CHUNK_BATCHES
+            for start in range(0, len(valid_texts), chunk_size):
+                end = min(start + chunk_size, len(valid_texts))
+                # 寫入 float32 陣列時自動轉型，不需另外 astype
+                embeddings[start:end] = self.model.encode(
+                    valid_texts[start:end],
+                    convert_to_numpy=True,
+                    show_progress_bar=show_progress,
+                    batch_size=batch_size,
+                    normalize_embeddings=True
+                ).reshape(end - start, -1)
+            logger.debug("✅ 編碼完成，形狀: %s", embeddings.shape)
             return embeddings
         except Exception as e:
-            print(f"❌ 編碼失敗: {e}")
+            logger.error("❌ 編碼失敗: %s", e)
             return np.zeros((0, self.embedding_dimension), dtype=np.float32)
     
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        """查詢向量快取的鍵（去除前後空白並合併連續空白，分詞結果相同的問題共用同一筆快取）"""
+        return " ".join(text.split())
+    
+    def get_cached(self, text: str) -> Optional[np.ndarray]:
+        """從查詢向量快取取得向量，未命中回傳 None"""
+        key = self._cache_key(text)
+        with self._encode_cache_lock:
+            embedding = self._encode_cache.get(key)
+            if embedding is not None:
+                self._encode_cache.move_to_end(key)
+            return embedding
+    
+    def _put_cached(self, text: str, embedding: np.ndarray) -> np.ndarray:
+        """寫入查詢向量快取（設為唯讀，避免呼叫端修改共用的陣列）"""
+        embedding.flags.writeable = False
+        key = self._cache_key(text)
+        with self._encode_cache_lock:
+            previous = self._encode_cache.pop(key, None)
+            if previous is not None:
+                self._encode_cache_bytes -= self._entry_bytes(key, previous)
+            self._encode_cache[key] = embedding
+            self._encode_cache_bytes += self._entry_bytes(key, embedding)
+            while self._encode_cache_bytes > self.ENCODE_CACHE_MAX_BYTES and len(self._encode_cache) > 1:
+                old_key, old_embedding = self._encode_cache.popitem(last=False)
+                self._encode_cache_bytes -= self._entry_bytes(old_key, old_embedding)
+        return embedding
+    
+    @staticmethod
+    def _entry_bytes(key: str, embedding: np.ndarray) -> int:
+        """快取項目佔用的位元組數（向量資料 + 文本鍵）"""
+        return embedding.nbytes + sys.getsizeof(key)
+    
+    def clear_cache(self):
+        """清空查詢向量快取（更換模型或設定後使用）"""
+        with self._encode_cache_lock:
+            self._encode_cache.clear()
+            self._encode_cache_bytes = 0
+    
     def encode_single(self, text: str) -> np.ndarray:
-        """將單個文本編碼為向量"""
+        """將單個文本編碼為向量（相同文本直接取用快取）"""
         if not text.strip():
             return np.zeros((self.embedding_dimension,), dtype=np.float32)
+        cached = self.get_cached(text)
+        if cached is not None:
+            return cached
         try:
-            embedding = self.model.encode([text], convert_to_numpy=True)[0]
-            embedding = np.asarray(embedding, dtype=np.float32)
-            embedding = embedding.reshape(-1)
-            return embedding
+            embedding = self.model.encode([text], convert_to_numpy=True, normalize_embeddings=True)[0]
+            if embedding.dtype != np.float32:
+                embedding = embedding.astype(np.float32)
+            return self._put_cached(text, embedding.reshape(-1))
         except Exception as e:
-            print(f"❌ 單文本編碼失敗: {e}")
+            logger.error("❌ 單文本編碼失敗: %s", e)
             return np.zeros((self.embedding_dimension,), dtype=np.float32)
     
     def encode_query(self, query: str) -> np.ndarray:
         """編碼查詢文本（與encode_single相同，但語義上更清楚）"""
         return self.encode_single(query)
     
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """批次編碼查詢文本（輸出與輸入一一對應，不過濾空文本；只對未快取的文本推論）"""
+        if not texts:
+            return np.zeros((0, self.embedding_dimension), dtype=np.float32)
+        
+        embeddings = np.empty((len(texts), self.embedding_dimension), dtype=np.float32)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            cached = self.get_cached(text)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing.setdefault(self._cache_key(text), []).append(i)
+        
+        if missing:
+            missing_texts = list(missing)
+            encoded = self.model.encode(
+                missing_texts,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                batch_size=len(missing_texts),
+                normalize_embeddings=True
+            )
+            if encoded.dtype != np.float32:
+                encoded = encoded.astype(np.float32)
+            encoded = encoded.reshape(len(missing_texts), -1)
+            for text, embedding in zip(missing_texts, encoded):
+                embeddings[missing[text]] = self._put_cached(text, embedding.copy())
+        
+        return embeddings
+    
     def get_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
-        """計算兩個向量的餘弦相似度"""
+        """計算兩個向量的餘弦相似度
+        
+        編碼時已使用 normalize_embeddings=True，向量皆為單位長度，
+        內積即等於餘弦相似度，不需再計算向量長度。
+        """
         try:
-            # 正規化向量
-            norm1 = np.linalg.norm(embedding1)
-            norm2 = np.linalg.norm(embedding2)
-            
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-            
-            # 計算餘弦相似度
-            similarity = np.dot(embedding1, embedding2) / (norm1 * norm2)
-            return float(similarity)
-            
+            return float(np.dot(embedding1, embedding2))
         except Exception as e:
-            print(f"❌ 相似度計算失敗: {e}")
+            logger.error("❌ 相似度計算失敗: %s", e)
             return 0.0
     
+    def get_similarity_batch(self, query_embeddings: np.ndarray, doc_embeddings: np.ndarray) -> np.ndarray:
+        """批次計算相似度矩陣（Q @ D.T，一次矩陣乘法取代逐對內積）
+        Args:
+            query_embeddings: 查詢向量 (M, D)
+            doc_embeddings: 文件向量 (N, D)
+        Returns:
+            相似度矩陣 (M, N)
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.embedding_dimension)
+        doc_embeddings = np.asarray(doc_embeddings, dtype=np.float32).reshape(-1, self.embedding_dimension)
+        return query_embeddings @ doc_embeddings.T
+    
     def test_embedding(self, test_text: str = "這是一個測試句子") -> bool:
         """測試嵌入功能是否正常"""
         try:
-            print(f"🧪 測試嵌入功能...")
-            print(f"測試文本: {test_text}")
+            logger.info("🧪 測試嵌入功能...")
+            logger.info("測試文本: %s", test_text)
             
             embedding = self.encode_single(test_text)
             
-            print(f"✅ 測試成功")
-            print(f"嵌入形狀: {embedding.shape}")
-            print(f"嵌入範圍: [{embedding.min():.4f}, {embedding.max():.4f}]")
+            logger.info("✅ 測試成功")
+            logger.info("嵌入形狀: %s", embedding.shape)
+            logger.info("嵌入範圍: [%.4f, %.4f]", embedding.min(), embedding.max())
             
             return True
             
         except Exception as e:
-            print(f"❌ 測試失敗: {e}")
-            return False
\ No newline at end of file
+            logger.error("❌ 測試失敗: %s", e)
+            return False
+
+class BatchingEmbedder:
+    """批次嵌入器 - 將並發的單筆查詢合併為一次模型呼叫"""
+    
+    def __init__(self, embedder: Embedder, max_batch_size: int = 32, max_wait_ms: float = 10):
+        """
+        初始化批次嵌入器
+        
+        Args:
+            embedder: 實際執行編碼的嵌入器
+            max_batch_size: 每批最多合併的查詢數
+            max_wait_ms: 收到第一筆查詢後最多等待的毫秒數
+        """
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        
+        # 待編碼佇列：(text, Future)
+        self._queue = queue.Queue()
+        
+        self._worker = threading.Thread(target=self._batch_worker, daemon=True)
+        self._worker.start()
+        logger.info("✅ 批次嵌入器已啟動，批次上限: %s，等待時間: %s ms", self.max_batch_size, max_wait_ms)
+    
+    def __getattr__(self, name):
+        # 其他屬性與方法（encode、get_similarity 等）直接交給原本的嵌入器
+        return getattr(self.embedder, name)
+    
+    def submit(self, text: str) -> Future:
+        """送出一筆待編碼文本，回傳對應的 Future（已快取的文本直接完成，不進入佇列）"""
+        future = Future()
+        cached = self.embedder.get_cached(text)
+        if cached is not None:
+            future.set_result(cached)
+        else:
+            self._queue.put((text, future))
+        return future
+    
+    def encode_single(self, text: str) -> np.ndarray:
+        """將單個文本編碼為向量（與其他並發查詢合併批次處理）"""
+        if not text.strip():
+            return np.zeros((self.embedder.embedding_dimension,), dtype=np.float32)
+        try:
+            return self.submit(text).result()
+        except Exception as e:
+            logger.error("❌ 批次編碼失敗: %s", e)
+            return np.zeros((self.embedder.embedding_dimension,), dtype=np.float32)
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """編碼查詢文本（與encode_single相同，但語義上更清楚）"""
+        return self.encode_single(query)
+    
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """批次編碼多個查詢（一併送入佇列，與其他並發查詢合併處理）"""
+        if not texts:
+            return np.zeros((0, self.embedder.embedding_dimension), dtype=np.float32)
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures])
+    
+    def _batch_worker(self):
+        """背景線程：收集短時間內的查詢並一次編碼
+        
+        批次大小隨負載調整：先取出上一次推論期間已累積的查詢；只有在有並發負載時
+        （本批或上一批多於一筆）才等待 max_wait 收集更多查詢，閒置時單筆查詢不增加延遲。
+        """
+        last_batch_size = 0
+        while True:
+            batch = [self._queue.get()]
+            
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            if len(batch) > 1 or last_batch_size > 1:
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            last_batch_size = len(batch)
+            
+            try:
+                embeddings = self.embedder.encode_batch([text for text, _ in batch])
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
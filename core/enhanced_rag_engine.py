@@ -1,15 +1,48 @@
-from typing import List, Dict, Any, Optional
+import logging
+import re
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from datetime import datetime
 from .query_processor import QueryProcessor
 from .rag_engine import RAGEngine
 
+logger = logging.getLogger(__name__)
+
 class EnhancedRAGEngine(RAGEngine):
     """增強版 RAG 引擎 - 支援對話上下文"""
     
-    def __init__(self, notion_client, text_processor, embedder, vector_store, settings):
+    # 需要上下文理解的代詞或指示詞（預先編譯為單一正規表示式，一次掃描即可判斷）
+    CONTEXT_INDICATORS = (
+        "這個", "那個", "它", "他", "她", "上面", "剛才", "之前", "提到的",
+        "這樣", "那樣", "如何", "怎麼", "為什麼", "還有", "另外", "繼續"
+    )
+    _CONTEXT_PATTERN = re.compile("|".join(map(re.escape, CONTEXT_INDICATORS)))
+    
+    # 考慮對話上下文的系統提示（固定內容，所有請求共用）
+    CONTEXT_SYSTEM_PROMPT = """你是一個基於 Notion 文件的智慧助手，專門回答與文件內容相關的問題。
+
+請遵循以下規則：
+1. 主要基於提供的文件內容回答問題
+2. 考慮對話歷程，保持對話的連貫性
+3. 如果問題涉及之前的對話內容，請適當引用
+4. 使用繁體中文回答
+5. 回答要準確、有幫助且友善
+6. 如果文件中沒有相關資訊，請誠實說明
+7. 可以適當推理，但不要編造資訊
+
+對話上下文將幫助你理解問題的背景和用戶的意圖。"""
+    
+    # 考慮對話上下文的使用者提示範本（str.format 填入參考文件、對話上下文與問題）
+    CONTEXT_USER_PROMPT_TEMPLATE = """參考文件內容：
+{document_context}
+
+{conversation_context}
+
+請根據以上資訊回答問題：{question}"""
+    
+    def __init__(self, notion_client, text_processor, embedder, vector_store, settings, openai_client=None):
         """初始化增強版 RAG 引擎"""
-        super().__init__(notion_client, text_processor, embedder, vector_store, settings)
-        print("🚀 增強版 RAG 引擎已初始化，支援對話上下文")
+        super().__init__(notion_client, text_processor, embedder, vector_store, settings, openai_client)
+        logger.info("🚀 增強版 RAG 引擎已初始化，支援對話上下文")
     
     def query_with_context(self, question: str, conversation_context: str = "", user_id: str = None) -> str:
         """
@@ -24,85 +57,11 @@ class EnhancedRAGEngine(RAGEngine):
             回答字串
         """
         try:
-            if user_id:
-                print(f"🤔 處理用戶 {user_id} 的問題: {question}")
-            else:
-                print(f"🤔 處理問題: {question}")
-            
-            # 如果有對話上下文，先分析是否需要結合上下文
-            context_enhanced_question = self._enhance_question_with_context(question, conversation_context)
-            
-            # 使用查詢處理器分析問題（使用增強後的問題）
-            query_analysis = self.query_processor.process_query(context_enhanced_question)
-            print(f"📊 查詢分析結果:")
-            print(f"  - 意圖: {query_analysis.intent}")
-            print(f"  - 關鍵詞: {query_analysis.keywords}")
-            print(f"  - 置信度: {query_analysis.confidence:.2f}")
-            print(f"  - 搜尋權重: {query_analysis.search_weights}")
-            
-            # 多階段檢索
-            semantic_docs = []
-            keyword_docs = []
-            
-            # 1. 語義搜尋
-            semantic_weight = query_analysis.search_weights.get("semantic", query_analysis.search_weights.get("semantic_search", 0))
-            keyword_weight = query_analysis.search_weights.get("keyword", query_analysis.search_weights.get("keyword_search", 0))
-            
-            if semantic_weight > 0:
-                print("🔍 執行語義搜尋...")
-                for rewritten_query in query_analysis.rewritten_queries:
-                    question_embedding = self.embedder.encode_single(rewritten_query)
-                    docs = self.vector_store.search(
-                        question_embedding,
-                        top_k=self.settings.TOP_K
-                    )
-                    semantic_docs.extend(docs)
-            
-            # 2. 關鍵字搜尋
-            if keyword_weight > 0:
-                print("🔍 執行關鍵字搜尋...")
-                for keyword in query_analysis.keywords:
-                    keyword_embedding = self.embedder.encode_single(keyword)
-                    docs = self.vector_store.search(
-                        keyword_embedding,
-                        top_k=self.settings.TOP_K
-                    )
-                    keyword_docs.extend(docs)
-            
-            # 3. 合併和去重文檔
-            all_docs = []
-            seen_contents = set()
-            
-            # 處理語義搜尋結果
-            for doc in semantic_docs:
-                if doc['content'] not in seen_contents:
-                    seen_contents.add(doc['content'])
-                    doc['score'] *= semantic_weight
-                    all_docs.append(doc)
-            
-            # 處理關鍵字搜尋結果
-            for doc in keyword_docs:
-                if doc['content'] not in seen_contents:
-                    seen_contents.add(doc['content'])
-                    doc['score'] *= keyword_weight
-                    all_docs.append(doc)
-                else:
-                    # 如果文檔已存在，更新分數
-                    for existing_doc in all_docs:
-                        if existing_doc['content'] == doc['content']:
-                            existing_doc['score'] += doc['score'] * keyword_weight
-            
-            # 按綜合分數排序
-            all_docs.sort(key=lambda x: x['score'], reverse=True)
-            relevant_docs = all_docs[:self.settings.TOP_K]
+            query_analysis, relevant_docs = self._retrieve_with_context(question, conversation_context, user_id)
             
             if not relevant_docs:
                 return self._generate_no_result_response(question, conversation_context)
             
-            print(f"📋 找到 {len(relevant_docs)} 個相關文件")
-            for i, doc in enumerate(relevant_docs):
-                print(f"  {i+1}. 綜合分數: {doc['score']:.3f}")
-            
             # 組合上下文
             document_context = self._build_context(relevant_docs)
             
@@ -119,9 +78,71 @@ class EnhancedRAGEngine(RAGEngine):
             return answer
             
         except Exception as e:
-            print(f"❌ 處理問題時發生錯誤: {e}")
+            logger.error("❌ 處理問題時發生錯誤: %s", e)
             return f"抱歉，處理問題時發生錯誤: {str(e)}"
     
+    def query_with_context_stream(self, question: str, conversation_context: str = "",
+                                  user_id: str = None) -> Iterator[str]:
+        """
+        帶上下文的問答查詢（串流輸出，OpenAI 回答邊生成邊回傳片段）
+        
+        Args:
+            question: 用戶問題
+            conversation_context: 對話上下文
+            user_id: 用戶ID（用於日誌）
+            
+        Yields:
+            回答片段
+        """
+        try:
+            query_analysis, relevant_docs = self._retrieve_with_context(question, conversation_context, user_id)
+            
+            if not relevant_docs:
+                yield self._generate_no_result_response(question, conversation_context)
+                return
+            
+            document_context = self._build_context(relevant_docs)
+            
+            if self.use_openai:
+                yield from self._stream_context_aware_response(
+                    question, document_context, conversation_context, query_analysis
+                )
+            else:
+                yield self._generate_simple_context_response(
+                    question, document_context, conversation_context
+                )
+            
+        except Exception as e:
+            logger.error("❌ 處理問題時發生錯誤: %s", e)
+            yield f"抱歉，處理問題時發生錯誤: {str(e)}"
+    
+    def _retrieve_with_context(self, question: str, conversation_context: str,
+                               user_id: str = None) -> Tuple[Any, List[Dict[str, Any]]]:
+        """結合對話上下文分析問題並檢索相關文件
+        Returns:
+            (查詢分析結果, 依綜合分數排序的相關文件)
+        """
+        if user_id:
+            logger.debug("🤔 處理用戶 %s 的問題: %s", user_id, question)
+        else:
+            logger.debug("🤔 處理問題: %s", question)
+        
+        # 如果有對話上下文，先分析是否需要結合上下文（無上下文時直接使用原問題）
+        context_enhanced_question = (
+            self._enhance_question_with_context(question, conversation_context)
+            if conversation_context else question
+        )
+        
+        # 使用查詢處理器分析問題（使用增強後的問題）
+        query_analysis = self._analyze_query(context_enhanced_question)
+        logger.debug("📊 查詢分析結果: 意圖=%s, 關鍵詞=%s, 置信度=%.2f, 搜尋權重=%s",
+                     query_analysis.intent, query_analysis.keywords,
+                     query_analysis.confidence, query_analysis.search_weights)
+        
+        relevant_docs = self._search_with_analysis(query_analysis)
+        
+        return query_analysis, relevant_docs
+    
     def _enhance_question_with_context(self, question: str, conversation_context: str) -> str:
         """
         結合對話上下文增強問題
@@ -137,56 +158,47 @@ class EnhancedRAGEngine(RAGEngine):
             return question
         
         # 檢查問題是否包含代詞或指示詞，需要上下文理解
-        context_indicators = [
-            "這個", "那個", "它", "他", "她", "上面", "剛才", "之前", "提到的",
-            "這樣", "那樣", "如何", "怎麼", "為什麼", "還有", "另外", "繼續"
-        ]
-        
-        needs_context = any(indicator in question for indicator in context_indicators)
+        needs_context = self._CONTEXT_PATTERN.search(question) is not None
         
         if needs_context:
             # 結合上下文創建增強問題（僅供內部查詢使用）
             enhanced_question = f"{conversation_context}\n當前問題: {question}"
-            print(f"🔗 問題需要上下文理解，已增強查詢")
+            logger.debug("🔗 問題需要上下文理解，已增強查詢")
             return enhanced_question
         
         return question
     
+    def _build_context_aware_messages(self, question: str, document_context: str,
+                                      conversation_context: str) -> List[Dict[str, str]]:
+        """建立考慮對話上下文的 OpenAI 對話訊息（系統提示固定不變，可使用 OpenAI 的前綴快取）"""
+        user_prompt = self.CONTEXT_USER_PROMPT_TEMPLATE.format(
+            document_context=document_context,
+            conversation_context=conversation_context,
+            question=question
+        )
+        
+        return [
+            {"role": "system", "content": self.CONTEXT_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    @staticmethod
+    def _low_confidence_hint(query_analysis) -> str:
+        """置信度偏低時附加在回答後的提示"""
+        if query_analysis.confidence < 0.5:
+            return f"\n\n💡 提示：我對這個問題的理解置信度較低（{query_analysis.confidence:.1%}），如果回答不夠準確，請嘗試重新表述問題。"
+        return ""
+    
     def _generate_context_aware_response(self, question: str, document_context: str, 
                                        conversation_context: str, query_analysis) -> str:
         """
         生成考慮對話上下文的 OpenAI 回答
         """
         try:
-            # 建立系統提示
-            system_prompt = """你是一個基於 Notion 文件的智慧助手，專門回答與文件內容相關的問題。
-
-請遵循以下規則：
-1. 主要基於提供的文件內容回答問題
-2. 考慮對話歷程，保持對話的連貫性
-3. 如果問題涉及之前的對話內容，請適當引用
-4. 使用繁體中文回答
-5. 回答要準確、有幫助且友善
-6. 如果文件中沒有相關資訊，請誠實說明
-7. 可以適當推理，但不要編造資訊
-
-對話上下文將幫助你理解問題的背景和用戶的意圖。"""
-            
-            # 建立用戶提示
-            user_prompt = f"""參考文件內容：
-{document_context}
-
-{conversation_context}
-
-請根據以上資訊回答問題：{question}"""
-            
             # 呼叫 OpenAI API
             response = self.openai_client.chat.completions.create(
                 model=self.settings.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=self._build_context_aware_messages(question, document_context, conversation_context),
                 temperature=0.7,
                 max_tokens=1000
             )
@@ -194,15 +206,46 @@ class EnhancedRAGEngine(RAGEngine):
             answer = response.choices[0].message.content.strip()
             
             # 添加置信度資訊
-            if query_analysis.confidence < 0.5:
-                answer += f"\n\n💡 提示：我對這個問題的理解置信度較低（{query_analysis.confidence:.1%}），如果回答不夠準確，請嘗試重新表述問題。"
-            
-            return answer
+            return answer + self._low_confidence_hint(query_analysis)
             
         except Exception as e:
-            print(f"❌ OpenAI API 呼叫失敗: {e}")
+            logger.error("❌ OpenAI API 呼叫失敗: %s", e)
             return self._generate_simple_context_response(question, document_context, conversation_context)
     
+    def _stream_context_aware_response(self, question: str, document_context: str,
+                                       conversation_context: str, query_analysis) -> Iterator[str]:
+        """
+        串流生成考慮對話上下文的 OpenAI 回答（逐段回傳新產生的文字）
+        """
+        has_output = False
+        try:
+            stream = self.openai_client.chat.completions.create(
+                model=self.settings.OPENAI_MODEL,
+                messages=self._build_context_aware_messages(question, document_context, conversation_context),
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True
+            )
+            
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    has_output = True
+                    yield delta
+            
+            # 添加置信度資訊
+            hint = self._low_confidence_hint(query_analysis)
+            if hint:
+                yield hint
+            
+        except Exception as e:
+            logger.error("❌ OpenAI 串流回應生成失敗: %s", e)
+            # 尚未輸出任何內容時改用簡單回答
+            if not has_output:
+                yield self._generate_simple_context_response(question, document_context, conversation_context)
+    
     def _generate_simple_context_response(self, question: str, document_context: str, 
                                         conversation_context: str) -> str:
         """
@@ -251,4 +294,10 @@ class EnhancedRAGEngine(RAGEngine):
         """
         向後相容的查詢方法（無上下文）
         """
-        return self.query_with_context(question, "", None) 
\ No newline at end of file
+        return self.query_with_context(question, "", None)
+    
+    def query_stream(self, question: str) -> Iterator[str]:
+        """
+        向後相容的串流查詢方法（無上下文）
+        """
+        return self.query_with_context_stream(question, "", None)
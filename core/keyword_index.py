@@ -0,0 +1,81 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+# 中日韓文字連續片段，或其他文字的字詞（中文沒有空白分詞，改用相鄰字元二元組）
+_CJK_CHARS = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_PATTERN = re.compile(rf"([{_CJK_CHARS}]+)|([^\W_{_CJK_CHARS}]+)")
+
+def tokenize(text: str) -> List[str]:
+    """切分關鍵字檢索用詞：英數字詞轉小寫，中文切為相鄰字元二元組（單一字元則保留單字）"""
+    tokens = []
+    for cjk, word in _TOKEN_PATTERN.findall(text.lower()):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+class BM25Index:
+    """BM25 關鍵字索引 - 倒排索引預先計算每個詞在各文件的權重，查詢時只需累加"""
+
+    def __init__(self, documents: Iterable[Tuple[int, str]], k1: float = 1.5, b: float = 0.75):
+        """
+        建立索引
+
+        Args:
+            documents: (文件ID, 內容) 序列
+            k1: 詞頻飽和參數
+            b: 文件長度正規化參數
+        """
+        doc_ids = []
+        lengths = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for position, (doc_id, text) in enumerate(documents):
+            counts = Counter(tokenize(text))
+            doc_ids.append(doc_id)
+            lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((position, tf))
+
+        self.doc_ids = np.array(doc_ids, dtype=np.int64)
+        num_docs = len(doc_ids)
+        lengths = np.array(lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) if num_docs else 0.0
+        length_norm = k1 * (1 - b + b * lengths / avg_length) if avg_length > 0 else np.full(num_docs, k1)
+
+        # 詞 -> (文件位置, BM25 權重)，文件長度固定，權重可在建立時算好
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for token, entries in postings.items():
+            positions = np.fromiter((p for p, _ in entries), dtype=np.int64, count=len(entries))
+            tf = np.fromiter((t for _, t in entries), dtype=np.float32, count=len(entries))
+            idf = math.log(1 + (num_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            self._postings[token] = (positions, idf * tf * (k1 + 1) / (tf + length_norm[positions]))
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def search(self, query: str, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        搜尋符合查詢詞的文件
+
+        Returns:
+            (分數, 文件ID)：依分數由高到低，只包含至少符合一個查詢詞的文件
+        """
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        # 重複的查詢詞只計算一次
+        for token in dict.fromkeys(tokenize(query)):
+            entry = self._postings.get(token)
+            if entry is not None:
+                positions, weights = entry
+                scores[positions] += weights
+
+        matched = np.flatnonzero(scores > 0)
+        if top_k < len(matched):
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return scores[order], self.doc_ids[order]
@@ -1,11 +1,97 @@
+import asyncio
+import logging
+import random
+import threading
 import requests
-from typing import Dict, List, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Any, Optional
 from datetime import datetime
+from .cache_manager import CacheManager
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import aiohttp
+    ASYNC_REQUEST_ERRORS = (aiohttp.ClientError,)
+    # 可重試的非同步連線錯誤（連線中斷、逾時）
+    ASYNC_RETRY_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+except ImportError:
+    aiohttp = None
+    ASYNC_REQUEST_ERRORS = ()
+    ASYNC_RETRY_ERRORS = ()
+
+# 大型區塊回應使用 orjson 解析（未安裝時使用標準函式庫 json）
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# 區塊回應優先以 simdjson 延遲解析，只取出文字擷取會用到的欄位
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# 支援的區塊類型與文字前綴（to_do 的前綴依勾選狀態決定）
+BLOCK_PREFIXES = {
+    "paragraph": "",
+    "heading_1": "# ",
+    "heading_2": "## ",
+    "heading_3": "### ",
+    "bulleted_list_item": "• ",
+    "numbered_list_item": "1. ",
+    "to_do": "☐ ",
+}
+
+def parse_block_children(raw: bytes) -> Dict[str, Any]:
+    """解析區塊子內容回應
+    
+    有 simdjson 時只具體化支援區塊的 type、rich_text 的 plain_text 與 to_do 勾選狀態，
+    其餘欄位（annotations、建立者、時間等）不會轉成 Python 物件；否則完整解析。
+    """
+    if simdjson is None:
+        return json_loads(raw)
+    
+    doc = simdjson.Parser().parse(raw)
+    results = []
+    for block in doc.get("results") or ():
+        block_type = block.get("type")
+        slim_block = {"id": block.get("id"), "type": block_type, "has_children": block.get("has_children", False)}
+        if block_type in BLOCK_PREFIXES:
+            data = block[block_type]
+            slim_data = {"rich_text": [{"plain_text": text.get("plain_text", "")} for text in data.get("rich_text") or ()]}
+            if block_type == "to_do":
+                slim_data["checked"] = data.get("checked", False)
+            slim_block[block_type] = slim_data
+        results.append(slim_block)
+    
+    return {"results": results, "has_more": doc.get("has_more", False), "next_cursor": doc.get("next_cursor")}
 
 class NotionClient:
     """Notion API客戶端"""
     
-    def __init__(self, token: str):
+    # 同步 Session 與非同步請求共用的暫時性錯誤重試設定
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    MAX_RETRIES = 3
+    BACKOFF_FACTOR = 0.3
+    # 退避時間額外加上 0 ~ BACKOFF_JITTER 秒的隨機值，避免並行請求同時重試
+    BACKOFF_JITTER = 0.3
+    # 單次請求逾時秒數（逾時後連同重試計算）
+    REQUEST_TIMEOUT = 30
+    
+    def __init__(self, token: str, cache_ttl: float = 3600, page_cache_ttl: float = 30, cache_size: int = 512,
+                 rate_limit: float = 3.0):
+        """
+        Args:
+            token: Notion 整合權杖
+            cache_ttl: 頁面完整內容的快取秒數（以 last_edited_time 確認未變更才使用，0 表示停用）
+            page_cache_ttl: 頁面資訊的快取秒數（0 表示每次都向 Notion 確認）
+            cache_size: 最多快取的項目數
+            rate_limit: 每秒最多送出的請求數（Notion 限制平均 3 次/秒，0 表示不限制）
+        """
         self.token = token
         self.headers = {
             "Authorization": f"Bearer {token}",
@@ -13,29 +99,157 @@ class NotionClient:
             "Notion-Version": "2022-06-28"
         }
         self.base_url = "https://api.notion.com/v1"
+        
+        # 共用連線池（keep-alive 重用 TCP/TLS 連線），暫時性錯誤自動重試
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        retry_options = dict(
+            total=self.MAX_RETRIES,
+            backoff_factor=self.BACKOFF_FACTOR,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "POST"])
+        )
+        try:
+            # 退避時間加上隨機抖動（urllib3 2.0 以上支援）
+            retry = Retry(**retry_options, backoff_jitter=self.BACKOFF_JITTER)
+        except TypeError:
+            retry = Retry(**retry_options)
+        self._session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+        
+        # 頁面資訊與完整內容快取（content 存放 (last_edited_time, 完整內容)）
+        self._cache = CacheManager(maxsize=cache_size, ttls={"page": page_cache_ttl, "content": cache_ttl})
+        
+        # 同步與非同步請求共用的速率限制（並行請求依序排隊，避免觸發 429）
+        self._rate_limiter = RateLimiter(rate_limit, 1.0)
+        
+        # 非同步連線（需要安裝 aiohttp，於事件迴圈中延遲建立並綁定該迴圈）
+        self._async_session = None
+        self._async_loop = None
+        
+        # 進行中的頁面內容請求（同一頁面的並行呼叫共用同一個結果）
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._inflight_async: Dict[str, asyncio.Task] = {}
+    
+    def close(self):
+        """關閉同步連線池（非同步連線需在事件迴圈內以 aclose() 關閉）"""
+        self._session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def get_page(self, page_id: str) -> Dict[str, Any]:
         """獲取頁面資訊"""
+        page_info = self._cache.get("page", page_id)
+        if page_info is not None:
+            return page_info
         url = f"{self.base_url}/pages/{page_id}"
-        response = requests.get(url, headers=self.headers)
+        self._rate_limiter.acquire()
+        response = self._session.get(url, timeout=self.REQUEST_TIMEOUT)
         response.raise_for_status()
-        return response.json()
+        page_info = json_loads(response.content)
+        self._cache.set("page", page_id, page_info)
+        return page_info
     
     def get_block_children(self, block_id: str) -> List[Dict[str, Any]]:
         """獲取區塊子內容"""
         all_blocks = []
+        for blocks in self.iter_block_children(block_id):
+            all_blocks.extend(blocks)
+        return all_blocks
+    
+    def iter_block_children(self, block_id: str) -> Iterator[List[Dict[str, Any]]]:
+        """逐頁產生區塊子內容（每次 API 回應的區塊，不需等待所有分頁下載完成）"""
         has_more = True
         start_cursor = None
+        url = f"{self.base_url}/blocks/{block_id}/children"
         
         while has_more:
-            url = f"{self.base_url}/blocks/{block_id}/children"
             params = {"page_size": 100}
             if start_cursor:
                 params["start_cursor"] = start_cursor
             
-            response = requests.get(url, headers=self.headers, params=params)
+            self._rate_limiter.acquire()
+            response = self._session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
             response.raise_for_status()
-            data = response.json()
+            data = parse_block_children(response.content)
+            
+            yield data.get("results", [])
+            has_more = data.get("has_more", False)
+            start_cursor = data.get("next_cursor")
+    
+    async def _get_async_session(self):
+        """取得目前事件迴圈共用的 aiohttp 連線（keep-alive 重用連線）"""
+        if aiohttp is None:
+            raise RuntimeError("非同步 Notion API 需要安裝 aiohttp：pip install aiohttp")
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_session.closed or self._async_loop is not loop:
+            self._async_session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT)
+            )
+            self._async_loop = loop
+        return self._async_session
+    
+    async def aclose(self):
+        """關閉非同步連線"""
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+        self._async_loop = None
+    
+    async def _get_json_async(self, url: str, params: Optional[Dict[str, Any]] = None, loads=json_loads) -> Dict[str, Any]:
+        """非同步 GET 請求（暫時性錯誤與連線錯誤以指數退避加隨機抖動重試，429 時優先依 Retry-After 等待）"""
+        session = await self._get_async_session()
+        for attempt in range(self.MAX_RETRIES + 1):
+            await self._rate_limiter.acquire_async()
+            try:
+                async with session.get(url, params=params) as response:
+                    if response.status in self.RETRY_STATUSES and attempt < self.MAX_RETRIES:
+                        retry_after = response.headers.get("Retry-After")
+                        await asyncio.sleep(float(retry_after) if retry_after and retry_after.isdigit() else self._backoff(attempt))
+                        continue
+                    response.raise_for_status()
+                    return loads(await response.read())
+            except ASYNC_RETRY_ERRORS:
+                if attempt >= self.MAX_RETRIES:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+    
+    def _backoff(self, attempt: int) -> float:
+        """第 attempt 次重試前的等待秒數"""
+        return self.BACKOFF_FACTOR * (2 ** attempt) + random.uniform(0, self.BACKOFF_JITTER)
+    
+    async def get_page_async(self, page_id: str) -> Dict[str, Any]:
+        """獲取頁面資訊（非同步）"""
+        page_info = self._cache.get("page", page_id)
+        if page_info is not None:
+            return page_info
+        page_info = await self._get_json_async(f"{self.base_url}/pages/{page_id}")
+        self._cache.set("page", page_id, page_info)
+        return page_info
+    
+    async def get_block_children_async(self, block_id: str) -> List[Dict[str, Any]]:
+        """獲取區塊子內容（非同步）
+        
+        Notion 分頁游標只能從上一頁回應取得，同一區塊的分頁必須依序請求；
+        並行的效益來自與頁面資訊、其他頁面的請求重疊。
+        """
+        all_blocks = []
+        has_more = True
+        start_cursor = None
+        url = f"{self.base_url}/blocks/{block_id}/children"
+        
+        while has_more:
+            params = {"page_size": 100}
+            if start_cursor:
+                params["start_cursor"] = start_cursor
+            
+            data = await self._get_json_async(url, params, loads=parse_block_children)
             
             all_blocks.extend(data.get("results", []))
             has_more = data.get("has_more", False)
@@ -43,49 +257,94 @@ class NotionClient:
         
         return all_blocks
     
+    async def get_page_content_async(self, page_id: str) -> str:
+        """獲取完整頁面內容（非同步，頁面資訊與內容區塊同時請求；未安裝 aiohttp 時改在執行緒中同步請求）
+        
+        同一頁面同時有多個請求時只向 Notion 請求一次，其餘呼叫等待同一個結果。
+        """
+        loop = asyncio.get_running_loop()
+        if aiohttp is None:
+            return await loop.run_in_executor(None, self.get_page_content, page_id)
+        
+        task = self._inflight_async.get(page_id)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._fetch_page_content_async(page_id))
+            self._inflight_async[page_id] = task
+            task.add_done_callback(lambda done: self._inflight_async.pop(page_id, None) if self._inflight_async.get(page_id) is done else None)
+        # 單一呼叫被取消時不影響其他等待同一頁面的呼叫
+        return await asyncio.shield(task)
+    
+    async def _fetch_page_content_async(self, page_id: str) -> str:
+        """實際向 Notion 請求頁面內容（非同步）"""
+        try:
+            if self._cache.get("content", page_id) is not None:
+                # 有快取內容時先取頁面資訊確認是否變更，未變更即不需下載內容區塊
+                page_info = await self.get_page_async(page_id)
+                cached_content = self._cached_content(page_id, page_info)
+                if cached_content is not None:
+                    return cached_content
+                blocks = await self.get_block_children_async(page_id)
+            else:
+                page_info, blocks = await asyncio.gather(
+                    self.get_page_async(page_id),
+                    self.get_block_children_async(page_id)
+                )
+            return self._store_content(page_id, page_info, self._build_page_content(page_info, blocks))
+        except ASYNC_REQUEST_ERRORS as e:
+            logger.error("❌ Notion API 請求失敗: %s", e)
+            raise
+        except Exception as e:
+            logger.error("❌ 處理頁面內容時發生錯誤: %s", e)
+            raise
+    
+    async def get_pages_content_async(self, page_ids: List[str]) -> List[str]:
+        """同時獲取多個頁面的完整內容（順序與 page_ids 相同）"""
+        return list(await asyncio.gather(*(self.get_page_content_async(page_id) for page_id in page_ids)))
+    
+    def get_pages_content(self, page_ids: List[str]) -> List[str]:
+        """同時獲取多個頁面的完整內容（同步介面）
+        
+        已安裝 aiohttp 時以單一事件迴圈並行請求，否則退回執行緒池搭配同步連線池。
+        """
+        if aiohttp is None:
+            with ThreadPoolExecutor(max_workers=min(len(page_ids), 10) or 1) as executor:
+                return list(executor.map(self.get_page_content, page_ids))
+        
+        async def fetch_all():
+            try:
+                return await self.get_pages_content_async(page_ids)
+            finally:
+                # 事件迴圈結束後連線即無法使用，在迴圈內關閉
+                await self.aclose()
+        
+        return asyncio.run(fetch_all())
+    
     def extract_text_from_blocks(self, blocks: List[Dict[str, Any]]) -> str:
-        """從區塊中提取文本"""
+        """從區塊中提取文本（依區塊類型查表取得前綴，單次走訪）"""
         text_content = []
+        # 迴圈內重複使用的方法先綁定為區域變數
+        append = text_content.append
+        get_prefix = BLOCK_PREFIXES.get
         
         for block in blocks:
             block_type = block.get("type")
+            prefix = get_prefix(block_type)
+            if prefix is None:
+                continue
             
-            if block_type == "paragraph":
-                text = self._extract_rich_text(block["paragraph"]["rich_text"])
-                if text:
-                    text_content.append(text)
-            
-            elif block_type == "heading_1":
-                text = self._extract_rich_text(block["heading_1"]["rich_text"])
-                if text:
-                    text_content.append(f"# {text}")
-            
-            elif block_type == "heading_2":
-                text = self._extract_rich_text(block["heading_2"]["rich_text"])
-                if text:
-                    text_content.append(f"## {text}")
+            data = block[block_type]
+            rich_text = data["rich_text"]
+            # 多數區塊只有一段文字，不需建立串列再合併
+            if len(rich_text) == 1:
+                text = rich_text[0].get("plain_text", "")
+            else:
+                text = "".join([t.get("plain_text", "") for t in rich_text])
+            if not text:
+                continue
             
-            elif block_type == "heading_3":
-                text = self._extract_rich_text(block["heading_3"]["rich_text"])
-                if text:
-                    text_content.append(f"### {text}")
-            
-            elif block_type == "bulleted_list_item":
-                text = self._extract_rich_text(block["bulleted_list_item"]["rich_text"])
-                if text:
-                    text_content.append(f"• {text}")
-            
-            elif block_type == "numbered_list_item":
-                text = self._extract_rich_text(block["numbered_list_item"]["rich_text"])
-                if text:
-                    text_content.append(f"1. {text}")
-            
-            elif block_type == "to_do":
-                text = self._extract_rich_text(block["to_do"]["rich_text"])
-                checked = block["to_do"].get("checked", False)
-                checkbox = "☑️" if checked else "☐"
-                if text:
-                    text_content.append(f"{checkbox} {text}")
+            if block_type == "to_do":
+                prefix = "☑️ " if data.get("checked", False) else "☐ "
+            append(prefix + text)
         
         return "\n\n".join(text_content)
     
@@ -94,34 +353,123 @@ class NotionClient:
         return "".join([text.get("plain_text", "") for text in rich_text])
     
     def get_page_content(self, page_id: str) -> str:
-        """獲取完整頁面內容"""
+        """獲取完整頁面內容（同一頁面的並行呼叫只向 Notion 請求一次，共用同一個結果）"""
+        with self._inflight_lock:
+            future = self._inflight.get(page_id)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[page_id] = future
+        
+        if not is_owner:
+            return future.result()
+        
         try:
-            # 獲取頁面基本資訊
-            page_info = self.get_page(page_id)
-            
-            # 獲取頁面標題
-            title = "未知標題"
-            if 'properties' in page_info:
-                for prop_name, prop_data in page_info['properties'].items():
-                    if prop_data.get('type') == 'title':
-                        title_array = prop_data.get('title', [])
-                        if title_array:
-                            title = title_array[0].get('plain_text', '未知標題')
-                        break
-            
-            # 獲取頁面內容區塊
-            blocks = self.get_block_children(page_id)
-            content = self.extract_text_from_blocks(blocks)
-            
-            # 組合完整內容
-            full_content = f"# {title}\n\n{content}"
+            content = self._fetch_page_content(page_id)
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(page_id, None)
+    
+    def _fetch_page_content(self, page_id: str) -> str:
+        """實際向 Notion 請求頁面內容"""
+        try:
+            if self._cache.get("content", page_id) is not None:
+                # 有快取內容時先取頁面資訊確認是否變更，未變更即不需下載內容區塊
+                page_info = self.get_page(page_id)
+                cached_content = self._cached_content(page_id, page_info)
+                if cached_content is not None:
+                    return cached_content
+                blocks = self.get_block_children(page_id)
+            else:
+                # 同時獲取頁面基本資訊與內容區塊（兩個請求互不相依）
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    page_future = executor.submit(self.get_page, page_id)
+                    blocks_future = executor.submit(self.get_block_children, page_id)
+                    page_info = page_future.result()
+                    blocks = blocks_future.result()
             
-            print(f"✅ 成功獲取頁面內容，共 {len(content)} 字符")
-            return full_content
+            return self._store_content(page_id, page_info, self._build_page_content(page_info, blocks))
             
         except requests.exceptions.RequestException as e:
-            print(f"❌ Notion API 請求失敗: {e}")
+            logger.error("❌ Notion API 請求失敗: %s", e)
             raise
         except Exception as e:
-            print(f"❌ 處理頁面內容時發生錯誤: {e}")
-            raise
\ No newline at end of file
+            logger.error("❌ 處理頁面內容時發生錯誤: %s", e)
+            raise
+    
+    def _cached_content(self, page_id: str, page_info: Dict[str, Any]) -> Optional[str]:
+        """頁面的 last_edited_time 與快取相同時回傳快取內容"""
+        cached = self._cache.get("content", page_id)
+        last_edited_time = page_info.get("last_edited_time")
+        if cached is not None and last_edited_time and cached[0] == last_edited_time:
+            logger.info("♻️ 頁面未變更（最後編輯: %s），使用快取內容", last_edited_time)
+            return cached[1]
+        return None
+    
+    def _store_content(self, page_id: str, page_info: Dict[str, Any], content: str) -> str:
+        """快取頁面完整內容（沒有 last_edited_time 時無法確認變更，不快取）"""
+        last_edited_time = page_info.get("last_edited_time")
+        if last_edited_time:
+            self._cache.set("content", page_id, (last_edited_time, content))
+        return content
+    
+    def invalidate_cache(self, page_id: Optional[str] = None):
+        """清除頁面快取（未指定頁面時全部清除）"""
+        if page_id is None:
+            self._cache.clear()
+        else:
+            self._cache.invalidate("page", page_id)
+            self._cache.invalidate("content", page_id)
+    
+    def iter_page_content(self, page_id: str) -> Iterator[str]:
+        """逐段產生完整頁面內容（先產生標題，之後每下載一頁區塊即產生該頁的文字）
+        
+        以空行串接所有片段即為 get_page_content 的結果，完成後同樣寫入內容快取；
+        頁面未變更時直接產生快取的完整內容。
+        """
+        page_info = self.get_page(page_id)
+        cached_content = self._cached_content(page_id, page_info)
+        if cached_content is not None:
+            yield cached_content
+            return
+        
+        header = f"# {self._page_title(page_info)}"
+        yield header
+        
+        texts = []
+        for blocks in self.iter_block_children(page_id):
+            text = self.extract_text_from_blocks(blocks)
+            if text:
+                texts.append(text)
+                yield text
+        
+        content = "\n\n".join(texts)
+        logger.info("✅ 成功獲取頁面內容，共 %s 字符", len(content))
+        self._store_content(page_id, page_info, f"{header}\n\n{content}")
+    
+    def _page_title(self, page_info: Dict[str, Any]) -> str:
+        """取得頁面標題"""
+        title = "未知標題"
+        if 'properties' in page_info:
+            for prop_name, prop_data in page_info['properties'].items():
+                if prop_data.get('type') == 'title':
+                    title_array = prop_data.get('title', [])
+                    if title_array:
+                        title = title_array[0].get('plain_text', '未知標題')
+                    break
+        return title
+    
+    def _build_page_content(self, page_info: Dict[str, Any], blocks: List[Dict[str, Any]]) -> str:
+        """由頁面資訊與內容區塊組合完整頁面內容"""
+        content = self.extract_text_from_blocks(blocks)
+        
+        # 組合完整內容
+        full_content = f"# {self._page_title(page_info)}\n\n{content}"
+        
+        logger.info("✅ 成功獲取頁面內容，共 %s 字符", len(content))
+        return full_content
\ No newline at end of file
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+
+class QueryCache:
+    """問答結果快取 - 相同或幾乎相同的問題直接回傳先前的回答"""
+
+    def __init__(self, embedder=None, maxsize: int = 512, similarity_threshold: float = 0.95,
+                 max_recent_queries: int = 256, ttl: float = 3600):
+        """
+        初始化問答快取
+
+        Args:
+            embedder: 嵌入器（提供時啟用語義比對，None 則只比對正規化後的問題）
+            maxsize: 最多快取的回答數量（LRU 淘汰）
+            similarity_threshold: 視為相同問題的最低相似度（正規化向量內積）
+            max_recent_queries: 語義比對時保留的最近問題數量
+            ttl: 回答的存活秒數（0 表示不過期，只依內容版本失效）
+        """
+        self.embedder = embedder
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self.max_recent_queries = max_recent_queries
+        self.ttl = ttl
+
+        # (正規化問題, 內容版本) -> (到期時間, 回答)，到期時間使用 time.monotonic()
+        self._responses: "OrderedDict[Tuple[str, int], Tuple[float, str]]" = OrderedDict()
+
+        # 最近問題的向量（環狀緩衝區），與 _recent_keys 一一對應
+        self._recent_embeddings: Optional[np.ndarray] = None
+        self._recent_keys = [None] * max_recent_queries
+        self._recent_pos = 0
+
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """正規化問題文字（去除前後空白、轉小寫、合併空白）"""
+        return " ".join(question.strip().lower().split())
+
+    def _lookup(self, key: Tuple[str, int]) -> Optional[str]:
+        """取得未過期的回答（需持有鎖），過期的項目直接移除"""
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if time.monotonic() >= expires_at:
+            del self._responses[key]
+            return None
+        self._responses.move_to_end(key)
+        return response
+
+    def get(self, question: str, version: int) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        查詢快取
+
+        Returns:
+            (回答, 問題向量)：未命中時回答為 None；問題向量可於 put 時重複使用
+        """
+        key = (self.normalize(question), version)
+        with self._lock:
+            response = self._lookup(key)
+            if response is not None:
+                return response, None
+
+        if self.embedder is None:
+            return None, None
+
+        embedding = self.embedder.encode_single(question)
+        with self._lock:
+            if self._recent_embeddings is None:
+                return None, embedding
+
+            # 與最近問題比對（向量皆已正規化，內積即為餘弦相似度）
+            similarities = self._recent_embeddings @ embedding
+            best = int(np.argmax(similarities))
+            best_key = self._recent_keys[best]
+            if (similarities[best] >= self.similarity_threshold and best_key is not None
+                    and best_key[1] == version):
+                response = self._lookup(best_key)
+                if response is not None:
+                    return response, embedding
+
+        return None, embedding
+
+    def put(self, question: str, version: int, response: str, embedding: Optional[np.ndarray] = None):
+        """寫入快取"""
+        key = (self.normalize(question), version)
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+        with self._lock:
+            self._responses[key] = (expires_at, response)
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.maxsize:
+                self._responses.popitem(last=False)
+
+            if embedding is not None:
+                if self._recent_embeddings is None:
+                    self._recent_embeddings = np.zeros(
+                        (self.max_recent_queries, embedding.shape[0]), dtype=np.float32
+                    )
+                self._recent_embeddings[self._recent_pos] = embedding
+                self._recent_keys[self._recent_pos] = key
+                self._recent_pos = (self._recent_pos + 1) % self.max_recent_queries
+
+    def clear(self):
+        """清空快取（Notion 內容更新後使用）"""
+        with self._lock:
+            self._responses.clear()
+            self._recent_embeddings = None
+            self._recent_keys = [None] * self.max_recent_queries
+            self._recent_pos = 0
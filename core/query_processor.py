@@ -2,7 +2,16 @@ from typing import Dict, Any, List
 import re
 from dataclasses import dataclass
 from enum import Enum
-import json
+import logging
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
 
 class QueryIntent(Enum):
     """查詢意圖類型"""
@@ -29,6 +38,39 @@ class QueryAnalysis:
 class QueryProcessor:
     """查詢處理器：負責查詢意圖理解和重寫"""
     
+    # 規則分析的意圖關鍵詞（依優先順序由低到高，同時命中多種意圖時取優先順序最高者）
+    INTENT_KEYWORDS = (
+        (QueryIntent.TEMPORAL, ("時間", "日期", "幾點", "什麼時候", "何時", "多久")),
+        (QueryIntent.LOCATION, ("地點", "在哪", "位置", "哪裡", "何處")),
+        (QueryIntent.PROCEDURAL, ("如何", "怎麼", "步驟", "流程", "方法")),
+        (QueryIntent.CONCEPTUAL, ("什麼是", "定義", "概念", "解釋", "說明")),
+    )
+    _KEYWORD_INTENTS = {kw: intent for intent, kws in INTENT_KEYWORDS for kw in kws}
+    _INTENT_PRIORITY = {intent: i for i, (intent, _) in enumerate(INTENT_KEYWORDS)}
+    # 規則分析依意圖決定的搜尋權重（未列出的意圖使用 DEFAULT_SEARCH_WEIGHTS）
+    DEFAULT_SEARCH_WEIGHTS = {"semantic": 0.7, "keyword": 0.3}
+    INTENT_SEARCH_WEIGHTS = {
+        QueryIntent.CONCEPTUAL: {"semantic": 0.8, "keyword": 0.2},
+        QueryIntent.PROCEDURAL: {"semantic": 0.8, "keyword": 0.2},
+        QueryIntent.TEMPORAL: {"semantic": 0.5, "keyword": 0.5},
+        QueryIntent.LOCATION: {"semantic": 0.5, "keyword": 0.5},
+    }
+    # 各意圖的重寫查詢樣板
+    REWRITE_TEMPLATES = {
+        QueryIntent.TEMPORAL: ("關於{}的時間安排", "{}的具體時間", "{}什麼時候", "{}的時程"),
+        QueryIntent.LOCATION: ("{}的地點", "{}在哪裡", "{}的位置", "{}的場所"),
+        QueryIntent.PROCEDURAL: ("如何{}", "{}的步驟", "{}的流程", "{}的方法"),
+        QueryIntent.CONCEPTUAL: ("什麼是{}", "{}的定義", "{}的概念", "{}的解釋"),
+    }
+    
+    # 產生關鍵詞兩兩組合時最多使用的關鍵詞數（避免關鍵詞很多時組合數平方成長）
+    MAX_PAIR_KEYWORDS = 5
+    
+    # 以前瞻比對找出每個位置的關鍵詞（允許重疊），一次掃描取得所有命中的意圖
+    _INTENT_PATTERN = re.compile(
+        "(?=(" + "|".join(re.escape(kw) for kw in sorted(_KEYWORD_INTENTS, key=len, reverse=True)) + "))"
+    )
+    
     def __init__(self, openai_client=None):
         self.openai_client = openai_client
         self.use_openai = openai_client is not None
@@ -52,18 +94,31 @@ class QueryProcessor:
             "time": "時間",
             # 可以根據需要擴充
         }
+        
+        # 錯字與中英對照合併為單一替換表，預先編譯成一個正規表示式（長詞優先），一次掃描完成替換
+        self._replace_map = {
+            typo: correct
+            for correct, typos in self.typo_mapping.items()
+            for typo in typos
+            if typo != correct
+        }
+        self._replace_map.update(self.en_zh_mapping)
+        self._replace_pattern = re.compile(
+            "|".join(re.escape(k) for k in sorted(self._replace_map, key=len, reverse=True))
+        )
     
     def process_query(self, query: str) -> QueryAnalysis:
         """處理查詢：包含意圖理解和重寫"""
         try:
             # 1. 基礎清理
-            cleaned_query = self._clean_query(query)
+            cleaned_query = self.clean_query(query)
             
             # 2. 使用 OpenAI 進行深度分析（如果可用）
             if self.use_openai:
                 analysis = self._analyze_with_openai(cleaned_query)
             else:
                 analysis = self._analyze_with_rules(cleaned_query)
+            analysis["original_query"] = cleaned_query
             
             # 3. 生成重寫查詢
             rewritten_queries = self._generate_rewritten_queries(analysis)
@@ -79,7 +134,7 @@ class QueryProcessor:
             )
             
         except Exception as e:
-            print(f"❌ 查詢處理失敗: {e}")
+            logger.error("❌ 查詢處理失敗: %s", e)
             # 返回基本分析結果
             return QueryAnalysis(
                 original_query=query,
@@ -91,21 +146,14 @@ class QueryProcessor:
                 search_weights={"semantic": 0.7, "keyword": 0.3}
             )
     
-    def _clean_query(self, query: str) -> str:
+    def clean_query(self, query: str) -> str:
         """清理查詢文本"""
         # 1. 移除多餘空白
-        query = re.sub(r'\s+', ' ', query.strip())
-        
-        # 2. 修正常見錯字
-        for correct, typos in self.typo_mapping.items():
-            for typo in typos:
-                query = query.replace(typo, correct)
+        query = _WHITESPACE_PATTERN.sub(' ', query.strip())
         
-        # 3. 處理中英混用
-        for en, zh in self.en_zh_mapping.items():
-            query = query.replace(en, zh)
-        
-        return query
+        # 2. 修正常見錯字並處理中英混用（單次掃描）
+        replace_map = self._replace_map
+        return self._replace_pattern.sub(lambda m: replace_map[m.group(0)], query)
     
     def _analyze_with_openai(self, query: str) -> Dict[str, Any]:
         """使用 OpenAI 進行深度查詢分析"""
@@ -135,9 +183,8 @@ class QueryProcessor:
         
         # 解析 OpenAI 回應
         try:
-            print("=== OpenAI 回傳內容 ===")
             response_content = response.choices[0].message.content.strip()
-            print(response_content)
+            logger.debug("=== OpenAI 回傳內容 ===\n%s", response_content)
             
             # 處理可能包含的 ```json 標記
             if response_content.startswith("```json"):
@@ -148,18 +195,17 @@ class QueryProcessor:
             # 移除可能的額外空白
             response_content = response_content.strip()
             
-            analysis_json = json.loads(response_content)
+            analysis_json = json_loads(response_content)
             analysis = analysis_json["analysis"]
             search_weights = analysis_json.get("search_weights", {"semantic": 0.7, "keyword": 0.3})
             
-            print("=== 解析後的 analysis ===")
-            print(analysis)
+            logger.debug("=== 解析後的 analysis ===\n%s", analysis)
             
             # 防呆：檢查必要欄位
             required_keys = ["intent", "keywords", "entities", "confidence"]
             for k in required_keys:
                 if k not in analysis:
-                    print(f"❌ 缺少欄位: {k}")
+                    logger.error("❌ 缺少欄位: %s", k)
                     raise KeyError(k)
                     
             return {
@@ -170,7 +216,7 @@ class QueryProcessor:
                 "search_weights": search_weights
             }
         except Exception as e:
-            print(f"❌ OpenAI 分析結果解析失敗: {e}")
+            logger.error("❌ OpenAI 分析結果解析失敗: %s", e)
             return self._analyze_with_rules(query)
     
     def _analyze_with_rules(self, query: str) -> Dict[str, Any]:
@@ -180,36 +226,13 @@ class QueryProcessor:
         keywords = query.split()
         entities = {}
         
-        # 時間相關詞彙
-        time_keywords = ["時間", "日期", "幾點", "什麼時候", "何時", "多久"]
-        if any(kw in query for kw in time_keywords):
-            intent = QueryIntent.TEMPORAL
-        
-        # 地點相關詞彙
-        location_keywords = ["地點", "在哪", "位置", "哪裡", "何處"]
-        if any(kw in query for kw in location_keywords):
-            intent = QueryIntent.LOCATION
-        
-        # 程序相關詞彙
-        procedural_keywords = ["如何", "怎麼", "步驟", "流程", "方法"]
-        if any(kw in query for kw in procedural_keywords):
-            intent = QueryIntent.PROCEDURAL
-        
-        # 概念相關詞彙
-        conceptual_keywords = ["什麼是", "定義", "概念", "解釋", "說明"]
-        if any(kw in query for kw in conceptual_keywords):
-            intent = QueryIntent.CONCEPTUAL
-        
-        # 根據意圖類型設定搜尋權重
-        search_weights = {
-            "semantic": 0.7,
-            "keyword": 0.3
-        }
+        # 時間、地點、程序、概念相關詞彙（單次掃描，命中多種意圖時取優先順序最高者）
+        matched_intents = {self._KEYWORD_INTENTS[kw] for kw in self._INTENT_PATTERN.findall(query)}
+        if matched_intents:
+            intent = max(matched_intents, key=self._INTENT_PRIORITY.__getitem__)
         
-        if intent in [QueryIntent.CONCEPTUAL, QueryIntent.PROCEDURAL]:
-            search_weights = {"semantic": 0.8, "keyword": 0.2}
-        elif intent in [QueryIntent.TEMPORAL, QueryIntent.LOCATION]:
-            search_weights = {"semantic": 0.5, "keyword": 0.5}
+        # 根據意圖類型設定搜尋權重（查表，回傳複本避免共用的設定被修改）
+        search_weights = dict(self.INTENT_SEARCH_WEIGHTS.get(intent, self.DEFAULT_SEARCH_WEIGHTS))
         
         return {
             "intent": intent,
@@ -228,43 +251,19 @@ class QueryProcessor:
         rewritten.append(original)
         
         # 2. 基於意圖生成變體
-        if analysis["intent"] == QueryIntent.TEMPORAL:
-            rewritten.extend([
-                f"關於{original}的時間安排",
-                f"{original}的具體時間",
-                f"{original}什麼時候",
-                f"{original}的時程"
-            ])
-        elif analysis["intent"] == QueryIntent.LOCATION:
-            rewritten.extend([
-                f"{original}的地點",
-                f"{original}在哪裡",
-                f"{original}的位置",
-                f"{original}的場所"
-            ])
-        elif analysis["intent"] == QueryIntent.PROCEDURAL:
-            rewritten.extend([
-                f"如何{original}",
-                f"{original}的步驟",
-                f"{original}的流程",
-                f"{original}的方法"
-            ])
-        elif analysis["intent"] == QueryIntent.CONCEPTUAL:
-            rewritten.extend([
-                f"什麼是{original}",
-                f"{original}的定義",
-                f"{original}的概念",
-                f"{original}的解釋"
-            ])
+        templates = self.REWRITE_TEMPLATES.get(analysis["intent"], ())
+        rewritten.extend([template.format(original) for template in templates])
         
         # 3. 基於關鍵詞生成變體
         keywords = analysis.get("keywords", [])
         if keywords:
             rewritten.append(" ".join(keywords))
-            # 生成關鍵詞組合
-            if len(keywords) > 1:
-                for i in range(len(keywords)):
-                    for j in range(i + 1, len(keywords)):
-                        rewritten.append(f"{keywords[i]} {keywords[j]}")
+            # 生成關鍵詞組合（只取前幾個關鍵詞）
+            pair_keywords = keywords[:self.MAX_PAIR_KEYWORDS]
+            if len(pair_keywords) > 1:
+                for i in range(len(pair_keywords)):
+                    for j in range(i + 1, len(pair_keywords)):
+                        rewritten.append(f"{pair_keywords[i]} {pair_keywords[j]}")
         
-        return list(set(rewritten))  # 去重 
\ No newline at end of file
+        # 去重並保留順序（原始查詢維持在第一個）
+        return list(dict.fromkeys(rewritten)) 
\ No newline at end of file
@@ -1,157 +1,267 @@
-from typing import List, Dict, Any
+import asyncio
+import heapq
+import itertools
+import logging
+import numpy as np
+from typing import List, Dict, Any, Iterable, Iterator, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from .query_processor import QueryProcessor
+from .text_processor import estimate_tokens
+from .vector_store import content_hash
+
+logger = logging.getLogger(__name__)
 
 class RAGEngine:
     """RAG核心引擎"""
     
-    def __init__(self, notion_client, text_processor, embedder, vector_store, settings):
+    # 語義搜尋最多使用的重寫查詢數量（原始查詢排在最前面）
+    MAX_REWRITTEN_QUERIES = 5
+    
+    # 向量與關鍵字搜尋共用的相似度設定（None 使用向量資料庫的預設值），兩者分數上限一致才能合併排序
+    SEARCH_SETTINGS = None
+    
+    # 批次回答問題時同時進行的查詢數量上限（避免超過 OpenAI 速率限制）
+    MAX_CONCURRENT_QUERIES = 8
+    
+    # OpenAI 系統提示（固定內容，所有請求共用）
+    SYSTEM_PROMPT = """你是一個專業的助手，專門回答關於Notion文件內容的問題。
+請用繁體中文回答，並且只基於提供的資料來回答。
+你具有強大的語義理解能力，可以處理：
+- 錯字和同義詞
+- 中英混用的查詢
+- 不時態和語氣的提問
+- 模糊或間接的問題表達
+- 上下文相關的查詢
+- 隱含的需求和意圖
+- 多層次的語義理解"""
+    
+    # OpenAI 使用者提示範本（str.format 填入查詢分析、問題與參考資料）
+    USER_PROMPT_TEMPLATE = """你是一個專業的助手，專門回答關於Notion文件內容的問題。請遵循以下步驟：
+
+1. 查詢意圖理解：
+   - 已識別的查詢意圖：{intent}
+   - 關鍵詞：{keywords}
+   - 實體信息：{entities}
+   - 分析置信度：{confidence}
+   - 搜尋權重配置：{search_weights}
+
+2. 回答生成：
+   - 只基於提供的參考資料來回答
+   - 如果參考資料中沒有相關資訊，請明確說明
+   - 用繁體中文回答
+   - 回答要簡潔明瞭，重點突出
+   - 根據查詢意圖調整回答風格：
+     * 事實性查詢：直接、準確
+     * 比較性查詢：對比分析
+     * 時間相關查詢：時間順序
+     * 地點相關查詢：空間關係
+     * 程序性查詢：步驟清晰
+     * 概念性查詢：深入解釋
+   - 保持專業性和準確性
+   - 適當引用參考資料中的具體內容
+   - 如果信息不完整，請說明局限性
+
+原始問題：{question}
+
+參考資料：
+{context}
+
+請按照上述步驟處理並回答問題。回答時請注意：
+1. 確保回答的準確性和完整性
+2. 適當引用參考資料中的具體內容
+3. 如果信息不足，請說明局限性
+4. 保持專業、客觀的語氣
+5. 使用清晰的結構組織回答"""
+    
+    def __init__(self, notion_client, text_processor, embedder, vector_store, settings, openai_client=None):
+        """
+        Args:
+            openai_client: 已建立的 OpenAI 客戶端（多個元件共用同一個連線池；None 時依設定自行建立）
+        """
         self.notion_client = notion_client
         self.text_processor = text_processor
         self.embedder = embedder
         self.vector_store = vector_store
         self.settings = settings
         
+        # 內容版本（每次成功處理Notion內容後遞增，供問答快取判斷是否失效）
+        self.content_version = 0
+        
+        # 匯入 Notion 內容時的嵌入批次大小
+        self.ingest_batch_size = max(1, settings.EMBED_BATCH_SIZE)
+        
         # 設定OpenAI
-        if settings.USE_OPENAI and settings.OPENAI_API_KEY:
+        if openai_client is not None:
+            self.openai_client = openai_client
+            self.use_openai = True
+            logger.info("✅ OpenAI API 已設定，模型: %s", settings.OPENAI_MODEL)
+        elif settings.USE_OPENAI and settings.OPENAI_API_KEY:
             try:
                 from openai import OpenAI
                 self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
                 self.use_openai = True
-                print(f"✅ OpenAI API 已設定，模型: {settings.OPENAI_MODEL}")
+                logger.info("✅ OpenAI API 已設定，模型: %s", settings.OPENAI_MODEL)
             except ImportError:
-                print("❌ OpenAI 套件未安裝，使用簡單回應")
+                logger.error("❌ OpenAI 套件未安裝，使用簡單回應")
                 self.use_openai = False
             except Exception as e:
-                print(f"❌ OpenAI 設定失敗: {e}")
+                logger.error("❌ OpenAI 設定失敗: %s", e)
                 self.use_openai = False
         else:
             self.use_openai = False
-            print("⚠️ 未設定OpenAI API，將使用簡單的文本組合回應")
+            logger.warning("⚠️ 未設定OpenAI API，將使用簡單的文本組合回應")
         
         # 初始化查詢處理器
         self.query_processor = QueryProcessor(self.openai_client if self.use_openai else None)
+        
+        # 查詢分析呼叫 OpenAI 期間於背景先編碼問題
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-prefetch")
     
     def process_notion_page(self, page_id: str) -> bool:
         """處理Notion頁面並加入向量資料庫"""
+        # 嵌入在背景執行緒依序進行，主執行緒同時繼續下載下一頁區塊，總時間約為 max(下載, 嵌入)
+        embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-ingest")
+        embedding_futures = []
         try:
-            print(f"📄 開始處理Notion頁面: {page_id}")
+            logger.info("📄 開始處理Notion頁面: %s", page_id)
             
-            # 獲取頁面內容
-            print("🔄 獲取頁面內容...")
-            raw_text = self.notion_client.get_page_content(page_id)
+            # 獲取頁面內容，每下載一頁區塊即清理、分割，累積滿一批片段就生成向量嵌入
+            logger.info("🔄 獲取頁面內容並生成向量嵌入...")
+            chunks = []
+            batch = []
+            chunk_stream = self.text_processor.split_stream(self.notion_client.iter_page_content(page_id))
+            for chunk in self._unique_chunks(chunk_stream):
+                batch.append(chunk)
+                if len(batch) == self.ingest_batch_size:
+                    embedding_futures.append(embed_executor.submit(self._encode_chunks, batch))
+                    chunks.extend(batch)
+                    batch = []
+            if batch or not embedding_futures:
+                embedding_futures.append(embed_executor.submit(self._encode_chunks, batch))
+                chunks.extend(batch)
+            embeddings = np.concatenate([future.result() for future in embedding_futures])
             
-            # 清理和分割文本
-            print("🧹 清理和分割文本...")
-            cleaned_text = self.text_processor.clean_text(raw_text)
-            chunks = self.text_processor.split_text(cleaned_text)
+            logger.info("✂️ 文本分割完成，共 %s 個片段", len(chunks))
             
-            print(f"✂️ 文本分割完成，共 {len(chunks)} 個片段")
-            
-            # 檢查是否已有相同來源的資料
+            # 檢查是否已有相同來源的資料（內容下載完成後才清空，下載失敗時保留原有資料）
             source_name = f"notion_page_{page_id}"
             existing_stats = self.vector_store.get_stats()
             
             if source_name in existing_stats.get('source_stats', {}):
-                print(f"⚠️ 發現現有資料，將清空後重新處理")
+                logger.warning("⚠️ 發現現有資料，將清空後重新處理")
                 self.vector_store.clear_database()
             
-            # 生成向量嵌入
-            print("🔄 生成向量嵌入...")
-            embeddings = self.embedder.encode(chunks)
+            # 預先計算 token 數，查詢時組合上下文不需重新分詞
+            token_counts = self.text_processor.count_tokens(chunks, self.settings.OPENAI_MODEL)
             
             # 儲存到向量資料庫
-            print("💾 儲存到向量資料庫...")
-            self.vector_store.add_documents(chunks, embeddings, source_name)
+            logger.info("💾 儲存到向量資料庫...")
+            self.vector_store.add_documents(chunks, embeddings, source_name, token_counts)
             
             # 顯示最終統計
             final_stats = self.vector_store.get_stats()
-            print(f"✅ 處理完成！")
-            print(f"📊 最終統計: {final_stats['total_documents']} 個文檔片段")
+            logger.info("✅ 處理完成！")
+            logger.info("📊 最終統計: %s 個文檔片段", final_stats['total_documents'])
             
+            self.content_version += 1
             return True
         
         except Exception as e:
-            print(f"❌ 處理Notion頁面時發生錯誤: {e}")
+            logger.error("❌ 處理Notion頁面時發生錯誤: %s", e)
             import traceback
             traceback.print_exc()
             return False
+        
+        finally:
+            # 下載失敗時取消尚未開始的嵌入批次
+            for future in embedding_futures:
+                future.cancel()
+            embed_executor.shutdown(wait=False)
     
-    def query(self, question: str) -> str:
-        """回答問題"""
+    @staticmethod
+    def _unique_chunks(chunks: Iterable[str]) -> Iterator[str]:
+        """略過內容重複的片段（搜尋結果本來就以內容摘要去重，重複片段只會浪費嵌入時間與搜尋名額）"""
+        seen = set()
+        for chunk in chunks:
+            key = content_hash(chunk)
+            if key not in seen:
+                seen.add(key)
+                yield chunk
+    
+    def _encode_chunks(self, chunks: List[str]) -> np.ndarray:
+        """編碼一批匯入的片段（依索引儲存精度轉型，等待寫入期間的暫存記憶體隨之減半）"""
+        embeddings = self.embedder.encode(chunks, show_progress=False, batch_size=self.ingest_batch_size)
+        return embeddings.astype(self.vector_store.embedding_dtype, copy=False)
+    
+    def process_notion_pages(self, page_ids: List[str]) -> bool:
+        """同時處理多個Notion頁面並加入向量資料庫
+        
+        各頁面並行抓取，先抓取完成的頁面立即分割與嵌入，
+        嵌入與其他頁面的網路請求重疊進行，總時間約為 max(抓取, 嵌入) 而非兩者相加。
+        """
+        if len(page_ids) == 1:
+            return self.process_notion_page(page_ids[0])
+        
         try:
-            print(f"🤔 處理問題: {question}")
-            
-            # 使用查詢處理器分析問題
-            query_analysis = self.query_processor.process_query(question)
-            print(f"📊 查詢分析結果:")
-            print(f"  - 意圖: {query_analysis.intent}")
-            print(f"  - 關鍵詞: {query_analysis.keywords}")
-            print(f"  - 置信度: {query_analysis.confidence:.2f}")
-            print(f"  - 搜尋權重: {query_analysis.search_weights}")
-            
-            # 多階段檢索
-            semantic_docs = []
-            keyword_docs = []
+            logger.info("📄 開始並行處理 %s 個Notion頁面", len(page_ids))
+            asyncio.run(self._process_notion_pages_async(page_ids))
             
-            # 1. 語義搜尋
-            semantic_weight = query_analysis.search_weights.get("semantic", query_analysis.search_weights.get("semantic_search", 0))
-            keyword_weight = query_analysis.search_weights.get("keyword", query_analysis.search_weights.get("keyword_search", 0))
-            if semantic_weight > 0:
-                print("🔍 執行語義搜尋...")
-                for rewritten_query in query_analysis.rewritten_queries:
-                    question_embedding = self.embedder.encode_single(rewritten_query)
-                    docs = self.vector_store.search(
-                        question_embedding,
-                        top_k=self.settings.TOP_K
-                    )
-                    semantic_docs.extend(docs)
-            
-            # 2. 關鍵字搜尋
-            if keyword_weight > 0:
-                print("🔍 執行關鍵字搜尋...")
-                for keyword in query_analysis.keywords:
-                    keyword_embedding = self.embedder.encode_single(keyword)
-                    docs = self.vector_store.search(
-                        keyword_embedding,
-                        top_k=self.settings.TOP_K
-                    )
-                    keyword_docs.extend(docs)
-            
-            # 3. 合併和去重文檔
-            all_docs = []
-            seen_contents = set()
-            
-            # 處理語義搜尋結果
-            for doc in semantic_docs:
-                if doc['content'] not in seen_contents:
-                    seen_contents.add(doc['content'])
-                    doc['score'] *= semantic_weight
-                    all_docs.append(doc)
-            
-            # 處理關鍵字搜尋結果
-            for doc in keyword_docs:
-                if doc['content'] not in seen_contents:
-                    seen_contents.add(doc['content'])
-                    doc['score'] *= keyword_weight
-                    all_docs.append(doc)
-                else:
-                    # 如果文檔已存在，更新分數
-                    for existing_doc in all_docs:
-                        if existing_doc['content'] == doc['content']:
-                            existing_doc['score'] += doc['score'] * keyword_weight
+            final_stats = self.vector_store.get_stats()
+            logger.info("✅ 處理完成！")
+            logger.info("📊 最終統計: %s 個文檔片段", final_stats['total_documents'])
             
-            # 按綜合分數排序
-            all_docs.sort(key=lambda x: x['score'], reverse=True)
-            relevant_docs = all_docs[:self.settings.TOP_K]
+            self.content_version += 1
+            return True
+        
+        except Exception as e:
+            logger.error("❌ 處理Notion頁面時發生錯誤: %s", e)
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    async def _process_notion_pages_async(self, page_ids: List[str]):
+        """並行抓取頁面並依完成順序嵌入，全部頁面成功後才寫入向量資料庫（任一頁失敗時保留原有資料）"""
+        loop = asyncio.get_running_loop()
+        
+        # 嵌入使用單一執行緒依序進行（模型推論本身已使用多核心），只與網路請求重疊
+        embed_executor = ThreadPoolExecutor(max_workers=1)
+        
+        async def fetch_and_embed(page_id: str):
+            raw_text = await self.notion_client.get_page_content_async(page_id)
+            chunks = list(self._unique_chunks(
+                self.text_processor.iter_split_text(self.text_processor.clean_text(raw_text))
+            ))
+            logger.info("✂️ 頁面 %s 分割完成，共 %s 個片段", page_id, len(chunks))
+            embeddings = await loop.run_in_executor(embed_executor, self._encode_chunks, chunks)
+            token_counts = self.text_processor.count_tokens(chunks, self.settings.OPENAI_MODEL)
+            return page_id, chunks, embeddings, token_counts
+        
+        try:
+            pages = await asyncio.gather(*(fetch_and_embed(page_id) for page_id in page_ids))
+        finally:
+            embed_executor.shutdown(wait=False)
+            # 事件迴圈結束後非同步連線即無法使用，在迴圈內關閉
+            await self.notion_client.aclose()
+        
+        # 與單頁處理相同：已有相同來源的資料時先清空（內容全部下載完成後才清空）
+        existing_sources = self.vector_store.get_stats().get('source_stats', {})
+        if any(f"notion_page_{page_id}" in existing_sources for page_id in page_ids):
+            logger.warning("⚠️ 發現現有資料，將清空後重新處理")
+            self.vector_store.clear_database()
+        
+        for page_id, chunks, embeddings, token_counts in pages:
+            logger.info("💾 儲存頁面 %s 到向量資料庫...", page_id)
+            self.vector_store.add_documents(chunks, embeddings, f"notion_page_{page_id}", token_counts)
+    
+    def query(self, question: str) -> str:
+        """回答問題"""
+        try:
+            query_analysis, relevant_docs = self._retrieve(question)
             
             if not relevant_docs:
                 return "抱歉，我在你的Notion文件中找不到相關資訊。"
             
-            print(f"📋 找到 {len(relevant_docs)} 個相關文件")
-            for i, doc in enumerate(relevant_docs):
-                print(f"  {i+1}. 綜合分數: {doc['score']:.3f}")
-            
             # 組合上下文
             context = self._build_context(relevant_docs)
             
@@ -164,37 +274,167 @@ class RAGEngine:
             return answer
             
         except Exception as e:
-            print(f"❌ 處理問題時發生錯誤: {e}")
+            logger.error("❌ 處理問題時發生錯誤: %s", e)
             return f"抱歉，處理問題時發生錯誤: {str(e)}"
     
-    def _calculate_keyword_score(self, query: str, content: str) -> float:
-        """計算關鍵詞匹配分數"""
+    async def aquery(self, question: str) -> str:
+        """非同步回答問題（在執行緒中執行 query，事件迴圈可同時處理其他問題）"""
+        return await asyncio.to_thread(self.query, question)
+    
+    def query_batch(self, questions: List[str]) -> List[str]:
+        """同時回答多個問題（例如批次評估），回答順序與問題相同
+        
+        各問題的 OpenAI 請求並行送出（同步客戶端可跨執行緒共用連線池），
+        總時間約為最慢的一個問題，而非所有問題相加。
+        """
+        if not questions:
+            return []
+        return asyncio.run(self._query_batch_async(questions))
+    
+    async def _query_batch_async(self, questions: List[str]) -> List[str]:
+        """並行回答問題，同時進行的查詢數量不超過 MAX_CONCURRENT_QUERIES"""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_QUERIES)
+        
+        async def answer(question: str) -> str:
+            async with semaphore:
+                return await self.aquery(question)
+        
+        return list(await asyncio.gather(*(answer(question) for question in questions)))
+    
+    def query_stream(self, question: str) -> Iterator[str]:
+        """回答問題（串流輸出，OpenAI 回答邊生成邊回傳片段）"""
         try:
-            # 將查詢和內容轉換為小寫
-            query = query.lower()
-            content = content.lower()
+            query_analysis, relevant_docs = self._retrieve(question)
             
-            # 分詞（簡單實現，實際可以使用更複雜的分詞器）
-            query_words = set(query.split())
-            content_words = set(content.split())
+            if not relevant_docs:
+                yield "抱歉，我在你的Notion文件中找不到相關資訊。"
+                return
             
-            # 計算關鍵詞匹配度
-            if not query_words:
-                return 0.0
-                
-            matched_words = query_words.intersection(content_words)
-            return len(matched_words) / len(query_words)
+            context = self._build_context(relevant_docs)
+            
+            if self.use_openai:
+                yield from self._stream_openai_response(question, context, query_analysis)
+            else:
+                yield self._generate_simple_response(question, context)
             
         except Exception as e:
-            print(f"❌ 關鍵詞分數計算失敗: {e}")
-            return 0.0
+            logger.error("❌ 處理問題時發生錯誤: %s", e)
+            yield f"抱歉，處理問題時發生錯誤: {str(e)}"
+    
+    def _retrieve(self, question: str) -> Tuple[Any, List[Dict[str, Any]]]:
+        """分析問題並檢索相關文件
+        Returns:
+            (查詢分析結果, 依綜合分數排序的相關文件)
+        """
+        logger.debug("🤔 處理問題: %s", question)
+        
+        # 使用查詢處理器分析問題
+        query_analysis = self._analyze_query(question)
+        logger.debug("📊 查詢分析結果: 意圖=%s, 關鍵詞=%s, 置信度=%.2f, 搜尋權重=%s",
+                     query_analysis.intent, query_analysis.keywords,
+                     query_analysis.confidence, query_analysis.search_weights)
+        
+        relevant_docs = self._search_with_analysis(query_analysis)
+        
+        return query_analysis, relevant_docs
+    
+    def _search_with_analysis(self, query_analysis) -> List[Dict[str, Any]]:
+        """依查詢分析結果檢索相關文件
+        
+        語義查詢（重寫查詢）一次批次編碼、一次送入向量資料庫搜尋；
+        關鍵字直接以 BM25 索引比對，不需編碼，兩者結果合併為依綜合分數排序的文件。
+        """
+        # 1. 語義搜尋
+        weights = query_analysis.search_weights
+        semantic_weight = weights.get("semantic", weights.get("semantic_search", 0))
+        keyword_weight = weights.get("keyword", weights.get("keyword_search", 0))
+        top_k = self.settings.TOP_K
+        semantic_queries = [q for q in query_analysis.rewritten_queries if q.strip()][:self.MAX_REWRITTEN_QUERIES] if semantic_weight > 0 else []
+        keyword_queries = [k for k in query_analysis.keywords if k.strip()] if keyword_weight > 0 else []
+        
+        # 所有語義查詢一次批次編碼、一次送入向量資料庫搜尋
+        query_results = self.vector_store.search_batch(
+            self.embedder.encode_batch(semantic_queries),
+            top_k=top_k,
+            settings=self.SEARCH_SETTINGS
+        ) if semantic_queries else []
+        
+        # 2. 關鍵字搜尋（BM25，所有關鍵字合併為一次查詢）
+        logger.debug("🔍 語義查詢 %d 個，關鍵字 %d 個", len(semantic_queries), len(keyword_queries))
+        semantic_docs = itertools.chain.from_iterable(query_results)
+        keyword_docs = self.vector_store.keyword_search(
+            " ".join(keyword_queries), top_k=top_k, settings=self.SEARCH_SETTINGS
+        ) if keyword_queries else []
+        
+        # 3. 合併和去重文檔（直接走訪各查詢的結果，不另外複製成列表）
+        relevant_docs = self._merge_search_results(
+            semantic_docs, keyword_docs, semantic_weight, keyword_weight, top_k
+        )
+        
+        if relevant_docs:
+            logger.debug("📋 找到 %d 個相關文件", len(relevant_docs))
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, doc in enumerate(relevant_docs):
+                    logger.debug("  %d. 綜合分數: %.3f", i + 1, doc['score'])
+        
+        return relevant_docs
+    
+    def _analyze_query(self, question: str):
+        """分析問題
+        
+        查詢分析需要呼叫 OpenAI 時，同時在背景編碼清理後的問題（即第一個重寫查詢），
+        結果存入嵌入器快取，稍後批次編碼時直接使用，編碼時間與網路等待重疊。
+        """
+        if not self.query_processor.use_openai:
+            return self.query_processor.process_query(question)
+        
+        prefetch = self._prefetch_executor.submit(
+            self.embedder.encode_single, self.query_processor.clean_query(question)
+        )
+        query_analysis = self.query_processor.process_query(question)
+        # 只等待完成，編碼錯誤留待批次編碼時處理
+        wait([prefetch])
+        return query_analysis
+    
+    def _merge_search_results(self, semantic_docs: Iterable[Dict[str, Any]], keyword_docs: Iterable[Dict[str, Any]],
+                              semantic_weight: float, keyword_weight: float, top_k: int) -> List[Dict[str, Any]]:
+        """合併語義與關鍵字搜尋結果（以內容摘要去重，重複的關鍵字結果累加分數），回傳綜合分數最高的 top_k 筆"""
+        doc_map: Dict[int, Dict[str, Any]] = {}
+        
+        # 處理語義搜尋結果
+        for doc in semantic_docs:
+            key = doc['content_hash']
+            if key not in doc_map:
+                doc['score'] *= semantic_weight
+                doc_map[key] = doc
+        
+        # 處理關鍵字搜尋結果（如果文檔已存在，更新分數）
+        for doc in keyword_docs:
+            key = doc['content_hash']
+            existing_doc = doc_map.get(key)
+            if existing_doc is None:
+                doc['score'] *= keyword_weight
+                doc_map[key] = doc
+            else:
+                existing_doc['score'] += doc['score'] * keyword_weight
+        
+        # 只取前 top_k 筆（部分排序，不需排序全部結果）
+        return heapq.nlargest(top_k, doc_map.values(), key=lambda x: x['score'])
     
     def _build_context(self, relevant_docs: List[Dict[str, Any]]) -> str:
-        """建立上下文"""
+        """建立上下文（依分數順序加入文件，總 token 數不超過 MAX_CONTEXT_TOKENS）"""
         context_parts = []
+        total_tokens = 0
+        max_tokens = self.settings.MAX_CONTEXT_TOKENS
         
         for i, doc in enumerate(relevant_docs):
-            # 添加更多元資訊
+            token_count = doc.get('token_count') or estimate_tokens(doc['content'])
+            # 至少保留一份參考資料
+            if context_parts and total_tokens + token_count > max_tokens:
+                break
+            total_tokens += token_count
+            
+            # 添加更多元資訊（相鄰的 f-string 編譯為單一字串，每份資料只配置一次）
             context_parts.append(
                 f"參考資料 {i+1} (綜合分數: {doc['score']:.3f}):\n"
                 f"來源: {doc['source']}\n"
@@ -204,61 +444,29 @@ class RAGEngine:
         
         return "\n\n".join(context_parts)
     
+    def _build_openai_messages(self, question: str, context: str, query_analysis) -> List[Dict[str, str]]:
+        """建立OpenAI對話訊息（系統提示固定不變，每次請求的開頭相同，可使用 OpenAI 的前綴快取）"""
+        prompt = self.USER_PROMPT_TEMPLATE.format(
+            intent=query_analysis.intent,
+            keywords=', '.join(query_analysis.keywords),
+            entities=query_analysis.entities,
+            confidence=query_analysis.confidence,
+            search_weights=query_analysis.search_weights,
+            question=question,
+            context=context
+        )
+        
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
     def _generate_openai_response(self, question: str, context: str, query_analysis) -> str:
         """使用OpenAI生成回答"""
         try:
-            prompt = f"""你是一個專業的助手，專門回答關於Notion文件內容的問題。請遵循以下步驟：
-
-1. 查詢意圖理解：
-   - 已識別的查詢意圖：{query_analysis.intent}
-   - 關鍵詞：{', '.join(query_analysis.keywords)}
-   - 實體信息：{query_analysis.entities}
-   - 分析置信度：{query_analysis.confidence}
-   - 搜尋權重配置：{query_analysis.search_weights}
-
-2. 回答生成：
-   - 只基於提供的參考資料來回答
-   - 如果參考資料中沒有相關資訊，請明確說明
-   - 用繁體中文回答
-   - 回答要簡潔明瞭，重點突出
-   - 根據查詢意圖調整回答風格：
-     * 事實性查詢：直接、準確
-     * 比較性查詢：對比分析
-     * 時間相關查詢：時間順序
-     * 地點相關查詢：空間關係
-     * 程序性查詢：步驟清晰
-     * 概念性查詢：深入解釋
-   - 保持專業性和準確性
-   - 適當引用參考資料中的具體內容
-   - 如果信息不完整，請說明局限性
-
-原始問題：{question}
-
-參考資料：
-{context}
-
-請按照上述步驟處理並回答問題。回答時請注意：
-1. 確保回答的準確性和完整性
-2. 適當引用參考資料中的具體內容
-3. 如果信息不足，請說明局限性
-4. 保持專業、客觀的語氣
-5. 使用清晰的結構組織回答"""
-
             response = self.openai_client.chat.completions.create(
                 model=self.settings.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": """你是一個專業的助手，專門回答關於Notion文件內容的問題。
-請用繁體中文回答，並且只基於提供的資料來回答。
-你具有強大的語義理解能力，可以處理：
-- 錯字和同義詞
-- 中英混用的查詢
-- 不時態和語氣的提問
-- 模糊或間接的問題表達
-- 上下文相關的查詢
-- 隱含的需求和意圖
-- 多層次的語義理解"""},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_openai_messages(question, context, query_analysis),
                 max_tokens=1000,
                 temperature=0.7
             )
@@ -266,20 +474,45 @@ class RAGEngine:
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            print(f"❌ OpenAI 回應生成失敗: {e}")
+            logger.error("❌ OpenAI 回應生成失敗: %s", e)
             return self._generate_simple_response(question, context)
     
+    def _stream_openai_response(self, question: str, context: str, query_analysis) -> Iterator[str]:
+        """使用OpenAI串流生成回答（逐段回傳新產生的文字）"""
+        has_output = False
+        try:
+            stream = self.openai_client.chat.completions.create(
+                model=self.settings.OPENAI_MODEL,
+                messages=self._build_openai_messages(question, context, query_analysis),
+                max_tokens=1000,
+                temperature=0.7,
+                stream=True
+            )
+            
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    has_output = True
+                    yield delta
+            
+        except Exception as e:
+            logger.error("❌ OpenAI 串流回應生成失敗: %s", e)
+            # 尚未輸出任何內容時改用簡單回應
+            if not has_output:
+                yield self._generate_simple_response(question, context)
+    
     def _generate_simple_response(self, question: str, context: str) -> str:
         """生成簡單回應（不使用OpenAI時的備用方案）"""
-        response_parts = [
-            f"基於你的Notion內容，我找到以下相關資訊來回答「{question}」：",
-            "",
-            context,
-            "",
+        # 直接組成單一字串，不建立中間串列
+        return (
+            f"基於你的Notion內容，我找到以下相關資訊來回答「{question}」：\n"
+            "\n"
+            f"{context}\n"
+            "\n"
             "以上是從你的Notion文件中找到的相關內容。"
-        ]
-        
-        return "\n".join(response_parts)
+        )
     
     def get_system_status(self) -> Dict[str, Any]:
         """獲取系統狀態"""
@@ -302,10 +535,15 @@ class RAGEngine:
             }
         }
     
-    def update_notion_content(self, page_id: str = None) -> bool:
-        """更新Notion內容"""
+    def update_notion_content(self, page_id: Union[str, List[str], None] = None) -> bool:
+        """更新Notion內容
+        Args:
+            page_id: 頁面ID，或多個頁面ID（並行抓取）；未指定時使用設定的頁面
+        """
         if page_id is None:
             page_id = self.settings.NOTION_PAGE_ID
         
-        print("🔄 更新Notion內容...")
-        return self.process_notion_page(page_id)
\ No newline at end of file
+        logger.info("🔄 更新Notion內容...")
+        if isinstance(page_id, str):
+            return self.process_notion_page(page_id)
+        return self.process_notion_pages(list(page_id))
\ No newline at end of file
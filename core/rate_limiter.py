@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+class RateLimiter:
+    """Token bucket 速率限制器 - 同步（執行緒）與非同步呼叫共用同一個額度"""
+
+    def __init__(self, rate: float = 3.0, per: float = 1.0, burst: Optional[float] = None):
+        """
+        初始化速率限制器
+
+        Args:
+            rate: 每個時間區間允許的請求數（0 表示不限制）
+            per: 時間區間秒數
+            burst: 閒置後最多可連續送出的請求數（預設等於 rate）
+        """
+        self.rate = rate / per if per > 0 else 0
+        self.capacity = burst if burst is not None else rate
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """預約一個請求額度，回傳需要等待的秒數（額度不足時預約未來的額度，請求依序排隊）"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        """取得請求額度（同步，必要時阻塞等待）"""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """取得請求額度（非同步，等待期間不阻塞事件迴圈）"""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -1,5 +1,33 @@
 import re
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Iterable, Iterator
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 句尾標點（保留標點的分割規則，句子與標點交錯出現）
+SENTENCE_ENDINGS = ".!?。！？"
+_SENTENCE_SPLIT_PATTERN = re.compile(r'([.!?。！？])')
+
+# 清理文本使用的規則（合併空白、移除特殊字符）
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_SPECIAL_CHAR_PATTERN = re.compile(r'[^\w\s\u4e00-\u9fff.,!?;:()（）「」【】""''•✅❌☐☑️]+')
+
+# Notion 內容結構偵測使用的規則（標題、清單、表格）
+_HEADING_PATTERN = re.compile(r"^(#+) (.+)")
+_BOLD_TITLE_PATTERN = re.compile(r"^\*\*(.+)\*\*")
+_UNDERLINE_TITLE_PATTERN = re.compile(r"^__([^_]+)__")
+_LIST_PATTERN = re.compile(r"^(?:[-*•]|\d+\.)\s+.+")
+# 清單符號（行首不是這些符號或數字時不需比對清單規則）
+_LIST_MARKERS = frozenset("-*•")
+_LIST_ITEM_PATTERN = re.compile(r"^([-*•+]|\d+\.|[a-zA-Z]\.)\s+.+")
+_TABLE_ROW_PATTERN = re.compile(r"^\|(.+)\|$")
+_TABLE_SEPARATOR_PATTERN = re.compile(r"^\|([\-\s\|:]+)\|$")
+
+def estimate_tokens(text: str) -> int:
+    """簡單的 token 估算（中文字符 * 1.5），未安裝 tiktoken 時使用"""
+    return int(len(text) * 1.5)
 
 class TextProcessor:
     """文本處理器"""
@@ -7,124 +35,230 @@ class TextProcessor:
     def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self._encodings = {}
+    
+    def count_tokens(self, chunks: List[str], model: str = "gpt-3.5-turbo") -> List[int]:
+        """計算每個片段的 token 數（匯入時計算一次，查詢時不需重新分詞）"""
+        if tiktoken is None:
+            return [estimate_tokens(chunk) for chunk in chunks]
+        
+        encoding = self._encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            self._encodings[model] = encoding
+        
+        return [len(tokens) for tokens in encoding.encode_batch(chunks)]
     
     def clean_text(self, text: str) -> str:
         """清理文本"""
-        if not text:
+        # 空白文本不需進行任何替換（isspace 不配置新字串）
+        if not text or text.isspace():
             return ""
         
-        # 移除多餘空白
-        text = re.sub(r'\s+', ' ', text)
+        # 移除多餘空白（str.split 與 \s 的空白定義相同，整段在 C 層完成，比正則替換快）
+        text = ' '.join(text.split())
         
         # 移除特殊字符（保留中文、英文、數字、基本標點）
-        text = re.sub(r'[^\w\s\u4e00-\u9fff.,!?;:()（）「」【】""''•✅❌☐☑️]', '', text)
+        text = _SPECIAL_CHAR_PATTERN.sub('', text)
         
         return text.strip()
     
+    def _iter_clean(self, texts: Iterable[str]) -> Iterator[str]:
+        """逐段清理以空行相連的文本，各段串接後與 clean_text("\n\n".join(texts)) 相同（結尾空白除外）"""
+        prev_ends_with_space = False
+        started = False
+        for i, text in enumerate(texts):
+            collapsed = _WHITESPACE_PATTERN.sub(' ', "\n\n" + text if i else text)
+            # 跨段的連續空白合併為一個
+            if prev_ends_with_space and collapsed.startswith(' '):
+                collapsed = collapsed[1:]
+            if collapsed:
+                prev_ends_with_space = collapsed.endswith(' ')
+            
+            cleaned = _SPECIAL_CHAR_PATTERN.sub('', collapsed)
+            if not started:
+                cleaned = cleaned.lstrip()
+                started = bool(cleaned)
+            if cleaned:
+                yield cleaned
+    
     def split_text(self, text: str) -> List[str]:
         """分割文本為chunks"""
         if not text:
             return []
+        # 短的單一段落即為唯一的 chunk，不需分段與重疊處理
+        if len(text) <= self.chunk_size and '\n\n' not in text:
+            text = text.strip()
+            return [text] if text else []
+        return list(self.iter_split_text(text))
+    
+    def iter_split_text(self, text: str) -> Iterator[str]:
+        """逐一產生 split_text 的 chunk（段落組合與重疊皆為串流，不另外保留未加重疊的 chunk 列表）"""
+        return self._iter_overlap(self._iter_paragraph_chunks(text))
+    
+    def _iter_paragraph_chunks(self, text: str) -> Iterator[str]:
+        """依段落組合 chunk（尚未加上重疊）
         
-        # 先按段落分割
-        paragraphs = self._split_into_paragraphs(text)
-        chunks = []
-        current_chunk = ""
+        當前 chunk 以段落列表與累計長度表示，輸出時才一次串接，不需每加入一段就複製整個 chunk。
+        """
+        chunk_size = self.chunk_size
+        current_parts: List[str] = []
+        current_len = 0
         
-        for paragraph in paragraphs:
+        # 先按段落分割（段落已去除前後空白，串接後不需再 strip）
+        for paragraph in self._split_into_paragraphs(text):
+            length = len(paragraph)
             # 如果段落太長，需要進一步分割
-            if len(paragraph) > self.chunk_size:
+            if length > chunk_size:
                 # 先保存當前chunk（如果有內容）
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = ""
+                if current_parts:
+                    yield "\n\n".join(current_parts)
+                    current_parts = []
+                    current_len = 0
                 
                 # 分割長段落
-                sub_chunks = self._split_long_paragraph(paragraph)
-                chunks.extend(sub_chunks)
+                yield from self._split_long_paragraph(paragraph)
+            # 檢查加入這個段落是否會超過chunk大小（+2 for \n\n）
+            elif current_len + length + 2 <= chunk_size:
+                current_len += length + 2 if current_parts else length
+                current_parts.append(paragraph)
             else:
-                # 檢查加入這個段落是否會超過chunk大小
-                if len(current_chunk) + len(paragraph) + 2 <= self.chunk_size:  # +2 for \n\n
-                    if current_chunk:
-                        current_chunk += "\n\n" + paragraph
-                    else:
-                        current_chunk = paragraph
-                else:
-                    # 保存當前chunk，開始新的chunk
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = paragraph
+                # 保存當前chunk，開始新的chunk
+                if current_parts:
+                    yield "\n\n".join(current_parts)
+                current_parts = [paragraph]
+                current_len = length
         
         # 保存最後一個chunk
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_parts:
+            yield "\n\n".join(current_parts)
+    
+    def split_stream(self, texts: Iterable[str]) -> Iterator[str]:
+        """逐段清理並分割文本（內容邊下載邊分割，不需先組合整份文本）
         
-        # 添加重疊
-        return self._add_overlap(chunks)
+        結果與 split_text(clean_text("\n\n".join(texts))) 相同：清理後段落間的空行會合併為空白，
+        整份文本視為單一段落依句子組合成 chunk；句子只在遇到句尾標點後才切出，
+        尚未結束的句子保留到下一段文本抵達。
+        """
+        return self._iter_overlap(self._iter_stream_chunks(texts))
     
-    def _split_into_paragraphs(self, text: str) -> List[str]:
-        """將文本分割為段落"""
-        # 按雙換行符分割段落
-        paragraphs = text.split('\n\n')
+    def _iter_stream_chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        """依句子組合串流文本的 chunk（尚未加上重疊）"""
+        chunk_size = self.chunk_size
+        # 總長度未超過 chunk_size 前先保留原文（短文本整份即為一個 chunk）
+        head = ""
+        # 尚未遇到句尾標點的文本片段（不含標點，因此每段新文本只需搜尋自身）
+        pending: List[str] = []
+        # 當前 chunk 的句子與串接後的長度（空 chunk 為 -1，加入第一句時不計分隔空白）
+        current_parts: List[str] = []
+        current_len = -1
         
-        # 清理空段落
-        paragraphs = [p.strip() for p in paragraphs if p.strip()]
+        def pack(sentences: List[str]) -> Iterator[str]:
+            # 與 _split_long_paragraph 相同的句子組合規則
+            nonlocal current_parts, current_len
+            for sentence in sentences:
+                length = len(sentence)
+                if current_len + length + 1 <= chunk_size:
+                    current_parts.append(sentence)
+                    current_len += length + 1
+                else:
+                    if current_parts:
+                        yield " ".join(current_parts)
+                    if length > chunk_size:
+                        yield from self._force_split(sentence)
+                        current_parts = []
+                        current_len = -1
+                    else:
+                        current_parts = [sentence]
+                        current_len = length
         
-        return paragraphs
+        for text in self._iter_clean(texts):
+            if head is not None:
+                head += text
+                if len(head.rstrip()) <= chunk_size:
+                    continue
+                text = head
+                head = None
+            
+            # 只分割到最後一個句尾標點，之後的文字等待下一段
+            cut = max(text.rfind(ending) for ending in SENTENCE_ENDINGS) + 1
+            if cut > 0:
+                pending.append(text[:cut])
+                yield from pack(self._split_into_sentences("".join(pending)))
+                pending = [text[cut:]]
+            else:
+                pending.append(text)
+        
+        if head is not None:
+            # 整份文本未超過 chunk_size
+            head = head.rstrip()
+            if head:
+                yield head
+            return
+        
+        rest = "".join(pending)
+        if rest.strip():
+            yield from pack(self._split_into_sentences(rest))
+        if current_parts:
+            yield " ".join(current_parts)
+    
+    def _split_into_paragraphs(self, text: str) -> Iterator[str]:
+        """將文本分割為段落（逐一產生，略過空段落）"""
+        # 按雙換行符分割段落
+        for paragraph in text.split('\n\n'):
+            paragraph = paragraph.strip()
+            if paragraph:
+                yield paragraph
     
     def _split_long_paragraph(self, paragraph: str) -> List[str]:
-        """分割過長的段落"""
-        # 嘗試按句子分割
-        sentences = self._split_into_sentences(paragraph)
-        
+        """分割過長的段落（句子以列表累積，組成 chunk 時才串接）"""
+        chunk_size = self.chunk_size
         chunks = []
-        current_chunk = ""
+        # 當前 chunk 的句子與串接後的長度（空 chunk 為 -1，加入第一句時不計分隔空白）
+        current_parts: List[str] = []
+        current_len = -1
         
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) + 1 <= self.chunk_size:
-                if current_chunk:
-                    current_chunk += " " + sentence
-                else:
-                    current_chunk = sentence
+        # 嘗試按句子分割（句子已去除前後空白，串接後不需再 strip）
+        for sentence in self._split_into_sentences(paragraph):
+            length = len(sentence)
+            if current_len + length + 1 <= chunk_size:
+                current_parts.append(sentence)
+                current_len += length + 1
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
+                if current_parts:
+                    chunks.append(" ".join(current_parts))
                 
                 # 如果單個句子就超過chunk_size，強制分割
-                if len(sentence) > self.chunk_size:
-                    force_chunks = self._force_split(sentence)
-                    chunks.extend(force_chunks)
-                    current_chunk = ""
+                if length > chunk_size:
+                    chunks.extend(self._force_split(sentence))
+                    current_parts = []
+                    current_len = -1
                 else:
-                    current_chunk = sentence
+                    current_parts = [sentence]
+                    current_len = length
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_parts:
+            chunks.append(" ".join(current_parts))
         
         return chunks
     
     def _split_into_sentences(self, text: str) -> List[str]:
-        """將文本分割為句子"""
-        # 中英文句子分割
-        sentence_endings = r'[.!?。！？]'
-        sentences = re.split(sentence_endings, text)
+        """將文本分割為句子（保留句尾標點）"""
+        # 中英文句子分割，分割結果為 [句子, 標點, 句子, 標點, ..., 最後一段]
+        parts = _SENTENCE_SPLIT_PATTERN.split(text)
         
-        # 清理空句子並重新添加標點
         result = []
-        for i, sentence in enumerate(sentences[:-1]):  # 最後一個通常是空的
+        for sentence, punctuation in zip(parts[0::2], parts[1::2]):
             sentence = sentence.strip()
             if sentence:
-                # 找回原來的標點符號
-                original_pos = text.find(sentence) + len(sentence)
-                if original_pos < len(text):
-                    punctuation = text[original_pos]
-                    result.append(sentence + punctuation)
-                else:
-                    result.append(sentence)
+                result.append(sentence + punctuation)
         
         # 處理最後一個句子（如果有內容且沒有標點）
-        if sentences[-1].strip():
-            result.append(sentences[-1].strip())
+        if parts[-1].strip():
+            result.append(parts[-1].strip())
         
         return result
     
@@ -137,45 +271,29 @@ class TextProcessor:
                 chunks.append(chunk.strip())
         return chunks
     
-    def _add_overlap(self, chunks: List[str]) -> List[str]:
-        """為chunks添加重疊"""
-        if len(chunks) <= 1:
-            return chunks
-        
-        overlapped_chunks = [chunks[0]]
-        
-        for i in range(1, len(chunks)):
+    def _iter_overlap(self, chunks: Iterable[str]) -> Iterator[str]:
+        """為chunks添加重疊（只保留前一個chunk，逐一產生加上重疊的結果）"""
+        prev_chunk = None
+        for chunk in chunks:
             # 獲取前一個chunk的結尾部分作為重疊
-            prev_chunk = chunks[i-1]
-            curr_chunk = chunks[i]
-            
-            # 計算重疊文本（取前一個chunk的最後部分）
-            overlap_text = ""
-            if len(prev_chunk) > self.chunk_overlap:
-                # 嘗試從句子邊界開始重疊
-                words = prev_chunk.split()
-                overlap_words = []
-                char_count = 0
-                
-                for word in reversed(words):
-                    if char_count + len(word) + 1 <= self.chunk_overlap:
-                        overlap_words.insert(0, word)
-                        char_count += len(word) + 1
-                    else:
-                        break
-                
-                if overlap_words:
-                    overlap_text = " ".join(overlap_words)
-            
-            # 組合重疊chunk
-            if overlap_text:
-                overlapped_chunk = overlap_text + " " + curr_chunk
-            else:
-                overlapped_chunk = curr_chunk
-                
-            overlapped_chunks.append(overlapped_chunk)
+            overlap_text = self._overlap_text(prev_chunk) if prev_chunk is not None else ""
+            yield overlap_text + " " + chunk if overlap_text else chunk
+            prev_chunk = chunk
+    
+    def _overlap_text(self, prev_chunk: str) -> str:
+        """計算重疊文本（取前一個chunk最後 chunk_overlap 個字元，從詞的邊界開始；中文沒有空白時直接使用）"""
+        overlap = self.chunk_overlap
+        if overlap <= 0 or len(prev_chunk) <= overlap:
+            return ""
+        
+        tail = prev_chunk[-overlap:]
+        # 開頭落在詞的中間時，跳到第一個空白之後
+        if not prev_chunk[-overlap - 1].isspace():
+            match = _WHITESPACE_PATTERN.search(tail)
+            if match:
+                tail = tail[match.end():]
         
-        return overlapped_chunks
+        return tail.strip()
     
     def get_chunk_info(self, chunks: List[str]) -> dict:
         """獲取分割統計資訊"""
@@ -206,7 +324,8 @@ class NotionTextProcessor:
     ]
 
     def __init__(self):
-        pass
+        # 所有雜訊規則合併為單一正則，每行只需搜尋一次
+        self._noise_pattern = re.compile("|".join(f"(?:{pat})" for pat in self.NOISE_PATTERNS))
 
     def parse_notion_content(self, text: str, page_title: str, source_url: str) -> list:
         """
@@ -221,11 +340,9 @@ class NotionTextProcessor:
         section_start = 1
         current_type = None
         line_num = 1
+        noise_search = self._noise_pattern.search
         def is_noise(line):
-            for pat in self.NOISE_PATTERNS:
-                if re.search(pat, line):
-                    return True
-            return False
+            return noise_search(line) is not None
         def flush():
             nonlocal buffer, section_title, section_start, current_type
             if buffer:
@@ -249,8 +366,10 @@ class NotionTextProcessor:
             lstr = line.strip()
             if is_noise(lstr):
                 continue
+            # 依行首字元判斷可能的結構，只比對可能符合的規則
+            first_char = lstr[:1]
             # 標題偵測
-            m = re.match(r"^(#+) (.+)", lstr)
+            m = _HEADING_PATTERN.match(lstr) if first_char == "#" else None
             if m:
                 flush()
                 section_title = m.group(2).strip()
@@ -269,7 +388,7 @@ class NotionTextProcessor:
                 buffer.append(lstr)
                 continue
             # 表格偵測
-            if lstr.startswith("|") and lstr.endswith("|"):
+            if first_char == "|" and lstr.endswith("|"):
                 if current_type != "table":
                     flush()
                     section_title = "表格"
@@ -278,7 +397,7 @@ class NotionTextProcessor:
                 buffer.append(lstr)
                 continue
             # 清單偵測
-            if re.match(r"^[-*•]\s+.+", lstr) or re.match(r"^\d+\.\s+.+", lstr):
+            if (first_char in _LIST_MARKERS or first_char.isdigit()) and _LIST_PATTERN.match(lstr):
                 if current_type != "list":
                     flush()
                     section_title = "列表"
@@ -310,13 +429,13 @@ class NotionTextProcessor:
 
     def _extract_title(self, line: str) -> str:
         # 支援測試用的標題抽取
-        m = re.match(r"^(#+) (.+)", line.strip())
+        m = _HEADING_PATTERN.match(line.strip())
         if m:
             return m.group(2).strip()
-        m = re.match(r"^\*\*(.+)\*\*", line.strip())
+        m = _BOLD_TITLE_PATTERN.match(line.strip())
         if m:
             return m.group(1).strip()
-        m = re.match(r"^__([^_]+)__", line.strip())
+        m = _UNDERLINE_TITLE_PATTERN.match(line.strip())
         if m:
             return m.group(1).strip()
         return line.strip()
@@ -345,7 +464,7 @@ class NotionTextProcessor:
     def _is_list_item(self, text: str) -> bool:
         """判斷是否為清單項目（for test）"""
         t = text.strip()
-        return bool(re.match(r"^([-*•+]|\d+\.|[a-zA-Z]\.)\s+.+", t))
+        return bool(_LIST_ITEM_PATTERN.match(t))
 
     def _is_table_start(self, line: str, next_lines: list = None) -> bool:
         """判斷是否為表格起始行（for test）"""
@@ -354,6 +473,6 @@ class NotionTextProcessor:
             return True
         # 支援 markdown 標準表格格式
         if next_lines and len(next_lines) > 1:
-            if re.match(r"^\|(.+)\|$", next_lines[0].strip()) and re.match(r"^\|([\-\s\|:]+)\|$", next_lines[1].strip()):
+            if _TABLE_ROW_PATTERN.match(next_lines[0].strip()) and _TABLE_SEPARATOR_PATTERN.match(next_lines[1].strip()):
                 return True
         return False
\ No newline at end of file
@@ -1,36 +1,188 @@
 import faiss
 import sqlite3
 import pickle
+import logging
 import os
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 import numpy as np
 from datetime import datetime
 import shutil
+import functools
+import contextlib
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from .keyword_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    # 單執行緒編譯：不啟用 numba 的平行執行緒層，可安全地在多個請求執行緒與 fork 出的 worker 中呼叫
+    @njit(fastmath=True, cache=True, nogil=True)
+    def _inner_products(matrix, queries):
+        """計算所有向量與查詢向量的內積（逐列讀取向量，多個查詢共用同一次讀取）"""
+        scores = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+        for row in range(matrix.shape[0]):
+            for q in range(queries.shape[0]):
+                total = np.float32(0.0)
+                for j in range(matrix.shape[1]):
+                    total += matrix[row, j] * queries[q, j]
+                scores[q, row] = total
+        return scores
+else:
+    _inner_products = None
+
+def content_hash(content: str) -> int:
+    """計算文件內容的 64 位元摘要（合併搜尋結果時作為去重鍵，避免以長字串為鍵）"""
+    data = content.encode('utf-8')
+    if xxhash is not None:
+        return xxhash.xxh3_64_intdigest(data)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
 
 class VectorStore:
     """向量資料庫"""
     
-    def __init__(self, vector_db_path: str, metadata_db_path: str, dimension: int = 384):
+    # 支援的索引類型
+    INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq", "pq", "fp16", "sq8", "auto")
+    
+    # 需訓練索引（IVF、PQ）所需的最少向量數（PQ 每個子空間有 256 個中心點）
+    MIN_PQ_TRAIN_SIZE = 256
+    
+    # 8 位元純量量化只需統計各維度的數值範圍，少量向量即可訓練
+    MIN_SQ_TRAIN_SIZE = 16
+    
+    # 8 位元純量量化的範圍預留比例（範圍由第一批向量決定，之後新增的向量超出時會被截斷）
+    SQ_RANGE_MARGIN = 0.1
+    
+    # auto 索引由 flat 改建為 HNSW 的向量數門檻（小型文件精確搜尋已足夠快）
+    AUTO_HNSW_THRESHOLD = 10000
+    
+    # 搜尋結果快取數量（以查詢向量、top_k 與相似度設定為鍵，內容變動時清空）
+    SEARCH_CACHE_SIZE = 256
+    
+    # 搜尋結果快取存活秒數（結果包含依當下時間計算的時間衰減分數，不可無限期重複使用）
+    SEARCH_CACHE_TTL = 600
+    
+    # 啟用 numba 搜尋時，flat 索引在此向量數以下改用 numba 內積核心
+    NUMBA_MAX_VECTORS = 50000
+    
+    # SQLite 記憶體映射大小（256 MB）
+    SQLITE_MMAP_SIZE = 268435456
+    
+    def __init__(self, vector_db_path: str, metadata_db_path: str, dimension: int = 384,
+                 index_type: str = "flat", use_gpu: bool = False, use_mmap: bool = False,
+                 ef_search: int = 64, nprobe: int = 16, use_numba: bool = False):
         self.vector_db_path = vector_db_path
         self.metadata_db_path = metadata_db_path
         self.dimension = dimension
-        
-        print(f"🗄️ 初始化向量資料庫...")
-        print(f"  向量資料庫路徑: {vector_db_path}")
-        print(f"  元資料庫路徑: {metadata_db_path}")
-        print(f"  向量維度: {dimension}")
-        
-        # 初始化FAISS索引
-        self.index = faiss.IndexFlatIP(dimension)  # 使用內積相似度
-        
-        # 初始化SQLite元資料庫
+        # 以記憶體映射載入索引檔，多個 worker 透過 page cache 共用同一份索引
+        self.use_mmap = use_mmap and not use_gpu
+        self._index_mmapped = False
+        
+        index_type = (index_type or "flat").lower()
+        if index_type not in self.INDEX_TYPES:
+            logger.warning("⚠️ 不支援的索引類型: %s，改用 flat", index_type)
+            index_type = "flat"
+        self.index_type = index_type
+        # 近似搜尋的廣度（數值越大召回率越高、搜尋越慢）
+        self.ef_search = max(1, ef_search)
+        self.nprobe = max(1, nprobe)
+        # 匯入時暫存向量的型別：fp16 索引本身只保存半精度，匯入管線不需保留 float32 副本
+        self.embedding_dtype = np.float16 if index_type == "fp16" else np.float32
+        
+        logger.info("🗄️ 初始化向量資料庫...")
+        logger.info("  向量資料庫路徑: %s", vector_db_path)
+        logger.info("  元資料庫路徑: %s", metadata_db_path)
+        logger.info("  向量維度: %s", dimension)
+        logger.info("  索引類型: %s", index_type)
+        if self.use_mmap:
+            logger.info("  記憶體映射: 啟用")
+        
+        # GPU 資源（僅在啟用且有可用 GPU 時建立，元資料仍保留在 SQLite）
+        self._gpu_resources = None
+        if use_gpu:
+            if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+                self._gpu_resources = faiss.StandardGpuResources()
+                logger.info("  🚀 使用 GPU 進行向量搜尋（可用 GPU: %s）", faiss.get_num_gpus())
+            else:
+                logger.warning("  ⚠️ 未偵測到可用的 GPU 版 FAISS，使用 CPU 搜尋")
+        
+        # 初始化FAISS索引（皆使用內積相似度，向量正規化後等同餘弦相似度）
+        self.index = self._create_index()
+        
+        # 常駐的元資料庫連線（各方法共用，保留語句快取）
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid = None
+        self._db_lock = threading.RLock()
+        
+        # 初始化SQLite元資料庫，並將元資料載入記憶體（SQLite 為持久化儲存，查詢時直接讀取記憶體）
         self._init_metadata_db()
+        self._meta: Dict[int, Tuple[str, str, str, str, Any, int]] = {}
+        self._load_metadata()
+        # BM25 關鍵字索引（第一次關鍵字搜尋時載入或建立，內容變動後重建）
+        self._keyword_index: Optional[BM25Index] = None
+        # 已儲存向量的總和向量與格拉姆矩陣（計算動態閾值用，第一次使用時建立，新增文件時累加）
+        self._score_moments: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # 搜尋結果快取（重複的問題不需重新搜尋）
+        # (查詢向量摘要, top_k, 設定) -> (到期時間, 結果)，到期時間使用 time.monotonic()
+        self._search_cache: "OrderedDict[Tuple[int, int, str], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+        self._keyword_index_path = None if vector_db_path == ":memory:" else f"{vector_db_path}.bm25"
         
         # 載入現有資料
         self._load_existing_data()
+        self.index = self._to_gpu(self.index)
+        
+        # 啟用 numba 搜尋時在載入時先編譯核心，避免第一個查詢等待 JIT 編譯
+        self._use_numba = use_numba and self._warm_up_numba()
         
-        print(f"✅ 向量資料庫初始化完成")
-        print(f"  當前向量數量: {self.index.ntotal}")
+        logger.info("✅ 向量資料庫初始化完成")
+        logger.info("  當前向量數量: %s", self.index.ntotal)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """開啟元資料庫連線（資料庫為 WAL 模式，多個 worker 可同時讀取）"""
+        conn = sqlite3.connect(self.metadata_db_path, check_same_thread=False, uri=True)
+        # synchronous 為連線層級設定；WAL 下只在檢查點時 fsync，批次寫入不必每次交易都等待磁碟
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # 頁面快取約 20 MB，暫存表（排序、GROUP BY）放在記憶體
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if self.use_mmap:
+            conn.execute(f"PRAGMA mmap_size={self.SQLITE_MMAP_SIZE}")
+        return conn
+    
+    @contextlib.contextmanager
+    def _db(self):
+        """取得常駐的元資料庫連線（同一時間只有一個執行緒使用；fork 出的 worker 會重新連線）"""
+        with self._db_lock:
+            if self._conn is None or self._conn_pid != os.getpid():
+                self._conn = self._connect()
+                self._conn_pid = os.getpid()
+            try:
+                yield self._conn
+            except Exception:
+                # 避免失敗的交易殘留在共用連線上
+                self._conn.rollback()
+                raise
+    
+    def close(self):
+        """關閉元資料庫連線"""
+        with self._db_lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self._conn.close()
+            self._conn = None
     
     def _init_metadata_db(self):
         """初始化元資料庫"""
@@ -38,131 +190,573 @@ class VectorStore:
         if self.metadata_db_path != ":memory:":
             os.makedirs(os.path.dirname(self.metadata_db_path), exist_ok=True)
         
-        conn = sqlite3.connect(self.metadata_db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chunk_id TEXT UNIQUE,
-                content TEXT,
-                source TEXT,
-                chunk_index INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        with self._db() as conn:
+            # journal_mode 會寫入資料庫檔案，只需在初始化時設定一次
+            conn.execute("PRAGMA journal_mode=WAL")
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chunk_id TEXT UNIQUE,
+                    content TEXT,
+                    source TEXT,
+                    chunk_index INTEGER,
+                    token_count INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # 建立索引提升查詢效能
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_chunk_id ON documents(chunk_id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_source ON documents(source)
+            ''')
+            # 新增文件後以 chunk_index 範圍載入新的元資料，避免每次都掃描整張資料表
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_chunk_index ON documents(chunk_index)
+            ''')
+            
+            # 舊版資料庫沒有 token_count 欄位，補上欄位
+            cursor.execute("PRAGMA table_info(documents)")
+            if "token_count" not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE documents ADD COLUMN token_count INTEGER")
+            
+            conn.commit()
+        logger.info("✅ 元資料庫初始化完成")
+    
+    def _load_metadata(self, min_chunk_index: int = 0):
+        """從SQLite載入元資料到記憶體（以向量ID為鍵，並預先計算內容摘要）
+        Args:
+            min_chunk_index: 只載入此向量ID之後的資料（新增文件後使用）
+        """
+        with self._db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT chunk_index, content, source, chunk_id, created_at, token_count
+                FROM documents
+                WHERE chunk_index >= ?
+            ''', (min_chunk_index,))
+            for chunk_index, content, source, chunk_id, created_at, token_count in cursor.fetchall():
+                self._meta[chunk_index] = (content, source, chunk_id, created_at, token_count, content_hash(content))
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=10000)
+    def _parse_timestamp(timestamp: str) -> datetime:
+        """解析元資料時間字串（相同時間字串只解析一次）"""
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    
+    @staticmethod
+    def _normalized(embeddings: np.ndarray, normalize: bool = True) -> np.ndarray:
+        """轉為 FAISS 需要的連續 float32 陣列並 L2 正規化
+        
+        已正規化的向量（例如嵌入模型的輸出）直接使用，不再寫入一次；
+        需要正規化時寫入新陣列，不修改呼叫端的資料。
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not normalize:
+            return embeddings
+        norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings))
+        if np.all(np.abs(norms - 1.0) < 1e-4):
+            return embeddings
+        # 零向量維持為零（與 faiss.normalize_L2 相同）
+        return embeddings / np.maximum(norms, 1e-12)[:, None]
+    
+    def _create_index(self, num_train_vectors: int = 0):
+        """依索引類型建立FAISS索引
+        Args:
+            num_train_vectors: 訓練向量數量（IVFPQ 用來決定分群數）
+        """
+        # PQ 子向量數需整除維度，每個子向量以 8 bits 編碼
+        pq_m = next(m for m in (48, 32, 24, 16, 8, 4, 2, 1) if self.dimension % m == 0)
+        
+        if self.index_type == "hnsw" or (self.index_type == "auto" and num_train_vectors >= self.AUTO_HNSW_THRESHOLD):
+            index = faiss.IndexHNSWFlat(self.dimension, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            self._apply_search_params(index)
+            return index
+        
+        if self.index_type in ("ivf", "ivfpq"):
+            # 分群數約為 √N
+            nlist = max(1, int(np.sqrt(num_train_vectors)))
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            if self.index_type == "ivf":
+                index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+            self._apply_search_params(index)
+            return index
+        
+        if self.index_type == "pq":
+            # 乘積量化：384 維 float32（1536 bytes）壓縮為 48 bytes
+            return faiss.IndexPQ(self.dimension, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+        
+        if self.index_type == "fp16":
+            # 半精度儲存：記憶體與掃描頻寬減半，搜尋時自動轉回 float32 計算
+            return faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
             )
-        ''')
-        
-        # 建立索引提升查詢效能
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_chunk_id ON documents(chunk_id)
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_source ON documents(source)
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("✅ 元資料庫初始化完成")
-    
-    def add_documents(self, texts: List[str], embeddings: np.ndarray, source: str = "notion"):
-        """添加文件到向量資料庫"""
+        
+        if self.index_type == "sq8":
+            # 8 位元純量量化：每個維度 1 byte，記憶體為 float32 的 1/4
+            index = faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+            index.sq.rangestat = faiss.ScalarQuantizer.RS_minmax
+            index.sq.rangestat_arg = self.SQ_RANGE_MARGIN
+            return index
+        
+        return faiss.IndexFlatIP(self.dimension)
+    
+    def _apply_search_params(self, index):
+        """設定近似搜尋廣度（nprobe 不會寫入索引檔，載入後也需重新設定）"""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = min(index.nlist, self.nprobe)
+    
+    def _upgrade_to_hnsw(self, num_vectors: int):
+        """auto 索引超過門檻時，將現有的 flat 索引改建為 HNSW"""
+        index = faiss.index_gpu_to_cpu(self.index) if self._is_gpu_index(self.index) else self.index
+        logger.info("🔁 向量數量達 %s，將 flat 索引改建為 HNSW...", num_vectors)
+        hnsw = self._create_index(num_vectors)
+        if index.ntotal:
+            hnsw.add(index.reconstruct_n(0, index.ntotal))
+        self.index = self._to_gpu(hnsw)
+    
+    def _to_gpu(self, index):
+        """若啟用 GPU，將索引搬移到 GPU（不支援的索引類型如 HNSW 維持在 CPU）"""
+        if self._gpu_resources is None:
+            return index
+        try:
+            return faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+        except Exception as e:
+            logger.warning("⚠️ 索引無法搬移到 GPU，維持使用 CPU: %s", e)
+            return index
+    
+    @staticmethod
+    def _is_gpu_index(index) -> bool:
+        """判斷索引是否位於 GPU"""
+        return type(index).__name__.startswith("Gpu")
+    
+    def _train_index(self, embeddings: np.ndarray):
+        """訓練需要訓練的索引（IVF、IVFPQ、PQ、SQ8），資料不足時退回 flat 索引"""
+        min_train_size = self.MIN_SQ_TRAIN_SIZE if self.index_type == "sq8" else self.MIN_PQ_TRAIN_SIZE
+        if len(embeddings) < min_train_size:
+            logger.warning("⚠️ 向量數量(%s)不足以訓練 %s（至少 %s），改用 flat 索引", len(embeddings), self.index_type.upper(), min_train_size)
+            self.index = self._to_gpu(faiss.IndexFlatIP(self.dimension))
+            return
+        
+        logger.info("🏋️ 使用 %s 個向量訓練 %s 索引...", len(embeddings), self.index_type.upper())
+        self.index = self._to_gpu(self._create_index(len(embeddings)))
+        self.index.train(embeddings)
+    
+    def add_documents(self, texts: List[str], embeddings: np.ndarray, source: str = "notion",
+                      token_counts: List[int] = None, normalize: bool = True):
+        """添加文件到向量資料庫
+        Args:
+            texts: 文本片段
+            embeddings: 對應的向量（不會被修改）
+            source: 資料來源
+            token_counts: 每個片段的 token 數（可選，組合上下文時使用）
+            normalize: 是否 L2 正規化向量（已正規化的向量自動略過）
+        """
         if len(texts) != len(embeddings):
             raise ValueError(f"文本數量({len(texts)})與嵌入數量({len(embeddings)})不匹配")
+        if token_counts is None:
+            token_counts = [None] * len(texts)
+        
+        logger.info("📝 添加 %s 個文檔到向量資料庫...", len(texts))
         
-        print(f"📝 添加 {len(texts)} 個文檔到向量資料庫...")
+        # 正規化向量（單位向量的內積即為餘弦相似度）
+        embeddings = self._normalized(embeddings, normalize)
         
-        # 正規化向量（對於內積相似度很重要）
-        faiss.normalize_L2(embeddings)
+        # 唯讀映射的索引需先複製到記憶體才能寫入
+        if self._index_mmapped:
+            self.index = self._writable_index()
+            self._index_mmapped = False
         
-        # 獲取當前索引數量（用於計算新的向量ID）
+        # 需要訓練的索引在第一次加入資料時訓練
+        if not self.index.is_trained:
+            self._train_index(embeddings)
+        
+        # auto 索引在文件量變大後改用 HNSW（搜尋由 O(N) 降為約 O(log N)）
+        num_vectors = self.index.ntotal + len(embeddings)
+        if (self.index_type == "auto" and num_vectors >= self.AUTO_HNSW_THRESHOLD
+                and (isinstance(self.index, faiss.IndexFlat) or type(self.index).__name__.startswith("GpuIndexFlat"))):
+            self._upgrade_to_hnsw(num_vectors)
+        
+        # 獲取當前索引數量（用於計算新的向量ID，與 chunk_index 一一對應）
         start_vector_id = self.index.ntotal
         
         # 添加到FAISS索引
         self.index.add(embeddings)
         
-        # 添加元資料到SQLite
-        conn = sqlite3.connect(self.metadata_db_path)
-        cursor = conn.cursor()
-        
-        for i, text in enumerate(texts):
-            chunk_id = f"{source}_{start_vector_id + i}_{hash(text) % 100000}"
-            cursor.execute('''
+        # 添加元資料到SQLite（單次批次寫入）
+        rows = [
+            (f"{source}_{start_vector_id + i}_{hash(text) % 100000}", text, source, start_vector_id + i, token_count)
+            for i, (text, token_count) in enumerate(zip(texts, token_counts))
+        ]
+        with self._db() as conn:
+            # 單一交易內以預備語句批次寫入所有片段
+            conn.execute("BEGIN")
+            conn.executemany('''
                 INSERT OR REPLACE INTO documents 
-                (chunk_id, content, source, chunk_index, updated_at)
-                VALUES (?, ?, ?, ?, datetime('now'))
-            ''', (chunk_id, text, source, start_vector_id + i))
-        
-        conn.commit()
-        conn.close()
+                (chunk_id, content, source, chunk_index, token_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, datetime('now'))
+            ''', rows)
+            conn.commit()
+        
+        # 同步記憶體中的元資料（created_at 由資料庫產生，重新讀取新增的部分）
+        self._load_metadata(start_vector_id)
+        self._keyword_index = None
+        self._clear_search_cache()
+        if self._score_moments is not None:
+            vectors = embeddings.astype(np.float64)
+            vector_sum, gram = self._score_moments
+            self._score_moments = (vector_sum + vectors.sum(axis=0), gram + vectors.T @ vectors)
         
         # 儲存FAISS索引
         self._save_faiss_index()
         
-        print(f"✅ 文檔添加完成，總向量數: {self.index.ntotal}")
+        logger.info("✅ 文檔添加完成，總向量數: %s", self.index.ntotal)
     
-    def search(self, query_embedding: np.ndarray, top_k: int = 5, settings: Dict = None, _recursion_depth: int = 0) -> List[Dict[str, Any]]:
+    # 資料庫為空時回傳的提示結果
+    EMPTY_MESSAGE = '目前資料庫沒有任何內容，請先同步 Notion 資料。'
+    EMPTY_RESULT = {
+        'content': EMPTY_MESSAGE,
+        'source': '',
+        'chunk_id': '',
+        'created_at': '',
+        'token_count': None,
+        'content_hash': content_hash(EMPTY_MESSAGE),
+        'score': 0,
+        'recency_score': 0,
+        'length_score': 0,
+        'index': -1
+    }
+    
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, settings: Dict = None,
+               normalize: bool = True) -> List[Dict[str, Any]]:
         """搜尋相似文件
         Args:
             query_embedding: 查詢向量
             top_k: 返回結果數量
             settings: 相似度設定（可選）
-            _recursion_depth: 遞迴深度（內部用）
+            normalize: 是否 L2 正規化查詢向量（已正規化的向量自動略過）
+        """
+        return self.search_batch(query_embedding.reshape(1, -1), top_k, settings, normalize)[0]
+    
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 5, settings: Dict = None,
+                     normalize: bool = True) -> List[List[Dict[str, Any]]]:
+        """批次搜尋相似文件（所有查詢向量一次送入FAISS）
+        Args:
+            query_embeddings: 查詢向量矩陣 (M, D)（不會被修改）
+            top_k: 每個查詢返回結果數量
+            settings: 相似度設定（可選）
+            normalize: 是否 L2 正規化查詢向量（已正規化的向量自動略過）
+        Returns:
+            與查詢向量一一對應的搜尋結果列表
         """
+        query_embeddings = self._normalized(np.reshape(query_embeddings, (-1, self.dimension)), normalize)
+        
+        # 先查快取，只搜尋未命中的查詢
+        settings_key = json.dumps(settings or {}, sort_keys=True, default=str)
+        cache_keys = [(self._vector_digest(query), top_k, settings_key) for query in query_embeddings]
+        batch_results = [self._get_cached_search(key) for key in cache_keys]
+        missing = [row for row, results in enumerate(batch_results) if results is None]
+        if missing:
+            computed = self._search_batch_uncached(query_embeddings[missing], top_k, settings)
+            for row, results in zip(missing, computed):
+                self._put_cached_search(cache_keys[row], results)
+                batch_results[row] = results
+        return batch_results
+    
+    @staticmethod
+    def _vector_digest(vector: np.ndarray) -> int:
+        """計算查詢向量的 64 位元摘要（搜尋快取鍵）"""
+        data = vector.tobytes()
+        if xxhash is not None:
+            return xxhash.xxh3_64_intdigest(data)
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+    
+    def _get_cached_search(self, key: Tuple[int, int, str]) -> Optional[List[Dict[str, Any]]]:
+        """取得未過期的快取搜尋結果（回傳副本，呼叫端調整分數不影響快取）"""
+        with self._search_cache_lock:
+            entry = self._search_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, results = entry
+            if time.monotonic() >= expires_at:
+                del self._search_cache[key]
+                return None
+            self._search_cache.move_to_end(key)
+        return [dict(result) for result in results]
+    
+    def _put_cached_search(self, key: Tuple[int, int, str], results: List[Dict[str, Any]]):
+        """寫入搜尋結果快取（LRU 淘汰，超過存活時間後失效）"""
+        if self.SEARCH_CACHE_SIZE <= 0 or self.SEARCH_CACHE_TTL <= 0:
+            return
+        snapshot = [dict(result) for result in results]
+        with self._search_cache_lock:
+            self._search_cache[key] = (time.monotonic() + self.SEARCH_CACHE_TTL, snapshot)
+            self._search_cache.move_to_end(key)
+            while len(self._search_cache) > self.SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+    
+    def _clear_search_cache(self):
+        """清空搜尋結果快取（新增或清空文件後使用）"""
+        with self._search_cache_lock:
+            self._search_cache.clear()
+    
+    def _search_batch_uncached(self, query_embeddings: np.ndarray, top_k: int,
+                               settings: Optional[Dict]) -> List[List[Dict[str, Any]]]:
+        """不經快取的批次搜尋（查詢向量已正規化）"""
+        num_queries = len(query_embeddings)
+        
         if self.index.ntotal == 0:
-            print("⚠️ 向量資料庫為空（防呆提示）")
-            return [{
-                'content': '目前資料庫沒有任何內容，請先同步 Notion 資料。',
-                'source': '',
-                'chunk_id': '',
-                'created_at': '',
-                'score': 0,
-                'recency_score': 0,
-                'length_score': 0,
-                'index': -1
-            }]
+            logger.warning("⚠️ 向量資料庫為空（防呆提示）")
+            return [[dict(self.EMPTY_RESULT)] for _ in range(num_queries)]
         
         # 使用預設設定或傳入的設定
         settings = settings or {}
         base_threshold = settings.get("BASE_THRESHOLD", 0.3)
         dynamic_settings = settings.get("DYNAMIC_THRESHOLD", {})
         filter_settings = settings.get("FILTER_SETTINGS", {})
-        min_threshold = dynamic_settings.get("MIN_THRESHOLD", 0.25) if dynamic_settings.get("ENABLED", False) else 0.01
-        max_recursion = 5
+        dynamic_enabled = dynamic_settings.get("ENABLED", False)
+        min_threshold = dynamic_settings.get("MIN_THRESHOLD", 0.25) if dynamic_enabled else 0.01
+        max_relaxation = 5
+        
+        # 計算動態閾值（分數分佈由向量動差直接求得，不需對整個索引搜尋）
+        if dynamic_enabled:
+            moments = self._get_score_moments()
+            if moments is not None:
+                mean_scores, std_scores = self._score_distribution(query_embeddings, moments)
+            else:
+                all_scores, all_indices = self.index.search(query_embeddings, self.index.ntotal)
+                valid_scores = [all_scores[row][all_indices[row] != -1] for row in range(num_queries)]
+                mean_scores = [np.mean(row_scores) for row_scores in valid_scores]
+                std_scores = [np.std(row_scores) for row_scores in valid_scores]
+            thresholds = [
+                self._dynamic_threshold(mean_scores[row], std_scores[row], dynamic_settings, min_threshold)
+                for row in range(num_queries)
+            ]
+        else:
+            thresholds = [base_threshold] * num_queries
         
-        query_embedding = query_embedding.reshape(1, -1)
-        faiss.normalize_L2(query_embedding)
+        # 最終分數上限
+        score_cap = self._score_cap(settings)
         
-        # 計算動態閾值
-        if dynamic_settings.get("ENABLED", False):
-            all_scores, _ = self.index.search(query_embedding, self.index.ntotal)
-            scores = all_scores[0]
-            
-            # 計算分數分佈
-            mean_score = np.mean(scores)
-            std_score = np.std(scores)
-            
-            # 使用加權方式計算動態閾值
-            score_distribution = dynamic_settings.get("SCORE_DISTRIBUTION", {})
-            mean_weight = score_distribution.get("MEAN_WEIGHT", 0.6)
-            std_weight = score_distribution.get("STD_WEIGHT", 0.4)
+        # 應用結果過濾
+        min_results = filter_settings.get("MIN_RESULTS", 1)
+        max_results = filter_settings.get("MAX_RESULTS", 8)
+        
+        # 執行搜尋（單次呼叫處理所有查詢；一次取足放寬閾值時需要的候選數，不需重新搜尋）
+        fetch_k = min(max(top_k, max_results), self.index.ntotal)
+        scores, indices = self._search_index(query_embeddings, fetch_k)
+        
+        batch_results = []
+        for row in range(num_queries):
+            threshold = thresholds[row]
+            cap = score_cap
+            candidates = min(top_k, fetch_k)
+            results = self._ranked_results(scores[row], indices[row], candidates, threshold, cap, filter_settings)
             
-            dynamic_threshold = (
-                mean_score * mean_weight + 
-                (mean_score + std_score * dynamic_settings.get("ADJUSTMENT_FACTOR", 0.15)) * std_weight
-            )
+            # 結果不足時逐步放寬閾值（候選擴大為 max_results 筆），停止條件：
+            # 1. 已達最大放寬次數
+            # 2. 閾值已經低於 min_threshold
+            # 3. 結果數已等於資料庫總數
+            for _ in range(max_relaxation):
+                if not (0 < len(results) < min_results and threshold > min_threshold and
+                        len(results) < self.index.ntotal):
+                    break
+                # 動態閾值不隨基礎閾值改變，候選擴大後結果即不再變動
+                if dynamic_enabled and candidates == fetch_k:
+                    break
+                if not dynamic_enabled:
+                    threshold *= 0.8
+                    cap = threshold
+                candidates = fetch_k
+                results = self._ranked_results(scores[row], indices[row], candidates, threshold, cap, filter_settings)
             
-            # 確保閾值在合理範圍內
-            threshold = max(
-                min(dynamic_threshold, dynamic_settings.get("MAX_THRESHOLD", 0.45)),
-                min_threshold
-            )
-        else:
-            threshold = base_threshold
+            batch_results.append(results[:max_results])
+        
+        return batch_results
+    
+    def keyword_search(self, query: str, top_k: int = 5, settings: Dict = None) -> List[Dict[str, Any]]:
+        """BM25 關鍵字搜尋（不需編碼查詢向量）
+        
+        分數以最高分正規化後乘上與向量搜尋相同的分數上限，合併兩種結果時尺度一致；
+        時間衰減與長度懲罰的計算方式與向量搜尋相同。
+        Args:
+            query: 查詢文字
+            top_k: 返回結果數量
+            settings: 相似度設定（可選，與向量搜尋使用同一份設定）
+        """
+        scores, indices = self._get_keyword_index().search(query, top_k)
+        if len(scores) == 0:
+            return []
+        settings = settings or {}
+        score_cap = self._score_cap(settings)
+        return self._collect_results(
+            scores / scores[0] * score_cap, indices, 0.0, score_cap, settings.get("FILTER_SETTINGS", {})
+        )
+    
+    @staticmethod
+    def _score_cap(settings: Dict) -> float:
+        """最終分數上限（啟用動態閾值時為 MAX_THRESHOLD，否則為基礎閾值）"""
+        dynamic_settings = settings.get("DYNAMIC_THRESHOLD", {})
+        if dynamic_settings.get("ENABLED", False):
+            return dynamic_settings.get("MAX_THRESHOLD", 0.45)
+        return settings.get("BASE_THRESHOLD", 0.3)
+    
+    def _get_keyword_index(self) -> BM25Index:
+        """取得 BM25 索引：優先使用記憶體中的索引，其次是內容摘要相符的索引檔，最後才重新建立"""
+        keyword_index = self._keyword_index
+        if keyword_index is not None:
+            return keyword_index
+        
+        meta = sorted(self._meta.items())
+        corpus_hash = self._corpus_hash(meta)
+        keyword_index = self._load_keyword_index(corpus_hash)
+        if keyword_index is None:
+            keyword_index = BM25Index((idx, row[0]) for idx, row in meta)
+            self._save_keyword_index(corpus_hash, keyword_index)
+        self._keyword_index = keyword_index
+        return keyword_index
+    
+    @staticmethod
+    def _corpus_hash(meta: List[Tuple[int, Tuple]]) -> str:
+        """以向量ID與內容摘要計算整體內容的摘要（內容摘要已預先計算，不需重新讀取全文）"""
+        pairs = np.array([(idx, row[5]) for idx, row in meta], dtype=np.uint64)
+        return hashlib.blake2b(pairs.tobytes(), digest_size=16).hexdigest()
+    
+    def _load_keyword_index(self, corpus_hash: str) -> Optional[BM25Index]:
+        """載入索引檔（其他 worker 或上次執行建立），內容摘要不符時回傳 None"""
+        if self._keyword_index_path is None or not os.path.exists(self._keyword_index_path):
+            return None
+        try:
+            with open(self._keyword_index_path, "rb") as f:
+                saved_hash, keyword_index = pickle.load(f)
+        except Exception as e:
+            logger.warning("⚠️ 載入關鍵字索引失敗: %s", e)
+            return None
+        return keyword_index if saved_hash == corpus_hash else None
+    
+    def _save_keyword_index(self, corpus_hash: str, keyword_index: BM25Index):
+        """儲存索引檔（先寫入暫存檔再取代，其他 worker 不會讀到寫到一半的檔案）"""
+        if self._keyword_index_path is None:
+            return
+        tmp_path = f"{self._keyword_index_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self._keyword_index_path) or ".", exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump((corpus_hash, keyword_index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._keyword_index_path)
+        except OSError as e:
+            logger.warning("⚠️ 儲存關鍵字索引失敗: %s", e)
+    
+    # 由索引重建向量計算動差時，每次處理的向量數
+    MOMENT_CHUNK_SIZE = 4096
+    
+    def _get_score_moments(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """取得已儲存向量的總和向量與格拉姆矩陣，索引不支援重建向量時回傳 None"""
+        if self._score_moments is None:
+            vector_sum = np.zeros(self.dimension, dtype=np.float64)
+            gram = np.zeros((self.dimension, self.dimension), dtype=np.float64)
+            try:
+                for start in range(0, self.index.ntotal, self.MOMENT_CHUNK_SIZE):
+                    count = min(self.MOMENT_CHUNK_SIZE, self.index.ntotal - start)
+                    vectors = self.index.reconstruct_n(start, count).astype(np.float64)
+                    vector_sum += vectors.sum(axis=0)
+                    gram += vectors.T @ vectors
+            except Exception as e:
+                logger.warning("⚠️ 索引無法重建向量，動態閾值改用完整搜尋: %s", e)
+                return None
+            self._score_moments = (vector_sum, gram)
+        return self._score_moments
+    
+    def _score_distribution(self, query_embeddings: np.ndarray,
+                            moments: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """計算每個查詢對所有文件相似度的平均與標準差
         
-        # 執行搜尋
-        scores, indices = self.index.search(query_embedding, min(top_k, self.index.ntotal))
-        conn = sqlite3.connect(self.metadata_db_path)
-        cursor = conn.cursor()
+        分數為 q·x，平均為 q·Σx / N，二階動差為 qᵀ(Σxxᵀ)q / N，
+        計算量與文件數無關（O(D²)），結果與逐一比對全部文件相同。
+        """
+        vector_sum, gram = moments
+        num_vectors = self.index.ntotal
+        queries = query_embeddings.astype(np.float64)
+        mean_scores = queries @ vector_sum / num_vectors
+        second_moments = np.einsum("ij,jk,ik->i", queries, gram, queries) / num_vectors
+        std_scores = np.sqrt(np.maximum(second_moments - mean_scores ** 2, 0.0))
+        return mean_scores, std_scores
+    
+    def _warm_up_numba(self) -> bool:
+        """編譯 numba 內積核心（使用與搜尋相同的 float32 二維陣列型別），未安裝或編譯失敗時回傳 False"""
+        if _inner_products is None:
+            logger.warning("⚠️ 未安裝 numba，使用 FAISS 搜尋")
+            return False
+        try:
+            sample = np.zeros((1, self.dimension), dtype=np.float32)
+            _inner_products(sample, sample)
+        except Exception as e:
+            logger.warning("⚠️ numba 內積核心編譯失敗，改用 FAISS 搜尋: %s", e)
+            return False
+        logger.info("  ⚡ numba 內積核心已就緒")
+        return True
+    
+    def _search_index(self, query_embeddings: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """向量搜尋：啟用 numba 時小型 flat 索引直接對索引內的向量計算內積，其餘交給 FAISS"""
+        if (not self._use_numba or not isinstance(self.index, faiss.IndexFlatIP)
+                or self.index.ntotal > self.NUMBA_MAX_VECTORS):
+            return self.index.search(query_embeddings, k)
+        
+        # 直接讀取 flat 索引的向量儲存區（不複製）
+        ntotal = self.index.ntotal
+        matrix = faiss.rev_swig_ptr(self.index.get_xb(), ntotal * self.dimension).reshape(ntotal, self.dimension)
+        scores = _inner_products(matrix, query_embeddings)
+        
+        # 部分排序取前 k 名，再排序這 k 個結果
+        if k < ntotal:
+            indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            indices = np.tile(np.arange(ntotal), (len(scores), 1))
+        top_scores = np.take_along_axis(scores, indices, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+    
+    @staticmethod
+    def _dynamic_threshold(mean_score: float, std_score: float, dynamic_settings: Dict,
+                           min_threshold: float) -> float:
+        """依分數分佈（平均與標準差）計算動態閾值"""
+        # 使用加權方式計算動態閾值
+        score_distribution = dynamic_settings.get("SCORE_DISTRIBUTION", {})
+        mean_weight = score_distribution.get("MEAN_WEIGHT", 0.6)
+        std_weight = score_distribution.get("STD_WEIGHT", 0.4)
+        
+        dynamic_threshold = (
+            mean_score * mean_weight + 
+            (mean_score + std_score * dynamic_settings.get("ADJUSTMENT_FACTOR", 0.15)) * std_weight
+        )
+        
+        # 確保閾值在合理範圍內
+        return max(
+            min(dynamic_threshold, dynamic_settings.get("MAX_THRESHOLD", 0.45)),
+            min_threshold
+        )
+    
+    def _ranked_results(self, scores: np.ndarray, indices: np.ndarray, candidates: int, threshold: float,
+                        score_cap: float, filter_settings: Dict) -> List[Dict[str, Any]]:
+        """取前 candidates 筆FAISS結果，過濾後依綜合分數排序"""
+        results = self._collect_results(scores[:candidates], indices[:candidates], threshold, score_cap, filter_settings)
+        results.sort(key=lambda x: x['score'], reverse=True)
+        return results
+    
+    def _collect_results(self, scores: np.ndarray, indices: np.ndarray, threshold: float,
+                         score_cap: float, filter_settings: Dict) -> List[Dict[str, Any]]:
+        """將單一查詢的FAISS結果轉為文件結果（過濾閾值並計算綜合分數）"""
         results = []
         
         # 獲取長度懲罰設定
@@ -171,29 +765,22 @@ class VectorStore:
         min_length = length_penalty.get("MIN_LENGTH", 10)
         max_length = length_penalty.get("MAX_LENGTH", 500)
         penalty_factor = length_penalty.get("PENALTY_FACTOR", 0.1)
+        score_decay = filter_settings.get("SCORE_DECAY", 0.15)
+        now = datetime.now()
         
-        for i, idx in enumerate(indices[0]):
-            if idx == -1:
-                continue
-                
-            score = float(scores[0][i])
-            if score < threshold:
-                continue
-                
-            cursor.execute('''
-                SELECT content, source, chunk_id, created_at 
-                FROM documents 
-                WHERE chunk_index = ?
-            ''', (int(idx),))
-            row = cursor.fetchone()
+        # 以向量運算一次篩出有效且達到閾值的結果，只對保留的結果逐筆計算分數
+        keep = np.flatnonzero((indices != -1) & (scores >= threshold))
+        
+        for score, idx in zip(scores[keep].tolist(), indices[keep].tolist()):
+            row = self._meta.get(idx)
             
             if row:
                 content = row[0]
-                created_at = datetime.fromisoformat(row[3].replace('Z', '+00:00'))
-                time_diff = datetime.now() - created_at
+                created_at = self._parse_timestamp(row[3])
+                time_diff = now - created_at
                 
                 # 計算時間衰減分數
-                recency_score = 1.0 / (1.0 + time_diff.days * filter_settings.get("SCORE_DECAY", 0.15))
+                recency_score = 1.0 / (1.0 + time_diff.days * score_decay)
                 
                 # 計算長度懲罰
                 length_score = 1.0
@@ -209,112 +796,93 @@ class VectorStore:
                 final_score = score * (1.0 + (recency_score + length_score - 1.0) * bonus_factor)
                 
                 # 確保分數不超過閾值
-                if dynamic_settings.get("ENABLED", False):
-                    final_score = min(final_score, dynamic_settings.get("MAX_THRESHOLD", 0.45))
-                else:
-                    final_score = min(final_score, base_threshold)
+                final_score = min(final_score, score_cap)
                 
                 results.append({
                     'content': content,
                     'source': row[1],
                     'chunk_id': row[2],
                     'created_at': row[3],
+                    'token_count': row[4],
+                    'content_hash': row[5],
                     'score': final_score,
                     'recency_score': recency_score,
                     'length_score': length_score,
-                    'index': int(idx)
+                    'index': idx
                 })
         
-        conn.close()
-        
-        # 按綜合分數排序
-        results.sort(key=lambda x: x['score'], reverse=True)
-        
-        # 應用結果過濾
-        min_results = filter_settings.get("MIN_RESULTS", 1)
-        max_results = filter_settings.get("MAX_RESULTS", 8)
-        
-        # 遞迴終止條件：
-        # 1. 已達最大遞迴深度
-        # 2. 閾值已經低於 min_threshold
-        # 3. 結果數已等於資料庫總數
-        if (len(results) < min_results and len(results) > 0 and
-            threshold > min_threshold and _recursion_depth < max_recursion and
-            len(results) < self.index.ntotal):
-            return self.search(query_embedding, top_k=max_results, settings={
-                **settings,
-                "BASE_THRESHOLD": threshold * 0.8
-            }, _recursion_depth=_recursion_depth+1)
-            
-        return results[:max_results]
+        return results
     
     def get_all_documents(self) -> List[Dict[str, Any]]:
         """獲取所有文檔"""
-        conn = sqlite3.connect(self.metadata_db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT chunk_id, content, source, chunk_index, created_at, updated_at
-            FROM documents 
-            ORDER BY chunk_index
-        ''')
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                'chunk_id': row[0],
-                'content': row[1],
-                'source': row[2],
-                'chunk_index': row[3],
-                'created_at': row[4],
-                'updated_at': row[5]
-            })
-        
-        conn.close()
+        with self._db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT chunk_id, content, source, chunk_index, created_at, updated_at
+                FROM documents 
+                ORDER BY chunk_index
+            ''')
+            
+            results = []
+            for row in cursor.fetchall():
+                results.append({
+                    'chunk_id': row[0],
+                    'content': row[1],
+                    'source': row[2],
+                    'chunk_index': row[3],
+                    'created_at': row[4],
+                    'updated_at': row[5]
+                })
         return results
     
     def clear_database(self):
         """清空資料庫"""
-        print("🗑️ 清空向量資料庫...")
+        logger.info("🗑️ 清空向量資料庫...")
         # 重新初始化FAISS索引
-        self.index = faiss.IndexFlatIP(self.dimension)
+        self.index = self._to_gpu(self._create_index())
+        self._index_mmapped = False
         # 清空SQLite
-        conn = sqlite3.connect(self.metadata_db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM documents')
-        conn.commit()
-        conn.close()
+        with self._db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM documents')
+            conn.commit()
+        self._meta.clear()
+        self._keyword_index = None
+        self._score_moments = None
+        self._clear_search_cache()
         # 刪除FAISS檔案或資料夾
         if os.path.isdir(self.vector_db_path):
             shutil.rmtree(self.vector_db_path)
         elif os.path.exists(self.vector_db_path):
             os.remove(self.vector_db_path)
-        print("✅ 資料庫已清空")
+        if self._keyword_index_path and os.path.exists(self._keyword_index_path):
+            os.remove(self._keyword_index_path)
+        logger.info("✅ 資料庫已清空")
     
     def get_stats(self) -> Dict[str, Any]:
         """獲取資料庫統計資訊"""
-        conn = sqlite3.connect(self.metadata_db_path)
-        cursor = conn.cursor()
-        
-        # 總文檔數
-        cursor.execute('SELECT COUNT(*) FROM documents')
-        doc_count = cursor.fetchone()[0]
-        
-        # 按來源統計
-        cursor.execute('SELECT source, COUNT(*) FROM documents GROUP BY source')
-        source_stats = dict(cursor.fetchall())
-        
-        # 平均文檔長度
-        cursor.execute('SELECT AVG(LENGTH(content)) FROM documents')
-        avg_length = cursor.fetchone()[0] or 0
-        
-        conn.close()
+        with self._db() as conn:
+            cursor = conn.cursor()
+            
+            # 總文檔數
+            cursor.execute('SELECT COUNT(*) FROM documents')
+            doc_count = cursor.fetchone()[0]
+            
+            # 按來源統計
+            cursor.execute('SELECT source, COUNT(*) FROM documents GROUP BY source')
+            source_stats = dict(cursor.fetchall())
+            
+            # 平均文檔長度
+            cursor.execute('SELECT AVG(LENGTH(content)) FROM documents')
+            avg_length = cursor.fetchone()[0] or 0
         
         return {
             'total_documents': doc_count,
             'total_vectors': self.index.ntotal,
             'source_stats': source_stats,
             'avg_content_length': round(avg_length, 2),
-            'vector_dimension': self.dimension
+            'vector_dimension': self.dimension,
+            'index_type': self.index_type
         }
     
     def _save_faiss_index(self):
@@ -324,15 +892,40 @@ class VectorStore:
             return
         
         os.makedirs(os.path.dirname(self.vector_db_path), exist_ok=True)
-        faiss.write_index(self.index, self.vector_db_path)
+        # GPU 索引需先複製回 CPU 才能寫檔
+        index = faiss.index_gpu_to_cpu(self.index) if self._is_gpu_index(self.index) else self.index
+        faiss.write_index(index, self.vector_db_path)
+    
+    def _writable_index(self):
+        """取得可寫入的索引副本（IVF 映射的倒排列表不支援 clone，改為重新完整讀取索引檔）"""
+        try:
+            index = faiss.clone_index(self.index)
+        except RuntimeError:
+            index = faiss.read_index(self.vector_db_path)
+        self._apply_search_params(index)
+        return index
+    
+    def _read_index_mmap(self):
+        """以唯讀記憶體映射載入索引檔，索引類型不支援映射時回傳 None（改用一般載入）"""
+        try:
+            return faiss.read_index(self.vector_db_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception as e:
+            logger.warning("⚠️ 索引無法以記憶體映射載入，改為完整讀入記憶體: %s", e)
+            return None
     
     def _load_existing_data(self):
         """載入現有資料"""
         if os.path.exists(self.vector_db_path):
             try:
-                self.index = faiss.read_index(self.vector_db_path)
-                print(f"✅ 載入現有向量索引，包含 {self.index.ntotal} 個向量")
+                self.index = self._read_index_mmap() if self.use_mmap else None
+                if self.index is not None:
+                    self._index_mmapped = True
+                else:
+                    self.index = faiss.read_index(self.vector_db_path)
+                self._apply_search_params(self.index)
+                logger.info("✅ 載入現有向量索引，包含 %s 個向量", self.index.ntotal)
             except Exception as e:
-                print(f"⚠️ 載入向量索引失敗: {e}")
-                print("將建立新的索引")
-                self.index = faiss.IndexFlatIP(self.dimension)
\ No newline at end of file
+                logger.warning("⚠️ 載入向量索引失敗: %s", e)
+                logger.info("將建立新的索引")
+                self.index = self._create_index()
+                self._index_mmapped = False
\ No newline at end of file
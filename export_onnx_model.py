@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+嵌入模型 ONNX 匯出工具（部署前執行一次）
+
+將 sentence-transformers 模型匯出為 ONNX，並以動態量化產生 int8 版本，
+CPU 推論速度更快、記憶體更小，各 worker 啟動時直接從磁碟載入。
+
+需要額外安裝：pip install "sentence-transformers[onnx]"
+"""
+
+import os
+import sys
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 量化設定（avx512_vnni 適用於近代 x86 CPU，ARM 可改用 arm64）
+QUANTIZATION_CONFIG = "avx512_vnni"
+
+def export_onnx_model(model_name: str, output_dir: str):
+    """匯出 ONNX 模型並產生 int8 量化版本"""
+    try:
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    except ImportError:
+        print("❌ 需要 sentence-transformers 3.2 以上版本，請執行：pip install \"sentence-transformers[onnx]\"")
+        return False
+
+    print(f"🔄 匯出 ONNX 模型: {model_name}")
+    model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+    model.save_pretrained(output_dir)
+    print(f"✅ ONNX 模型已儲存至 {output_dir}")
+
+    print(f"🔄 產生 int8 量化模型（{QUANTIZATION_CONFIG}）...")
+    export_dynamic_quantized_onnx_model(model, QUANTIZATION_CONFIG, output_dir)
+
+    quantized_file = f"onnx/model_qint8_{QUANTIZATION_CONFIG}.onnx"
+    print(f"✅ 量化完成：{os.path.join(output_dir, quantized_file)}")
+    print("\n🚀 在 config/.env 加入以下設定即可使用：")
+    print(f"EMBEDDING_MODEL={output_dir}")
+    print("EMBEDDING_BACKEND=onnx")
+    print(f"EMBEDDING_MODEL_FILE={quantized_file}")
+    return True
+
+if __name__ == "__main__":
+    from config.settings import Settings
+
+    settings = Settings()
+    output_dir = os.path.join(settings.CACHE_PATH, "onnx_model")
+    success = export_onnx_model(settings.EMBEDDING_MODEL, output_dir)
+    sys.exit(0 if success else 1)
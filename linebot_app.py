@@ -14,9 +14,10 @@ os.environ['MKL_NUM_THREADS'] = '1'
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config.settings import Settings
+from config.logging_setup import setup_logging
 from core.notion_client import NotionClient
 from core.text_processor import TextProcessor
-from core.embedder import Embedder
+from core.embedder import Embedder, BatchingEmbedder
 from core.vector_store import VectorStore
 from core.enhanced_rag_engine import EnhancedRAGEngine
 from core.conversation_memory import ConversationMemory
@@ -30,6 +31,7 @@ from linebot.v3.webhooks import MessageEvent, TextMessageContent
 # 載入設定
 try:
     settings = Settings()
+    setup_logging(settings.LOG_LEVEL)
     print("✅ 設定載入成功")
     
     # 驗證 LINE Bot 設定
@@ -64,13 +66,35 @@ def initialize_system():
             
             # 1. 建立基礎組件
             print("📦 初始化基礎組件...")
-            notion_client = NotionClient(settings.NOTION_TOKEN)
+            notion_client = NotionClient(
+                settings.NOTION_TOKEN,
+                cache_ttl=settings.NOTION_CACHE_TTL,
+                page_cache_ttl=settings.NOTION_PAGE_CACHE_TTL,
+                rate_limit=settings.NOTION_RATE_LIMIT
+            )
             text_processor = TextProcessor(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
-            embedder = Embedder(settings.EMBEDDING_MODEL)
+            # 並發的 LINE 訊息查詢合併為批次編碼
+            embedder = BatchingEmbedder(
+                Embedder(
+                    settings.EMBEDDING_MODEL,
+                    backend=settings.EMBEDDING_BACKEND,
+                    model_file=settings.EMBEDDING_MODEL_FILE,
+                    cache_folder=settings.CACHE_PATH,
+                    precision=settings.EMBEDDING_PRECISION
+                ),
+                max_batch_size=settings.EMBED_MAX_BATCH_SIZE,
+                max_wait_ms=settings.EMBED_BATCH_WAIT_MS
+            )
             vector_store = VectorStore(
                 settings.VECTOR_DB_PATH, 
                 settings.METADATA_DB_PATH, 
-                settings.EMBEDDING_DIMENSION
+                settings.EMBEDDING_DIMENSION,
+                settings.VECTOR_INDEX_TYPE,
+                use_gpu=settings.USE_GPU_FAISS,
+                use_mmap=settings.VECTOR_DB_MMAP,
+                ef_search=settings.VECTOR_HNSW_EF_SEARCH,
+                nprobe=settings.VECTOR_IVF_NPROBE,
+                use_numba=settings.VECTOR_NUMBA_SEARCH
             )
             
             # 2. 建立增強版 RAG 引擎
@@ -260,7 +284,7 @@ def clear_all_memory():
         
         # 清理所有對話
         cleared_count = 0
-        user_ids = list(conversation_memory.conversations.keys())
+        user_ids = conversation_memory.get_user_ids()
         for user_id in user_ids:
             if conversation_memory.clear_conversation(user_id):
                 cleared_count += 1
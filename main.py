@@ -1,6 +1,7 @@
 import os
 import sys
 from config.settings import Settings
+from config.logging_setup import setup_logging
 from core.notion_client import NotionClient
 from core.text_processor import TextProcessor
 from core.embedder import Embedder
@@ -43,16 +44,34 @@ def initialize_system():
         # 載入設定
         print("📋 載入設定...")
         settings = Settings()
+        setup_logging(settings.LOG_LEVEL)
         
         # 建立各個組件
         print("🔧 建立系統組件...")
-        notion_client = NotionClient(settings.NOTION_TOKEN)
+        notion_client = NotionClient(
+            settings.NOTION_TOKEN,
+            cache_ttl=settings.NOTION_CACHE_TTL,
+            page_cache_ttl=settings.NOTION_PAGE_CACHE_TTL,
+            rate_limit=settings.NOTION_RATE_LIMIT
+        )
         text_processor = TextProcessor(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
-        embedder = Embedder(settings.EMBEDDING_MODEL)
+        embedder = Embedder(
+            settings.EMBEDDING_MODEL,
+            backend=settings.EMBEDDING_BACKEND,
+            model_file=settings.EMBEDDING_MODEL_FILE,
+            cache_folder=settings.CACHE_PATH,
+            precision=settings.EMBEDDING_PRECISION
+        )
         vector_store = VectorStore(
             settings.VECTOR_DB_PATH, 
             settings.METADATA_DB_PATH, 
-            settings.EMBEDDING_DIMENSION
+            settings.EMBEDDING_DIMENSION,
+            settings.VECTOR_INDEX_TYPE,
+            use_gpu=settings.USE_GPU_FAISS,
+            use_mmap=settings.VECTOR_DB_MMAP,
+            ef_search=settings.VECTOR_HNSW_EF_SEARCH,
+            nprobe=settings.VECTOR_IVF_NPROBE,
+            use_numba=settings.VECTOR_NUMBA_SEARCH
         )
         
         # 建立RAG引擎
@@ -1,5 +1,6 @@
 import sys
 import os
+import logging
 import traceback
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -16,6 +17,8 @@ from core.enhanced_rag_engine import EnhancedRAGEngine
 from linebot.v3.messaging import Configuration, ApiClient, MessagingApi, ReplyMessageRequest, TextMessage as LineTextMessage
 from linebot.v3.webhooks import MessageEvent, TextMessageContent
 
+logger = logging.getLogger(__name__)
+
 class LineBotHandler:
     """LINE Bot 訊息處理器 - 整合對話記憶與 RAG 引擎"""
     
@@ -37,9 +40,9 @@ class LineBotHandler:
             configuration = Configuration(access_token=line_channel_access_token)
             api_client = ApiClient(configuration)
             self.line_bot_api = MessagingApi(api_client)
-            print("✅ LINE Bot API 初始化成功")
+            logger.info("✅ LINE Bot API 初始化成功")
         except Exception as e:
-            print(f"❌ LINE Bot API 初始化失敗: {e}")
+            logger.error("❌ LINE Bot API 初始化失敗: %s", e)
             raise
         
         # 預定義回應
@@ -73,7 +76,7 @@ class LineBotHandler:
         # 啟動狀態清理定時器
         self._start_cleanup_timer()
         
-        print("🤖 LINE Bot 處理器已初始化")
+        logger.info("🤖 LINE Bot 處理器已初始化")
     
     def _start_cleanup_timer(self):
         """啟動定時清理過期的確認狀態"""
@@ -89,16 +92,16 @@ class LineBotHandler:
                     
                     for user_id in expired_users:
                         del self.pending_updates[user_id]
-                        print(f"🧹 清理過期的確認狀態: {user_id}")
+                        logger.info("🧹 清理過期的確認狀態: %s", user_id)
                     
                     time.sleep(60)  # 每分鐘檢查一次
                 except Exception as e:
-                    print(f"❌ 清理確認狀態時發生錯誤: {e}")
+                    logger.error("❌ 清理確認狀態時發生錯誤: %s", e)
                     time.sleep(60)
         
         cleanup_thread = threading.Thread(target=cleanup_expired_confirmations, daemon=True)
         cleanup_thread.start()
-        print("🧹 狀態清理定時器已啟動")
+        logger.info("🧹 狀態清理定時器已啟動")
 
     def handle_text_message(self, event: MessageEvent) -> None:
         """
@@ -112,7 +115,7 @@ class LineBotHandler:
             user_id = event.source.user_id
             user_message = event.message.text.strip()
             
-            print(f"📩 收到用戶 {user_id} 的訊息: {user_message}")
+            logger.info("📩 收到用戶 %s 的訊息: %s", user_id, user_message)
             
             # 檢查是否為特殊指令
             response = self._handle_special_commands(user_id, user_message)
@@ -124,10 +127,10 @@ class LineBotHandler:
             # 發送回應
             self._send_reply(event.reply_token, response)
             
-            print(f"✅ 已回覆用戶 {user_id}")
+            logger.info("✅ 已回覆用戶 %s", user_id)
             
         except Exception as e:
-            print(f"❌ 處理訊息時發生錯誤: {e}")
+            logger.error("❌ 處理訊息時發生錯誤: %s", e)
             traceback.print_exc()
             
             # 發送錯誤訊息
@@ -135,7 +138,7 @@ class LineBotHandler:
             try:
                 self._send_reply(event.reply_token, error_response)
             except Exception as reply_error:
-                print(f"❌ 發送錯誤訊息失敗: {reply_error}")
+                logger.error("❌ 發送錯誤訊息失敗: %s", reply_error)
 
     def _handle_special_commands(self, user_id: str, message: str) -> Optional[str]:
         """
@@ -303,7 +306,7 @@ class LineBotHandler:
         # 記錄助手回應
         self.conversation_memory.add_message(user_id, "assistant", response)
         
-        print(f"📋 用戶 {user_id} 請求更新，等待確認")
+        logger.info("📋 用戶 %s 請求更新，等待確認", user_id)
         return response
     
     def _handle_update_confirmation(self, user_id: str, message: str) -> str:
@@ -360,7 +363,7 @@ class LineBotHandler:
         if self.is_updating:
             return """⚠️ 系統目前正在進行更新，請稍後再試。"""
         
-        print(f"🚨 用戶 {user_id} 執行強制更新")
+        logger.info("🚨 用戶 %s 執行強制更新", user_id)
         return self._execute_notion_update(user_id, is_force=True)
     
     def _execute_notion_update(self, user_id: str, is_force: bool = False) -> str:
@@ -381,7 +384,7 @@ class LineBotHandler:
                     return "⚠️ 系統目前正在進行更新，請稍後再試。"
                 
                 self.is_updating = True
-                print(f"🔄 開始執行 Notion 更新 - 用戶: {user_id}, 強制: {is_force}")
+                logger.info("🔄 開始執行 Notion 更新 - 用戶: %s, 強制: %s", user_id, is_force)
             
             # 發送開始更新的訊息
             start_message = "🔄 開始更新 Notion 內容，請稍候...\n\n這可能需要 1-3 分鐘的時間。"
@@ -434,7 +437,7 @@ class LineBotHandler:
 
 現在可以詢問最新的內容了！"""
                     
-                    print(f"✅ Notion 更新成功 - 用戶: {user_id}")
+                    logger.info("✅ Notion 更新成功 - 用戶: %s", user_id)
                 else:
                     # 更新失敗
                     error_msg = update_result.get("error", "未知錯誤") if isinstance(update_result, dict) else "未知錯誤"
@@ -445,7 +448,7 @@ class LineBotHandler:
 
 請稍後再試，或聯繫管理員協助處理。"""
                     
-                    print(f"❌ Notion 更新失敗 - 用戶: {user_id}, 錯誤: {error_msg}")
+                    logger.error("❌ Notion 更新失敗 - 用戶: %s, 錯誤: %s", user_id, error_msg)
                 
             except Exception as update_error:
                 # 更新過程中發生異常
@@ -457,7 +460,7 @@ class LineBotHandler:
 
 請稍後再試，或聯繫管理員協助處理。"""
                 
-                print(f"❌ Notion 更新異常 - 用戶: {user_id}, 異常: {update_error}")
+                logger.error("❌ Notion 更新異常 - 用戶: %s, 異常: %s", user_id, update_error)
                 traceback.print_exc()
             
             # 記錄更新結果
@@ -466,14 +469,14 @@ class LineBotHandler:
             
         except Exception as e:
             error_response = f"❌ 執行更新時發生系統錯誤：{str(e)}"
-            print(f"❌ 系統錯誤 - 更新執行失敗: {e}")
+            logger.error("❌ 系統錯誤 - 更新執行失敗: %s", e)
             traceback.print_exc()
             return error_response
         
         finally:
             # 確保釋放更新鎖
             self.is_updating = False
-            print(f"🔓 更新操作完成，釋放更新鎖")
+            logger.info("🔓 更新操作完成，釋放更新鎖")
 
     def _handle_question(self, user_id: str, question: str) -> str:
         """
@@ -494,7 +497,7 @@ class LineBotHandler:
             conversation_context = self.conversation_memory.get_context_for_rag(user_id)
             
             # 使用 RAG 引擎處理問題
-            print(f"🔍 開始處理用戶 {user_id} 的問題...")
+            logger.info("🔍 開始處理用戶 %s 的問題...", user_id)
             answer = self.rag_engine.query_with_context(
                 question=question,
                 conversation_context=conversation_context,
@@ -510,7 +513,7 @@ class LineBotHandler:
             return answer
             
         except Exception as e:
-            print(f"❌ 處理問答時發生錯誤: {e}")
+            logger.error("❌ 處理問答時發生錯誤: %s", e)
             traceback.print_exc()
             
             error_response = "抱歉，處理您的問題時遇到了技術問題。請嘗試重新表述您的問題，或稍後再試。"
@@ -567,10 +570,10 @@ class LineBotHandler:
                 messages=[LineTextMessage(text=message)]
             )
             self.line_bot_api.reply_message(reply_message_request)
-            print(f"📤 回覆訊息已發送: {message[:50]}...")
+            logger.info("📤 回覆訊息已發送: %s...", message[:50])
             
         except Exception as e:
-            print(f"❌ 發送回覆失敗: {e}")
+            logger.error("❌ 發送回覆失敗: %s", e)
             raise
     
     def get_handler_stats(self) -> Dict[str, Any]:
@@ -0,0 +1,272 @@
+import streamlit as st
+import os
+import sys
+
+# 將專案根目錄加入路徑
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 核心模組（sentence-transformers、torch、faiss）於實際使用時才匯入，縮短頁面首次載入時間
+from config.settings import Settings
+from config.logging_setup import setup_logging
+
+# 設定環境變數
+os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+# 載入設定
+settings = Settings()
+setup_logging(settings.LOG_LEVEL)
+
+# CSS 樣式檔案
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "app.css")
+
+@st.cache_data
+def _load_css() -> str:
+    """讀取頁面 CSS（只讀取一次）"""
+    with open(CSS_PATH, "r", encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+def _render_message(message: dict) -> str:
+    """將單則對話訊息轉為 HTML"""
+    if message["role"] == "user":
+        return (
+            '<div class="chat-message user-message">'
+            f'<strong>👤 你:</strong> {message["content"]}'
+            '</div>'
+        )
+    return (
+        '<div class="chat-message bot-message">'
+        f'<strong>🤖 系統:</strong> {message["content"]}'
+        '</div>'
+    )
+
+@st.cache_resource
+def initialize_rag_system():
+    """初始化RAG系統（使用快取避免重複載入）"""
+    try:
+        with st.spinner("正在初始化RAG系統..."):
+            from core.notion_client import NotionClient
+            from core.text_processor import TextProcessor
+            from core.embedder import Embedder
+            from core.vector_store import VectorStore
+            from core.rag_engine import RAGEngine
+            
+            # 建立組件（使用模組層級已載入的設定）
+            notion_client = NotionClient(
+                settings.NOTION_TOKEN,
+                cache_ttl=settings.NOTION_CACHE_TTL,
+                page_cache_ttl=settings.NOTION_PAGE_CACHE_TTL,
+                rate_limit=settings.NOTION_RATE_LIMIT
+            )
+            text_processor = TextProcessor(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+            embedder = Embedder(
+                settings.EMBEDDING_MODEL,
+                backend=settings.EMBEDDING_BACKEND,
+                model_file=settings.EMBEDDING_MODEL_FILE,
+                cache_folder=settings.CACHE_PATH,
+                precision=settings.EMBEDDING_PRECISION
+            )
+            vector_store = VectorStore(
+                settings.VECTOR_DB_PATH, 
+                settings.METADATA_DB_PATH, 
+                settings.EMBEDDING_DIMENSION,
+                settings.VECTOR_INDEX_TYPE,
+                use_gpu=settings.USE_GPU_FAISS,
+                use_mmap=settings.VECTOR_DB_MMAP,
+                ef_search=settings.VECTOR_HNSW_EF_SEARCH,
+                nprobe=settings.VECTOR_IVF_NPROBE,
+                use_numba=settings.VECTOR_NUMBA_SEARCH
+            )
+            
+            # 建立RAG引擎
+            rag_engine = RAGEngine(
+                notion_client, text_processor, embedder, vector_store, settings
+            )
+            
+            # 檢查是否需要處理Notion內容
+            status = rag_engine.get_system_status()
+            if status['vector_database']['total_documents'] == 0:
+                st.info("首次使用，正在處理Notion內容...")
+                success = rag_engine.process_notion_page(settings.NOTION_PAGE_ID)
+                if not success:
+                    st.error("Notion內容處理失敗")
+                    return None
+                st.success("Notion內容處理完成！")
+            
+            return rag_engine
+            
+    except Exception as e:
+        st.error(f"系統初始化失敗: {e}")
+        st.info("請檢查 config/.env 檔案設定")
+        return None
+
+def main():
+    """主程式"""
+    
+    # 頁面設定（每次重新執行都必須是第一個 Streamlit 指令）
+    st.set_page_config(
+        page_title="Notion RAG 智慧問答系統",
+        page_icon="🤖",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    
+    # CSS 樣式
+    st.markdown(_load_css(), unsafe_allow_html=True)
+    
+    # 標題
+    st.markdown("""
+    <div class="main-header">
+        <h1>🤖 Notion RAG 智慧問答系統</h1>
+        <p>基於你的Notion文件，提供智慧問答服務</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # 側邊欄
+    with st.sidebar:
+        st.header("⚙️ 系統控制")
+        
+        # 初始化按鈕
+        if st.button("🔄 重新初始化系統", type="secondary"):
+            st.cache_resource.clear()
+            st.rerun()
+        
+        # 更新Notion內容按鈕
+        if st.button("📄 更新Notion內容", type="secondary"):
+            if "rag_engine" in st.session_state and st.session_state.rag_engine:
+                with st.spinner("更新中..."):
+                    success = st.session_state.rag_engine.update_notion_content()
+                    if success:
+                        st.success("更新成功！")
+                    else:
+                        st.error("更新失敗")
+            else:
+                st.warning("請先初始化系統")
+        
+        st.divider()
+        
+        # 範例問題
+        st.header("💡 問題範例")
+        example_questions = [
+            "這次旅行的目的地是哪裡？",
+            "飛機什麼時候起飛？", 
+            "住在哪個飯店？",
+            "第一天有什麼行程？",
+            "有什麼美食推薦？",
+            "總共幾天的行程？"
+        ]
+        
+        for question in example_questions:
+            if st.button(f"📝 {question}", key=f"example_{question}"):
+                st.session_state.current_question = question
+    
+    # 主要內容區域
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        st.header("💬 問答對話")
+        
+        # 初始化RAG系統
+        if "rag_engine" not in st.session_state:
+            st.session_state.rag_engine = initialize_rag_system()
+        
+        if not st.session_state.rag_engine:
+            st.error("無法初始化系統，請檢查設定")
+            st.stop()
+        
+        # 初始化對話歷史
+        if "messages" not in st.session_state:
+            st.session_state.messages = []
+        
+        # 顯示對話歷史（合併為一次輸出）
+        if st.session_state.messages:
+            st.markdown(
+                "\n".join(_render_message(m) for m in st.session_state.messages),
+                unsafe_allow_html=True
+            )
+        
+        # 問題輸入（使用表單，輸入時不觸發重新執行，只在送出時處理）
+        with st.form("qa", clear_on_submit=True):
+            question = st.text_input(
+                "請輸入你的問題：",
+                value=st.session_state.get("current_question", ""),
+                placeholder="例如：這次旅行的目的地是哪裡？",
+                key="question_input"
+            )
+            ask_button = st.form_submit_button("🚀 提問", type="primary", use_container_width=True)
+        
+        if st.button("🗑️ 清空對話", type="secondary", use_container_width=True):
+            st.session_state.messages = []
+            st.rerun()
+        
+        # 處理問題
+        if ask_button and question.strip():
+            # 添加用戶問題到對話歷史
+            st.session_state.messages.append({"role": "user", "content": question})
+            
+            # 生成回答（串流輸出，第一段文字產生後即開始顯示）
+            placeholder = st.empty()
+            answer = ""
+            with st.spinner("🤔 思考中..."):
+                try:
+                    for delta in st.session_state.rag_engine.query_stream(question):
+                        answer += delta
+                        placeholder.markdown(
+                            _render_message({"role": "assistant", "content": answer}),
+                            unsafe_allow_html=True
+                        )
+                    st.session_state.messages.append({"role": "assistant", "content": answer})
+                except Exception as e:
+                    error_msg = f"處理問題時發生錯誤: {str(e)}"
+                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+            
+            # 清空輸入並重新載入
+            st.session_state.current_question = ""
+            st.rerun()
+    
+    with col2:
+        st.header("📊 系統狀態")
+        
+        if st.session_state.rag_engine:
+            status = st.session_state.rag_engine.get_system_status()
+            
+            # 資料庫狀態
+            st.markdown("""
+            <div class="status-card">
+                <h4>📚 向量資料庫</h4>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            st.metric("文檔數量", status['vector_database']['total_documents'])
+            st.metric("向量數量", status['vector_database']['total_vectors'])
+            
+            with st.expander("資料來源詳情"):
+                for source, count in status['vector_database']['sources'].items():
+                    st.write(f"• {source}: {count} 個片段")
+            
+            # AI設定
+            st.markdown("""
+            <div class="status-card">
+                <h4>🤖 AI設定</h4>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            st.write(f"**OpenAI**: {'✅ 啟用' if status['openai_enabled'] else '❌ 未啟用'}")
+            if status['openai_enabled']:
+                st.write(f"**模型**: {status['openai_model']}")
+            st.write(f"**嵌入模型**: {status['embedding_model']}")
+            
+            # 系統參數
+            with st.expander("系統參數"):
+                for key, value in status['settings'].items():
+                    st.write(f"• {key}: {value}")
+        
+        # 使用說明
+        st.header("📖 使用說明")
+        st.markdown("""
+        1. **提問**: 在左側輸入框中輸入問題
+        2. **範例**: 點擊側邊欄的範例問題快速提問
+        3. **更新**: 如果Notion內容有變化，點擊更新按鈕
+        4. **清空**: 可以清空對話歷史重新開始
+        
+        💡 **提示**: 問題越具體，回答越準確！
+        """)